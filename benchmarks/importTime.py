@@ -0,0 +1,76 @@
+# Cold start benchmark- times imports (and Session creation) in fresh interpreters so short lived jobs do not regress.
+#
+#   python benchmarks/importTime.py [--runs 10] [--max-ms 'import quantamatics=50'] [--top 10]
+#
+# Exits with status 1 when the median of a target is above its --max-ms budget
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+Targets = {
+    'import quantamatics': 'import quantamatics',
+    'from quantamatics.data import Instrument': 'from quantamatics.data import Instrument; Instrument',
+    'Session()': 'from quantamatics.core.APIClient import Session; Session()',
+    'import providers': 'from quantamatics.providers import FacteusUSCPSummary; FacteusUSCPSummary'
+}
+
+
+def timeImport(statement: str) -> tuple:
+    # Wall time of the statement in a new interpreter, measured by the interpreter itself so start up is excluded
+    code = 'import time; _start = time.perf_counter(); %s; print(time.perf_counter() - _start)' % statement
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([x for x in [os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                       env.get('PYTHONPATH')] if x])
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True, env=env,
+                            check=True)
+    return float(result.stdout.strip().splitlines()[-1]) * 1000, result.stderr
+
+
+def getSlowestModules(importLog: str, top: int) -> list:
+    # -X importtime lines: 'import time: self [us] | cumulative | imported package'
+    modules = []
+    for line in importLog.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match is not None and len(match.group(3)) <= 2:
+            modules.append((int(match.group(2)) / 1000, match.group(4)))
+    return sorted(modules, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('--max-ms', action='append', default=[],
+                        help="budget as '<target>=<milliseconds>', may be given more than once")
+    args = parser.parse_args()
+
+    budgets = dict([[x.rsplit('=', 1)[0], float(x.rsplit('=', 1)[1])] for x in args.max_ms])
+    failed = []
+
+    for name, statement in Targets.items():
+        timeImport(statement)
+        timings = []
+        importLog = None
+        for _ in range(args.runs):
+            elapsed, importLog = timeImport(statement)
+            timings.append(elapsed)
+
+        median = statistics.median(timings)
+        print('%-45s median %8.1f ms  min %8.1f ms  max %8.1f ms' % (name, median, min(timings), max(timings)))
+        for cumulative, module in getSlowestModules(importLog, args.top):
+            print('    %-41s %8.1f ms' % (module, cumulative))
+
+        if name in budgets and median > budgets[name]:
+            failed.append('%s: %.1f ms > %.1f ms' % (name, median, budgets[name]))
+
+    if len(failed) > 0:
+        print('\nOver budget:\n  ' + '\n  '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
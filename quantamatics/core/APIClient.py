@@ -1,15 +1,12 @@
-from typing import Tuple
-import aiohttp
+from typing import Tuple, TYPE_CHECKING
 import asyncio
-import nest_asyncio
+import atexit
 import json
 from json import JSONDecodeError
-from jose import jwt
+import threading
 import time
 import os
 import pandas as pd
-import warnings
-import pkg_resources
 import numpy
 from datetime import date
 
@@ -17,26 +14,213 @@ import quantamatics.core.settings as settings
 from quantamatics.core.settings import ParamsTypes, MethodTypes
 from quantamatics.core.utils import QException, QLog
 from quantamatics.core.utils import Singleton
+from quantamatics.core.cache import ResponseCache
+from quantamatics.core import decoding
+from quantamatics.core.retry import RetryPolicy, CircuitBreaker
+from quantamatics.core.scheduler import RequestScheduler
+from quantamatics.core.metrics import SessionMetrics
+from quantamatics.core.loop import runSync
+
+# aiohttp and jose are imported on first use, so importing the library and creating a Session stays cheap for short
+# lived jobs that may only touch the local cache
+if TYPE_CHECKING:
+    import aiohttp
+
+_version = None
+
+
+def getVersion() -> str:
+    global _version
+    if _version is None:
+        try:
+            from importlib.metadata import version
+            _version = version('quantamatics')
+        except Exception:
+            _version = 'Unknown'
+    return _version
+
 
 class Session(metaclass=Singleton):
-    def __init__(self, enableCaching = True, enableCompression = False):
+    def __init__(self, enableCaching = True, enableCompression = False, cacheDirectory: str = None):
         # Get Cached API Token when running within Quantamatics Platform
         self._cachedToken = os.environ.get('QMC_API_CACHED_JWT_TOKEN')
         self._apiKey = os.environ.get('QMC_API_KEY')
         self._enableCaching = enableCaching
         self._enableCompression = enableCompression
 
-        try:
-            self._version = pkg_resources.require("quantamatics")[0].version
-        except:
-            self._version = "Unknown"
-            
-        self._async_session = aiohttp.ClientSession(auto_decompress=True, timeout=aiohttp.ClientTimeout(total=None))
+        self._version = getVersion()
+
+        # An aiohttp session is bound to the event loop it is created on, so one is created per loop on first use-
+        # synchronous calls all run on the loop thread, async callers get one for their own loop
+        self._async_sessions = {}
+
+        # The token, connection settings, rate limits and circuit breakers are shared by every thread using the session-
+        # sync calls from any thread run on the one background loop, so they share its connection pool as well
+        self._lock = threading.RLock()
+        self._poolConfig = {
+            'poolSize': settings.ConnectionPoolSize,
+            'poolSizePerHost': settings.ConnectionPoolSizePerHost,
+            'keepAliveTimeout': settings.KeepAliveTimeout,
+            'dnsCacheTTL': settings.DNSCacheTTL,
+            'connectTimeout': settings.ConnectTimeout,
+            'readTimeout': settings.ReadTimeout,
+            'totalTimeout': settings.TotalTimeout
+        }
+        self._retryPolicy = RetryPolicy()
+        self._inflightRequests = {}
+        self._coalescedRequestCount = 0
+        self._scheduler = RequestScheduler(
+            maxConcurrency=settings.MaxConcurrentRequests,
+            globalRate=settings.GlobalRateLimit,
+            globalBurst=settings.GlobalRateBurst,
+            endpointRates=settings.EndpointRateLimits
+        )
+        self._circuitBreakers = {}
+        self._metrics = SessionMetrics()
+        self._requestHooks = []
+        self._responseHooks = []
         self.logger = QLog()
-        nest_asyncio.apply()
+        atexit.register(self._closeAtExit)
+
+        self._responseCache = None
+        if cacheDirectory is None:
+            cacheDirectory = settings.LocalCacheDirectory
+        if cacheDirectory is not None:
+            self.enableLocalCache(cacheDirectory)
 
     def __del__(self):
-        asyncio.get_event_loop().run_until_complete(self._async_session.close())
+        # Never drive the event loop during interpreter teardown, only release the connector
+        try:
+            for async_session in self._async_sessions.values():
+                if not async_session.closed:
+                    self._releaseConnector(async_session)
+        except Exception:
+            pass
+
+    async def __aenter__(self):
+        self._getAsyncSession()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.closeAsync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def configureConnectionPool(self, poolSize: int = None, poolSizePerHost: int = None, keepAliveTimeout: float = None,
+                                dnsCacheTTL: int = None, connectTimeout: float = None, readTimeout: float = None,
+                                totalTimeout: float = None):
+        newConfig = {
+            'poolSize': poolSize,
+            'poolSizePerHost': poolSizePerHost,
+            'keepAliveTimeout': keepAliveTimeout,
+            'dnsCacheTTL': dnsCacheTTL,
+            'connectTimeout': connectTimeout,
+            'readTimeout': readTimeout,
+            'totalTimeout': totalTimeout
+        }
+        self._poolConfig.update(dict([[k, v] for k, v in newConfig.items() if v is not None]))
+
+        # Connections of the current pool are released, the next request opens a pool with the new settings
+        self.close()
+
+    def _createAsyncSession(self) -> 'aiohttp.ClientSession':
+        import aiohttp
+
+        config = self._poolConfig
+        connector = aiohttp.TCPConnector(
+            limit=config['poolSize'],
+            limit_per_host=config['poolSizePerHost'],
+            keepalive_timeout=config['keepAliveTimeout'],
+            use_dns_cache=config['dnsCacheTTL'] is not None and config['dnsCacheTTL'] > 0,
+            ttl_dns_cache=config['dnsCacheTTL']
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=config['totalTimeout'],
+            connect=config['connectTimeout'],
+            sock_connect=config['connectTimeout'],
+            sock_read=config['readTimeout']
+        )
+        return aiohttp.ClientSession(connector=connector, auto_decompress=True, timeout=timeout,
+                                     trace_configs=[self._createTraceConfig()])
+
+    def _createTraceConfig(self) -> 'aiohttp.TraceConfig':
+        import aiohttp
+
+        # Time spent opening a new connection (DNS, TCP and TLS), written to the timings dict passed to request() as
+        # trace_request_ctx. Requests on a reused keep-alive connection do not record one
+        async def onConnectionCreateStart(session, context, params):
+            context.connectStart = time.perf_counter()
+
+        async def onConnectionCreateEnd(session, context, params):
+            if isinstance(context.trace_request_ctx, dict) and hasattr(context, 'connectStart'):
+                context.trace_request_ctx['connect'] = time.perf_counter() - context.connectStart
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_start.append(onConnectionCreateStart)
+        trace_config.on_connection_create_end.append(onConnectionCreateEnd)
+        return trace_config
+
+    def _getAsyncSession(self) -> 'aiohttp.ClientSession':
+        loop = asyncio.get_event_loop()
+        async_session = self._async_sessions.get(loop)
+        if async_session is None or async_session.closed:
+            with self._lock:
+                # Sessions of loops that were closed since are dropped
+                for closedLoop in [x for x in self._async_sessions if x.is_closed()]:
+                    self._releaseConnector(self._async_sessions.pop(closedLoop))
+                async_session = self._createAsyncSession()
+                self._async_sessions[loop] = async_session
+        return async_session
+
+    def _closeAtExit(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    async def closeAsync(self):
+        async_session = self._async_sessions.pop(asyncio.get_event_loop(), None)
+        if async_session is not None and not async_session.closed:
+            await async_session.close()
+
+    def close(self):
+        try:
+            runningLoop = asyncio.get_running_loop()
+        except RuntimeError:
+            runningLoop = None
+
+        # Each session is closed on its own loop- waited for when that loop runs on another thread, scheduled when it is
+        # the caller's loop, otherwise only the connections are released
+        with self._lock:
+            async_sessions = list(self._async_sessions.items())
+            self._async_sessions.clear()
+
+        for loop, async_session in async_sessions:
+            if async_session.closed:
+                continue
+            try:
+                if loop is runningLoop:
+                    loop.create_task(async_session.close())
+                    continue
+                if loop.is_running():
+                    asyncio.run_coroutine_threadsafe(async_session.close(), loop).result(timeout=5)
+                    continue
+                if not loop.is_closed():
+                    loop.run_until_complete(async_session.close())
+                    continue
+            except Exception:
+                pass
+            self._releaseConnector(async_session)
+
+    def _releaseConnector(self, async_session: 'aiohttp.ClientSession'):
+        # Newer aiohttp versions return an awaitable, the connections are dropped either way
+        result = async_session.connector.close()
+        if asyncio.iscoroutine(result):
+            result.close()
 
     def _getDefaultHeaders(self) -> dict:
         return {
@@ -46,6 +230,8 @@ class Session(metaclass=Singleton):
 
     def getAPIToken(self) -> str:
         if self._cachedToken is not None:
+            from jose import jwt
+
             claims = jwt.get_unverified_claims(self._cachedToken)
             exp_unix_timestamp = claims['exp']
             cur_unix_timestamp = int(time.time())
@@ -57,7 +243,7 @@ class Session(metaclass=Singleton):
             raise QException('Access Token Not Set. Use login() Method to Set Access Token')
 
     def login(self, user: str, password: str) -> bool:
-        return asyncio.get_event_loop().run_until_complete(self.loginAsync(user, password))        
+        return runSync(self.loginAsync(user, password))
 
     async def loginAsync(self, user: str, password: str) -> bool:
 
@@ -67,7 +253,7 @@ class Session(metaclass=Singleton):
         headers = self._getDefaultHeaders()
         request_data = { 'email': user, 'password': password }
         try:
-            async with self._async_session.post(url=settings.APIEndpoint + '/api/account/login', headers=headers, json=request_data) as response:
+            async with self._getAsyncSession().post(url=settings.APIEndpoint + '/api/account/login', headers=headers, json=request_data) as response:
                 status = response.status
                 response_text = await response.text()
                 if status == 200:
@@ -84,21 +270,149 @@ class Session(metaclass=Singleton):
     def setAPIKey(self, apiKey: str):
         self._apiKey = apiKey
 
+    def setRetryPolicy(self, retryPolicy: RetryPolicy):
+        self._retryPolicy = retryPolicy
+        self._circuitBreakers = {}
+
+    def getRetryPolicy(self) -> RetryPolicy:
+        return self._retryPolicy
+
+    def configureRateLimits(self, maxConcurrency: int = None, globalRate: float = None, globalBurst: float = None,
+                            endpointRates: dict = None) -> RequestScheduler:
+        self._scheduler = RequestScheduler(
+            maxConcurrency=maxConcurrency,
+            globalRate=globalRate,
+            globalBurst=globalBurst,
+            endpointRates=endpointRates
+        )
+        return self._scheduler
+
+    def getScheduler(self) -> RequestScheduler:
+        return self._scheduler
+
+    def getSchedulerStats(self) -> dict:
+        return self._scheduler.getStats()
+
+    def _getCircuitBreaker(self, api_relative_path: str, retryPolicy: RetryPolicy) -> CircuitBreaker:
+        with self._lock:
+            if api_relative_path not in self._circuitBreakers:
+                self._circuitBreakers[api_relative_path] = CircuitBreaker(
+                    threshold=retryPolicy.circuitBreakerThreshold,
+                    resetTimeout=retryPolicy.circuitBreakerResetTimeout
+                )
+            return self._circuitBreakers[api_relative_path]
+
+    def addRequestHook(self, hook):
+        # hook(requestInfo) is called before every attempt with the endpoint, method, url, params, attempt, priority and
+        # headers- changes to the headers dict are sent
+        with self._lock:
+            self._requestHooks.append(hook)
+        return hook
+
+    def removeRequestHook(self, hook):
+        with self._lock:
+            if hook in self._requestHooks:
+                self._requestHooks.remove(hook)
+
+    def addResponseHook(self, hook):
+        # hook(responseInfo) is called after every attempt with the request fields, status, exception (None when the
+        # attempt succeeded), wireBytes / bodyBytes and the stage timings in seconds
+        with self._lock:
+            self._responseHooks.append(hook)
+        return hook
+
+    def removeResponseHook(self, hook):
+        with self._lock:
+            if hook in self._responseHooks:
+                self._responseHooks.remove(hook)
+
+    def _runHooks(self, hooks: list, info: dict):
+        # A failing hook is logged and never fails the request
+        for hook in list(hooks):
+            try:
+                hook(info)
+            except Exception as e:
+                self.logger.logDebug('Hook %s failed: %s' % (getattr(hook, '__name__', hook), e))
+
+    def getMetrics(self) -> SessionMetrics:
+        return self._metrics
+
+    def getMetricsSnapshot(self) -> dict:
+        return {
+            **self._metrics.snapshot(),
+            'scheduler': self.getSchedulerStats()
+        }
+
+    def getMetricsPrometheus(self, prefix: str = 'quantamatics') -> str:
+        return self._metrics.toPrometheus(prefix=prefix)
+
+    def resetMetrics(self):
+        self._metrics.reset()
+        self._scheduler.resetStats()
+
+    def _recordAttempt(self, info: dict):
+        api_relative_path = info['endpoint']
+        self._metrics.increment(api_relative_path, 'requestCount')
+        if info['attempt'] > 0:
+            self._metrics.increment(api_relative_path, 'retryCount')
+        if info['status'] is not None:
+            self._metrics.recordStatus(api_relative_path, info['status'])
+        if info['exception'] is not None or info['status'] != 200:
+            self._metrics.increment(api_relative_path, 'errorCount')
+        for stage, seconds in info['timings'].items():
+            self._metrics.observe(api_relative_path, stage, seconds)
+        if info['wireBytes'] is not None:
+            self._metrics.increment(api_relative_path, 'wireBytes', info['wireBytes'])
+            self._metrics.increment(api_relative_path, 'bodyBytes', info['bodyBytes'])
+
+        self._runHooks(self._responseHooks, info)
+
+    def enableLocalCache(self, cacheDirectory: str = None, maxSizeMB: float = None, defaultTTL: float = None,
+                         endpointTTLs: dict = None) -> ResponseCache:
+        if cacheDirectory is None:
+            cacheDirectory = settings.LocalCacheDirectory
+        if maxSizeMB is None:
+            maxSizeMB = settings.LocalCacheMaxSizeMB
+        if defaultTTL is None:
+            defaultTTL = settings.LocalCacheDefaultTTL
+
+        self._responseCache = ResponseCache(cacheDirectory, maxSizeMB=maxSizeMB, defaultTTL=defaultTTL,
+                                            endpointTTLs=endpointTTLs)
+        return self._responseCache
+
+    def disableLocalCache(self):
+        self._responseCache = None
+
+    def getLocalCache(self) -> ResponseCache:
+        return self._responseCache
+
+    def invalidateCache(self, api_relative_path: str = None):
+        if self._responseCache is not None:
+            self._responseCache.invalidate(api_relative_path=api_relative_path)
+
     def apiWrapper(self, api_relative_path: str, params: dict = {},
                    enableCompressionOverride = None,
                    enableCachingOverride = None,
                    params_type: str = ParamsTypes.URL,
-                   method_type: str = MethodTypes.GET
+                   method_type: str = MethodTypes.GET,
+                   retry_policy: RetryPolicy = None,
+                   priority: int = None,
+                   compactDtypes: bool = False,
+                   categoricalColumns: list = None
                    ) -> pd.DataFrame:
 
-        return asyncio.get_event_loop().run_until_complete(
+        return runSync(
             self.apiWrapperAsync(
                 api_relative_path=api_relative_path, 
                 params=params,
                 enableCompressionOverride=enableCompressionOverride,
                 enableCachingOverride=enableCachingOverride,
                 params_type=params_type,
-                method_type=method_type
+                method_type=method_type,
+                retry_policy=retry_policy,
+                priority=priority,
+                compactDtypes=compactDtypes,
+                categoricalColumns=categoricalColumns
             )
         )
 
@@ -106,74 +420,74 @@ class Session(metaclass=Singleton):
                                 params: dict = {}, enableCompressionOverride = None, 
                                 enableCachingOverride = None, 
                                 params_type: str = ParamsTypes.URL,
-                                method_type: str = MethodTypes.GET) -> pd.DataFrame:
-        
-        response_headers, response_text = await self.handleRequestAsync(
+                                method_type: str = MethodTypes.GET,
+                                retry_policy: RetryPolicy = None,
+                                priority: int = None,
+                                compactDtypes: bool = False,
+                                categoricalColumns: list = None) -> pd.DataFrame:
+
+        cache_key = None
+        if enableCachingOverride is None:
+            enableCachingOverride = self._enableCaching
+
+        if self._responseCache is not None and enableCachingOverride:
+            cache_key = self._responseCache.makeKey(api_relative_path, params, method_type, self._version,
+                                                    endpoint=settings.APIEndpoint,
+                                                    variant={'compact': sorted(categoricalColumns or [])} if compactDtypes else None)
+            df = self._responseCache.get(cache_key)
+            if df is not None:
+                self._metrics.increment(api_relative_path, 'cacheHits')
+                return df
+            self._metrics.increment(api_relative_path, 'cacheMisses')
+
+        accept = None
+        if settings.AcceptBinaryResponses and decoding.isBinaryDecodingAvailable():
+            accept = ', '.join(decoding.getAcceptedContentTypes() + ['application/json'])
+
+        response_headers, response_body = await self.handleRequestAsync(
             api_relative_path=api_relative_path,
             params=params,
             enableCompressionOverride=enableCompressionOverride,
             enableCachingOverride=enableCachingOverride,
             params_type=params_type,
-            method_type=method_type
+            method_type=method_type,
+            retry_policy=retry_policy,
+            priority=priority,
+            accept=accept,
+            raw=True
         )
 
-        try:
-            result_dict = json.loads(response_text)
-        except JSONDecodeError:
-            raise QException('Error Encoding JSON: %s ' % response_headers['Content-Encoding'])
-
         self.logger.logDebug('Response Headers %s' % response_headers)
 
-        try:
-            self.logger.logDebug('Result Generation Time (cache): %s' % result_dict['retrievalTime'])
-        except:
-            pass
+        content_type = response_headers.get('Content-Type', '').split(';')[0].strip().lower()
+        decode_start = time.perf_counter()
+        if content_type in [decoding.ArrowStreamContentType, decoding.ArrowFileContentType]:
+            df = decoding.frameFromArrow(response_body, content_type, compactDtypes, categoricalColumns)
+        elif content_type in decoding.ParquetContentTypes:
+            df = decoding.frameFromParquet(response_body, compactDtypes, categoricalColumns)
+        else:
+            try:
+                result_dict = json.loads(response_body)
+            except (JSONDecodeError, UnicodeDecodeError):
+                raise QException('Error Encoding JSON: %s ' % response_headers.get('Content-Encoding'))
 
-        dtypes = {}
-        for column_name in result_dict['schema']:
-            column_type = result_dict['schema'][column_name]['type']
-            column_nullable = result_dict['schema'][column_name]['nullable']
-
-            if column_type == 'datetime.date':
-                dtypes[column_name] = 'object'
-            elif column_type == 'np.datetime64[ns]':
-                dtypes[column_name] = 'object'
-            elif column_type == 'int32':
-                if column_nullable:
-                    dtypes[column_name] ='Int32'
-                else:
-                    dtypes[column_name] = 'int32'
-            elif column_type == 'int64':
-                if column_nullable:
-                    dtypes[column_name] = 'Int64'
-                else:
-                    dtypes[column_name] = 'int64'
-            elif column_type == 'bool':
-                if column_nullable:
-                    dtypes[column_name] = 'object'
-                else:
-                    dtypes[column_name] = 'bool'
-            elif (column_type == 'float64' or column_type == 'str' or column_type == 'bytes'):
-                dtypes[column_name] = column_type
-            else:
-                raise QException('Unknown DataFrame Column type returned by API call')
+            # Binary bodies are read straight into Arrow, their decode time is all frameBuild
+            self._metrics.observe(api_relative_path, 'jsonDecode', time.perf_counter() - decode_start)
+            decode_start = time.perf_counter()
 
-        with warnings.catch_warnings():
-            warnings.simplefilter(action='ignore', category=FutureWarning)
-            df = pd.read_json(json.dumps(result_dict['data']), orient='columns', dtype=dtypes)
+            try:
+                self.logger.logDebug('Result Generation Time (cache): %s' % result_dict['retrievalTime'])
+            except:
+                pass
 
-        for column_name in result_dict['schema']:
-            column_type = result_dict['schema'][column_name]['type']
-            
-            # If the number of records is 0, then add the column to the df to ensure we always have the schema
-            # at least returned
-            if df.shape[0] == 0:
-                df[column_name] = []
+            df = decoding.frameFromColumns(result_dict['schema'], result_dict['data'], compactDtypes, categoricalColumns)
 
-            if column_type == 'datetime.date':
-                df[column_name] = pd.to_datetime(df[column_name]).dt.date
-            elif column_type == 'np.datetime64[ns]':
-                df[column_name] = pd.to_datetime(df[column_name])
+        if settings.CollectMetrics:
+            self._metrics.observe(api_relative_path, 'frameBuild', time.perf_counter() - decode_start)
+            self._metrics.increment(api_relative_path, 'decodedBytes', int(df.memory_usage(deep=True).sum()))
+
+        if cache_key is not None:
+            self._responseCache.put(cache_key, api_relative_path, df)
 
         return df
 
@@ -181,16 +495,20 @@ class Session(metaclass=Singleton):
                                 params: dict = {}, enableCompressionOverride = None, 
                                 enableCachingOverride = None, 
                                 params_type: str = ParamsTypes.URL,
-                                method_type: str = MethodTypes.GET) -> Tuple[dict, str]:
+                                method_type: str = MethodTypes.GET,
+                                retry_policy: RetryPolicy = None,
+                                priority: int = None) -> Tuple[dict, str]:
 
-        return asyncio.get_event_loop().run_until_complete(
+        return runSync(
             self.handleRequestAsync(
                 api_relative_path=api_relative_path, 
                 params=params,
                 enableCompressionOverride=enableCompressionOverride,
                 enableCachingOverride=enableCachingOverride,
                 params_type=params_type,
-                method_type=method_type                
+                method_type=method_type,
+                retry_policy=retry_policy,
+                priority=priority
             )
         )
 
@@ -198,7 +516,64 @@ class Session(metaclass=Singleton):
                                 params: dict = {}, enableCompressionOverride = None, 
                                 enableCachingOverride = None, 
                                 params_type: str = ParamsTypes.URL,
-                                method_type: str = MethodTypes.GET) -> Tuple[dict, str]:
+                                method_type: str = MethodTypes.GET,
+                                retry_policy: RetryPolicy = None,
+                                priority: int = None,
+                                accept: str = None,
+                                raw: bool = False) -> Tuple[dict, str]:
+
+        request_kwargs = {
+            'api_relative_path': api_relative_path,
+            'params': params,
+            'enableCompressionOverride': enableCompressionOverride,
+            'enableCachingOverride': enableCachingOverride,
+            'params_type': params_type,
+            'method_type': method_type,
+            'retry_policy': retry_policy,
+            'priority': priority,
+            'accept': accept,
+            'raw': raw
+        }
+
+        if not settings.CoalesceRequests:
+            return await self._sendRequestAsync(**request_kwargs)
+
+        # Single flight- concurrent identical requests share the one already in flight
+        loop = asyncio.get_event_loop()
+        request_key = (id(loop), json.dumps({
+            'path': api_relative_path,
+            'params': params,
+            'params_type': params_type,
+            'method': method_type,
+            'compression': enableCompressionOverride,
+            'caching': enableCachingOverride,
+            'accept': accept,
+            'raw': raw
+        }, sort_keys=True, default=str))
+
+        request_task = self._inflightRequests.get(request_key)
+        if request_task is None:
+            request_task = asyncio.ensure_future(self._sendRequestAsync(**request_kwargs))
+            self._inflightRequests[request_key] = request_task
+            request_task.add_done_callback(lambda _: self._inflightRequests.pop(request_key, None))
+        else:
+            with self._lock:
+                self._coalescedRequestCount += 1
+            self._metrics.increment(api_relative_path, 'coalescedCount')
+            self.logger.logDebug(f'Joining in flight request to path "{api_relative_path}"')
+
+        # Shielded so one caller being cancelled does not cancel the request for the others
+        return await asyncio.shield(request_task)
+
+    async def _sendRequestAsync(self, api_relative_path: str,
+                                params: dict = {}, enableCompressionOverride = None,
+                                enableCachingOverride = None,
+                                params_type: str = ParamsTypes.URL,
+                                method_type: str = MethodTypes.GET,
+                                retry_policy: RetryPolicy = None,
+                                priority: int = None,
+                                accept: str = None,
+                                raw: bool = False) -> Tuple[dict, str]:
 
         self.logger.logDebug(f'=== Call handleRequestAsync to path "{api_relative_path}" ===')
         
@@ -211,6 +586,9 @@ class Session(metaclass=Singleton):
             headers['Content-Type'] = 'application/json'
             headers['Accept'] = 'application/json'
 
+        if accept is not None:
+            headers['Accept'] = accept
+
         if self._cachedToken is not None:
             headers['Authorization'] = 'Bearer ' + self._cachedToken
         elif self._apiKey is not None:
@@ -265,31 +643,87 @@ class Session(metaclass=Singleton):
         else:
             raise QException('Unexpected params type')
 
+        if retry_policy is None:
+            retry_policy = self._retryPolicy
+        circuit_breaker = self._getCircuitBreaker(api_relative_path, retry_policy)
+
         status = None
         response_text = None
-        for i in range(3):
-
-            async with self._async_session.request(method=method_type, url=api_full_path, **request_args) as response:
-
-                status = response.status
-                response_text = await response.text()
-                self.logger.logDebug("--- %s seconds Round trip time---" % (time.time() - start_time))
-
-                if status >= 500:
-                    self.logger.logDebug(f'Received status code {status}, sleeping and retrying...')
-                    await asyncio.sleep(10)
-                    continue
-                elif status == 401:
-                    raise QException('Authentication Failed')
-                elif status == 400:
-                    raise QException('HTTP Client Error: %s - %s' % (status, response_text))
-                elif status != 200:
-                    raise QException('Error Accessing Endpoint: %s - %s' % (status, response_text))
-
-                self.logger.logDebug('size of response object: %d' % len(response_text))
-
-                return response.headers, response_text
-
+        last_exception = None
+        for attempt in range(retry_policy.maxAttempts):
+            if not circuit_breaker.allowRequest():
+                raise QException('Circuit open for %s after %d consecutive failures' % (api_relative_path, circuit_breaker.failureCount))
+
+            retry_after = None
+            status = None
+            attempt_info = {
+                'endpoint': api_relative_path,
+                'method': method_type,
+                'url': api_full_path,
+                'params': params,
+                'attempt': attempt,
+                'priority': priority,
+                'headers': headers
+            }
+            self._runHooks(self._requestHooks, attempt_info)
+
+            # Stage timings of this attempt- connect is filled in by the session's trace config
+            timings = {}
+            attempt_info.update({'status': None, 'exception': None, 'wireBytes': None, 'bodyBytes': None, 'timings': timings})
+            try:
+                async with self._scheduler.request(api_relative_path, priority) as queue_wait:
+                    timings['queueWait'] = queue_wait
+                    sent_at = time.perf_counter()
+                    async with self._getAsyncSession().request(method=method_type, url=api_full_path,
+                                                               trace_request_ctx=timings, **request_args) as response:
+                        # Until the response headers arrive, less the time spent connecting
+                        timings['ttfb'] = time.perf_counter() - sent_at - timings.get('connect', 0.0)
+
+                        status = attempt_info['status'] = response.status
+                        read_start = time.perf_counter()
+                        response_body = await response.read()
+                        timings['download'] = time.perf_counter() - read_start
+                        attempt_info['bodyBytes'] = len(response_body)
+                        attempt_info['wireBytes'] = getattr(response.content, 'total_raw_bytes', len(response_body))
+
+                        response_text = response_body.decode(response.get_encoding(), errors='replace') if (not raw or status != 200) else None
+                        self.logger.logDebug("--- %s seconds Round trip time---" % (time.time() - start_time))
+
+                        if retry_policy.isRetryableStatus(status):
+                            circuit_breaker.recordFailure()
+                            retry_after = response.headers.get('Retry-After')
+                            last_exception = None
+                            self.logger.logDebug(f'Received status code {status}, retrying...')
+                        else:
+                            circuit_breaker.recordSuccess()
+
+                            if status == 401:
+                                raise QException('Authentication Failed')
+                            elif status == 400:
+                                raise QException('HTTP Client Error: %s - %s' % (status, response_text))
+                            elif status != 200:
+                                raise QException('Error Accessing Endpoint: %s - %s' % (status, response_text))
+
+                            self.logger.logDebug('size of response object: %d' % len(response_body))
+
+                            if raw:
+                                return response.headers, response_body
+                            return response.headers, response_text
+            except Exception as e:
+                attempt_info['exception'] = e
+                if not retry_policy.isRetryableException(e):
+                    raise
+                circuit_breaker.recordFailure()
+                last_exception = e
+                self.logger.logDebug(f'Request failed with {type(e).__name__}: {e}, retrying...')
+            finally:
+                self._recordAttempt(attempt_info)
+
+            if attempt < retry_policy.maxAttempts - 1:
+                await asyncio.sleep(retry_policy.getDelay(attempt, retry_after))
+
+        if last_exception is not None:
+            raise QException('Can not establish connection to %s: %s' % (api_full_path, repr(last_exception)))
         raise QException('Multiple HTTP Server Errors, Last Error: %s - %s' % (status, response_text))
 
             
@@ -2,6 +2,7 @@ import json
 import pandas as pd
 
 from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
 from quantamatics.core.utils import QException, QLog, Singleton
 from quantamatics.core.settings import MethodTypes, ParamsTypes
 
@@ -13,8 +14,11 @@ class APIGatewayClient(metaclass=Singleton):
         return
 
     def getAPIList(self):
+        return runSync(self.getAPIListAsync())
 
-        _, response_text = self.session.handleRequest(
+    async def getAPIListAsync(self):
+
+        _, response_text = await self.session.handleRequestAsync(
             api_relative_path='/api/function/getAll'
         )
 
@@ -49,9 +53,20 @@ class APIGatewayClient(metaclass=Singleton):
         #TODO: remove id,type,functionId & assetId
         return apiMetaData
 
+    async def getAPIMetaDataAsync(self, gatewayAPIName: str) -> dict:
+        if self.apiDirectory is None:
+            await self.getAPIListAsync()
+
+        apiMetaData=list(filter(lambda x:x["name"]==gatewayAPIName,self.apiDirectory))
+        #TODO: remove id,type,functionId & assetId
+        return apiMetaData
+
     def restartAPIGatewayEnv(self):
+        return runSync(self.restartAPIGatewayEnvAsync())
+
+    async def restartAPIGatewayEnvAsync(self):
         try:
-            self.session.handleRequest(
+            await self.session.handleRequestAsync(
                 api_relative_path='/api/function/restartEnvironment', 
                 method_type=MethodTypes.POST
             )
@@ -60,12 +75,15 @@ class APIGatewayClient(metaclass=Singleton):
             return False
 
     def executeAPICall(self, gatewayAPIName: str,params: dict = {}) -> pd.DataFrame:
+        return runSync(self.executeAPICallAsync(gatewayAPIName, params))
+
+    async def executeAPICallAsync(self, gatewayAPIName: str, params: dict = {}) -> pd.DataFrame:
 
         requestParams = {'FunctionName':gatewayAPIName,
                           'BatchId':None,
                           'Args':params }
 
-        _, response_text = self.session.handleRequest(
+        _, response_text = await self.session.handleRequestAsync(
             api_relative_path='/api/function/runFunction',
             params=requestParams,
             params_type=ParamsTypes.JSON,
@@ -1,2 +1,23 @@
 from __future__ import absolute_import
-from quantamatics.core import *
\ No newline at end of file
+import importlib
+
+# The client is imported from its module on first access, so importing the package does not load pandas or aiohttp
+_lazyAttributes = {
+    'Session': 'quantamatics.core.APIClient',
+    'APIGatewayClient': 'quantamatics.core.APIGateway',
+    'QException': 'quantamatics.core.utils'
+}
+
+__all__ = list(_lazyAttributes)
+
+
+def __getattr__(name):
+    if name in _lazyAttributes:
+        value = getattr(importlib.import_module(_lazyAttributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,168 @@
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+import pandas as pd
+
+from quantamatics.core.utils import QException, QLog
+
+# Entries are stored as parquet when pyarrow is installed, which is only imported by pandas when one is read or written
+_parquetAvailable = importlib.util.find_spec('pyarrow') is not None
+
+
+class ResponseCache:
+    def __init__(self, directory: str, maxSizeMB: float = 2048, defaultTTL: float = 86400,
+                 endpointTTLs: dict = None):
+        if directory is None:
+            raise QException('Cache directory not defined')
+
+        self.directory = os.path.expanduser(directory)
+        self.maxSizeBytes = int(maxSizeMB * 1024 * 1024)
+        self.defaultTTL = defaultTTL
+        self.endpointTTLs = dict(endpointTTLs) if endpointTTLs is not None else {}
+        self.format = 'parquet' if _parquetAvailable else 'pickle'
+        self.logger = QLog()
+
+        os.makedirs(self.directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                         'key TEXT PRIMARY KEY, path TEXT, file_name TEXT, size INTEGER, '
+                         'created REAL, expires REAL, last_access REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)')
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def makeKey(self, api_relative_path: str, params: dict, method_type: str, version: str, endpoint: str = None,
+                variant: dict = None) -> str:
+        # variant tells apart differently decoded frames of the same response
+        key = {
+            'endpoint': endpoint,
+            'path': api_relative_path,
+            'params': {k: v for k, v in params.items() if v is not None},
+            'method': method_type,
+            'version': version
+        }
+        if variant is not None:
+            key['variant'] = variant
+        normalized = json.dumps(key, sort_keys=True, default=str)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def getTTL(self, api_relative_path: str) -> float:
+        # Longest matching endpoint prefix wins
+        matches = [x for x in self.endpointTTLs if api_relative_path.startswith(x)]
+        if len(matches) == 0:
+            return self.defaultTTL
+        return self.endpointTTLs[max(matches, key=len)]
+
+    def setTTL(self, api_relative_path: str, ttl: float):
+        self.endpointTTLs[api_relative_path] = ttl
+
+    def get(self, key: str) -> pd.DataFrame:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT file_name, expires FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+
+            file_name, expires = row
+            if expires is not None and expires < now:
+                self._delete(conn, [(key, file_name)])
+                return None
+
+            conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+
+        try:
+            df = self._read(os.path.join(self.directory, file_name))
+        except Exception as e:
+            self.logger.logDebug('Unable to read cache entry %s: %s' % (key, e))
+            with self._connect() as conn:
+                self._delete(conn, [(key, file_name)])
+            return None
+
+        self.logger.logDebug('Local cache hit %s' % key)
+        return df
+
+    def put(self, key: str, api_relative_path: str, df: pd.DataFrame):
+        ttl = self.getTTL(api_relative_path)
+        if ttl is not None and ttl <= 0:
+            return
+
+        file_name = '%s.%s' % (key, self.format)
+        file_path = os.path.join(self.directory, file_name)
+        temp_path = '%s.%s.tmp' % (file_path, uuid.uuid4().hex)
+        try:
+            self._write(df, temp_path)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            self.logger.logDebug('Unable to write cache entry %s: %s' % (key, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (key, api_relative_path, file_name, os.path.getsize(file_path), now,
+                          now + ttl if ttl is not None else None, now))
+            self._evict(conn)
+
+    def invalidate(self, api_relative_path: str = None, key: str = None):
+        with self._connect() as conn:
+            if key is not None:
+                rows = conn.execute('SELECT key, file_name FROM entries WHERE key = ?', (key,)).fetchall()
+            elif api_relative_path is not None:
+                rows = conn.execute('SELECT key, file_name FROM entries WHERE path = ?', (api_relative_path,)).fetchall()
+            else:
+                rows = conn.execute('SELECT key, file_name FROM entries').fetchall()
+            self._delete(conn, rows)
+
+    def getSize(self) -> int:
+        with self._connect() as conn:
+            return conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def _evict(self, conn):
+        # Drop expired entries, then least recently used ones until under the size cap
+        self._delete(conn, conn.execute('SELECT key, file_name FROM entries WHERE expires < ?', (time.time(),)).fetchall())
+
+        totalSize = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if totalSize <= self.maxSizeBytes:
+            return
+
+        evicted = []
+        for key, file_name, size in conn.execute('SELECT key, file_name, size FROM entries ORDER BY last_access'):
+            if totalSize <= self.maxSizeBytes:
+                break
+            evicted.append((key, file_name))
+            totalSize -= size
+        self._delete(conn, evicted)
+
+    def _delete(self, conn, rows):
+        for key, file_name in rows:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            try:
+                os.remove(os.path.join(self.directory, file_name))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, df: pd.DataFrame, file_path: str):
+        if self.format == 'parquet':
+            df.to_parquet(file_path, engine='pyarrow', index=True)
+        else:
+            df.to_pickle(file_path)
+
+    def _read(self, file_path: str) -> pd.DataFrame:
+        if file_path.endswith('.parquet'):
+            return pd.read_parquet(file_path, engine='pyarrow')
+        return pd.read_pickle(file_path)
@@ -0,0 +1,194 @@
+import io
+import numpy as np
+import pandas as pd
+
+from quantamatics.core import settings
+from quantamatics.core.utils import QException
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    _arrowAvailable = True
+except ImportError:
+    _arrowAvailable = False
+
+ArrowStreamContentType = 'application/vnd.apache.arrow.stream'
+ArrowFileContentType = 'application/vnd.apache.arrow.file'
+ParquetContentTypes = ['application/vnd.apache.parquet', 'application/x-parquet']
+
+
+def isBinaryDecodingAvailable() -> bool:
+    return _arrowAvailable
+
+
+def getAcceptedContentTypes() -> list:
+    if _arrowAvailable:
+        return [ArrowStreamContentType, ArrowFileContentType] + ParquetContentTypes
+    return []
+
+
+def schemaToDtypes(schema: dict) -> dict:
+    dtypes = {}
+    for column_name in schema:
+        column_type = schema[column_name]['type']
+        column_nullable = schema[column_name]['nullable']
+
+        if column_type == 'datetime.date':
+            dtypes[column_name] = 'object'
+        elif column_type == 'np.datetime64[ns]':
+            dtypes[column_name] = 'object'
+        elif column_type == 'int32':
+            if column_nullable:
+                dtypes[column_name] ='Int32'
+            else:
+                dtypes[column_name] = 'int32'
+        elif column_type == 'int64':
+            if column_nullable:
+                dtypes[column_name] = 'Int64'
+            else:
+                dtypes[column_name] = 'int64'
+        elif column_type == 'bool':
+            if column_nullable:
+                dtypes[column_name] = 'object'
+            else:
+                dtypes[column_name] = 'bool'
+        elif (column_type == 'float64' or column_type == 'str' or column_type == 'bytes'):
+            dtypes[column_name] = column_type
+        else:
+            raise QException('Unknown DataFrame Column type returned by API call')
+
+    return dtypes
+
+
+def _toDatetime(values: list) -> pd.Series:
+    # JSON dates arrive either as ISO strings or as epoch milliseconds
+    sample = next((x for x in values if x is not None), None)
+    if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+        return pd.to_datetime(pd.Series(values, dtype='float64'), unit='ms')
+    return pd.to_datetime(pd.Series(values, dtype=object))
+
+
+def _compactFloat(values: np.ndarray) -> np.ndarray:
+    # float32 only where every value survives the round trip within settings.CompactFloatTolerance
+    with np.errstate(over='ignore', invalid='ignore'):
+        compactValues = values.astype('float32')
+        restoredValues = compactValues.astype('float64')
+
+    isFinite = np.isfinite(values)
+    if not np.array_equal(np.isfinite(restoredValues), isFinite):
+        return values
+
+    error = np.abs(restoredValues[isFinite] - values[isFinite])
+    if (error <= settings.CompactFloatTolerance * np.abs(values[isFinite])).all():
+        return compactValues
+    return values
+
+
+def _compactInt(values: np.ndarray) -> np.ndarray:
+    if len(values) > 0 and np.iinfo('int32').min <= values.min() and values.max() <= np.iinfo('int32').max:
+        return values.astype('int32')
+    return values
+
+
+def _buildColumn(values: list, column_type: str, dtype: str, compact: bool = False, categorical: bool = False):
+    if column_type == 'datetime.date':
+        if compact:
+            return _toDatetime(values).to_numpy()
+        return _toDatetime(values).dt.date.to_numpy()
+    elif column_type == 'np.datetime64[ns]':
+        return _toDatetime(values).to_numpy()
+    elif categorical:
+        return pd.Categorical(values)
+    elif dtype in ['Int32', 'Int64']:
+        return pd.array(values, dtype=dtype)
+    elif compact and dtype == 'float64':
+        return _compactFloat(np.array(values, dtype=dtype))
+    elif compact and dtype == 'int64':
+        return _compactInt(np.array(values, dtype=dtype))
+    elif compact and column_type == 'bool' and dtype == 'object':
+        return pd.array(values, dtype='boolean')
+    elif dtype in ['int32', 'int64', 'float64', 'bool']:
+        return np.array(values, dtype=dtype)
+    elif dtype == 'str':
+        return pd.Series(values).to_numpy() if len(values) > 0 else np.array([], dtype=object)
+    else:
+        return np.array(values, dtype=object)
+
+
+def frameFromColumns(schema: dict, data: dict, compact: bool = False, categoricalColumns: list = None) -> pd.DataFrame:
+    # data is the 'columns' orient payload: {column -> {index -> value}} or {column -> [values]}
+    # compact decodes categoricalColumns as categoricals, dates as datetime64 and narrows floats and ints where lossless
+    dtypes = schemaToDtypes(schema)
+    categoricalColumns = set(categoricalColumns) if compact and categoricalColumns is not None else set()
+
+    index = None
+    columns = {}
+    for column_name, column_values in data.items():
+        if isinstance(column_values, dict):
+            if index is None:
+                index = list(column_values.keys())
+                values = list(column_values.values())
+            else:
+                values = [column_values.get(x) for x in index]
+        else:
+            values = column_values
+
+        if column_name in schema:
+            columns[column_name] = _buildColumn(values, schema[column_name]['type'], dtypes[column_name],
+                                                compact, column_name in categoricalColumns)
+        elif column_name in categoricalColumns:
+            columns[column_name] = pd.Categorical(values)
+        else:
+            columns[column_name] = np.array(values, dtype=object)
+
+    # Always return at least the schema, even when no records were returned
+    rowCount = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+    for column_name in schema:
+        if column_name not in columns:
+            if rowCount == 0:
+                columns[column_name] = _buildColumn([], schema[column_name]['type'], dtypes[column_name],
+                                                    compact, column_name in categoricalColumns)
+            else:
+                columns[column_name] = np.full(rowCount, None, dtype=object)
+
+    if index is not None:
+        try:
+            index = pd.Index(np.array(index, dtype='int64'))
+        except (TypeError, ValueError):
+            index = pd.Index(index)
+
+    return pd.DataFrame(columns, index=index)
+
+
+def _tableToFrame(table, compact: bool = False, categoricalColumns: list = None) -> pd.DataFrame:
+    if not compact:
+        return table.to_pandas()
+
+    # Dictionary encode the dimension columns in Arrow so pandas builds the categoricals without object strings
+    categories = [x for x in (categoricalColumns or []) if x in table.column_names]
+    df = table.to_pandas(categories=categories, date_as_object=False)
+    for column_name in df.columns:
+        if df[column_name].dtype == 'float64':
+            df[column_name] = _compactFloat(df[column_name].to_numpy())
+        elif df[column_name].dtype == 'int64':
+            df[column_name] = _compactInt(df[column_name].to_numpy())
+    return df
+
+
+def frameFromArrow(body: bytes, contentType: str, compact: bool = False, categoricalColumns: list = None) -> pd.DataFrame:
+    if not _arrowAvailable:
+        raise QException('pyarrow is required to decode %s responses' % contentType)
+
+    reader = pyarrow.BufferReader(body)
+    if contentType == ArrowFileContentType:
+        table = pyarrow.ipc.open_file(reader).read_all()
+    else:
+        table = pyarrow.ipc.open_stream(reader).read_all()
+    return _tableToFrame(table, compact, categoricalColumns)
+
+
+def frameFromParquet(body: bytes, compact: bool = False, categoricalColumns: list = None) -> pd.DataFrame:
+    if not _arrowAvailable:
+        raise QException('pyarrow is required to decode parquet responses')
+    return _tableToFrame(pyarrow.parquet.read_table(io.BytesIO(body)), compact, categoricalColumns)
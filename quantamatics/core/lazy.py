@@ -0,0 +1,74 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from quantamatics.core.loop import runSync
+
+
+class LazyGroup:
+    # Objects created together (e.g. the KPIs of one financial statement) share a group, so the first lazy field read on
+    # any of them loads every member still unloaded in one batch
+    def __init__(self):
+        self.members = []
+
+    def add(self, member):
+        member.__dict__['_lazyGroup'] = self
+        self.members.append(member)
+        return member
+
+    async def loadAsync(self, member):
+        pending = [x for x in self.members if not x.isLoaded()]
+        if not any([x is member for x in pending]):
+            pending.append(member)
+        await type(member)._loadManyAsync(pending)
+
+
+class LazyObject(ABC):
+    # Fields in _lazyFields are fetched on first access. Subclasses implement _loadAsync, which sets the fields and calls
+    # _setLoaded, and may override _loadManyAsync to load a batch of siblings with fewer requests
+    _lazyFields = ()
+
+    def __getattr__(self, name):
+        # Only reached for attributes that are not set yet
+        if name in type(self)._lazyFields and not self.isLoaded():
+            self.load()
+            if name in self.__dict__:
+                return self.__dict__[name]
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    def _setLazy(self, **fields):
+        # Fields passed to the constructor are kept, the rest load on first access
+        self.__dict__['_lazyLoaded'] = False
+        for name, value in fields.items():
+            if value is not None:
+                self.__dict__[name] = value
+
+    def _setLoaded(self):
+        self.__dict__['_lazyLoaded'] = True
+
+    def isLoaded(self) -> bool:
+        # Objects built from rows that were already loaded never set the flag
+        return self.__dict__.get('_lazyLoaded', True)
+
+    def load(self):
+        if not self.isLoaded():
+            runSync(self.loadAsync())
+        return self
+
+    async def loadAsync(self):
+        # Async code loads the object before reading its fields, a lazy read there would block the loop
+        group = self.__dict__.get('_lazyGroup')
+        if group is not None and not self.isLoaded():
+            await group.loadAsync(self)
+
+        # Members a batch could not answer load on their own, which raises their error
+        if not self.isLoaded():
+            await self._loadAsync()
+        return self
+
+    @abstractmethod
+    async def _loadAsync(self):
+        pass
+
+    @classmethod
+    async def _loadManyAsync(cls, members: list):
+        await asyncio.gather(*[x._loadAsync() for x in members], return_exceptions=True)
@@ -0,0 +1,53 @@
+import asyncio
+import atexit
+import os
+import threading
+
+from quantamatics.core.utils import QException
+
+_loop = None
+_thread = None
+_pid = None
+_lock = threading.Lock()
+
+
+def getLoop() -> asyncio.AbstractEventLoop:
+    # One event loop per process on a daemon thread, every synchronous call is run on it
+    global _loop, _thread, _pid
+    with _lock:
+        if _loop is None or _pid != os.getpid() or not _thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_runLoop, args=(_loop,), name='quantamatics-loop', daemon=True)
+            _thread.start()
+            _pid = os.getpid()
+        return _loop
+
+
+def _runLoop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def isLoopThread() -> bool:
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def runSync(coroutine):
+    # Blocks the calling thread (which may run its own event loop) until the coroutine is done on the loop thread
+    if isLoopThread():
+        coroutine.close()
+        raise QException('Synchronous call made from within an async call, await its async version instead')
+    return asyncio.run_coroutine_threadsafe(_await(coroutine), getLoop()).result()
+
+
+async def _await(awaitable):
+    # run_coroutine_threadsafe only takes coroutines, async generator steps are awaitables
+    return await awaitable
+
+
+def _stopLoop():
+    if _loop is not None and _pid == os.getpid() and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_loop.stop)
+
+
+atexit.register(_stopLoop)
@@ -0,0 +1,175 @@
+import bisect
+import threading
+
+from quantamatics.core import settings
+
+# Upper bounds in seconds of the latency histogram buckets (an implicit +Inf bucket follows)
+DefaultLatencyBuckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Where the time of a request goes- waiting for a scheduler slot, opening the connection, until the response headers
+# arrive (server time), reading the body, parsing the JSON payload and building the DataFrame
+LatencyStages = ['queueWait', 'connect', 'ttfb', 'download', 'jsonDecode', 'frameBuild']
+
+_counters = {
+    'requestCount': ('requests_total', 'Requests sent, retries included'),
+    'errorCount': ('request_errors_total', 'Requests that failed or returned a status other than 200'),
+    'retryCount': ('request_retries_total', 'Requests that were retries of a failed attempt'),
+    'coalescedCount': ('coalesced_requests_total', 'Calls that joined an identical request already in flight'),
+    'cacheHits': ('cache_hits_total', 'Calls answered from the local response cache'),
+    'cacheMisses': ('cache_misses_total', 'Calls the local response cache could not answer'),
+    'wireBytes': ('response_wire_bytes_total', 'Response body bytes received, before decompression'),
+    'bodyBytes': ('response_body_bytes_total', 'Response body bytes after decompression'),
+    'decodedBytes': ('response_decoded_bytes_total', 'Memory used by the DataFrames decoded from responses')
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = None):
+        self.buckets = tuple(sorted(buckets if buckets is not None else DefaultLatencyBuckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def getCumulativeCounts(self) -> list:
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def getQuantile(self, quantile: float) -> float:
+        # Upper bound of the bucket holding the quantile, the largest value seen for the +Inf bucket
+        if self.count == 0:
+            return 0.0
+        rank = quantile * self.count
+        for i, total in enumerate(self.getCumulativeCounts()):
+            if total >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def toDict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count > 0 else 0.0,
+            'max': self.max,
+            'p50': self.getQuantile(0.5),
+            'p95': self.getQuantile(0.95),
+            'p99': self.getQuantile(0.99),
+            'buckets': dict(zip([str(x) for x in self.buckets] + ['+Inf'], self.getCumulativeCounts()))
+        }
+
+
+class _EndpointMetrics:
+    def __init__(self, buckets: tuple = None):
+        self.stages = dict([[x, Histogram(buckets)] for x in LatencyStages])
+        self.counters = dict([[x, 0] for x in _counters])
+        self.statusCounts = {}
+
+    def toDict(self) -> dict:
+        lookups = self.counters['cacheHits'] + self.counters['cacheMisses']
+        return {
+            **self.counters,
+            'cacheHitRatio': self.counters['cacheHits'] / lookups if lookups > 0 else None,
+            'compressionRatio': self.counters['bodyBytes'] / self.counters['wireBytes']
+            if self.counters['wireBytes'] > 0 else None,
+            'statusCounts': dict(self.statusCounts),
+            'stages': dict([[k, v.toDict()] for k, v in self.stages.items() if v.count > 0])
+        }
+
+
+class SessionMetrics:
+    # Per endpoint latency histograms and counters collected by Session while settings.CollectMetrics is set. Shared by
+    # every thread and event loop using the session
+    def __init__(self, buckets: tuple = None):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def _getEndpoint(self, api_relative_path: str) -> _EndpointMetrics:
+        endpoint = self._endpoints.get(api_relative_path)
+        if endpoint is None:
+            endpoint = self._endpoints[api_relative_path] = _EndpointMetrics(self.buckets)
+        return endpoint
+
+    def observe(self, api_relative_path: str, stage: str, seconds: float):
+        if not settings.CollectMetrics or seconds is None:
+            return
+        with self._lock:
+            self._getEndpoint(api_relative_path).stages[stage].observe(seconds)
+
+    def increment(self, api_relative_path: str, counter: str, value: int = 1):
+        if not settings.CollectMetrics:
+            return
+        with self._lock:
+            self._getEndpoint(api_relative_path).counters[counter] += value
+
+    def recordStatus(self, api_relative_path: str, status: int):
+        if not settings.CollectMetrics:
+            return
+        with self._lock:
+            statusCounts = self._getEndpoint(api_relative_path).statusCounts
+            statusCounts[status] = statusCounts.get(status, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            endpoints = dict([[k, v.toDict()] for k, v in self._endpoints.items()])
+
+        totals = dict([[x, sum([v[x] for v in endpoints.values()])] for x in _counters])
+        lookups = totals['cacheHits'] + totals['cacheMisses']
+        totals['cacheHitRatio'] = totals['cacheHits'] / lookups if lookups > 0 else None
+        totals['compressionRatio'] = totals['bodyBytes'] / totals['wireBytes'] if totals['wireBytes'] > 0 else None
+        return {'totals': totals, 'endpoints': endpoints}
+
+    def toPrometheus(self, prefix: str = 'quantamatics') -> str:
+        # Prometheus text exposition format, one series per endpoint (and stage for the histograms)
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            lines = [
+                '# HELP %s_request_stage_seconds Time spent in each stage of a request' % prefix,
+                '# TYPE %s_request_stage_seconds histogram' % prefix
+            ]
+            for path, endpoint in endpoints:
+                for stage, histogram in endpoint.stages.items():
+                    if histogram.count == 0:
+                        continue
+                    labels = 'endpoint="%s",stage="%s"' % (_escapeLabel(path), stage)
+                    bounds = [_formatNumber(x) for x in histogram.buckets] + ['+Inf']
+                    for bound, total in zip(bounds, histogram.getCumulativeCounts()):
+                        lines.append('%s_request_stage_seconds_bucket{%s,le="%s"} %d' % (prefix, labels, bound, total))
+                    lines.append('%s_request_stage_seconds_sum{%s} %s' % (prefix, labels, _formatNumber(histogram.sum)))
+                    lines.append('%s_request_stage_seconds_count{%s} %d' % (prefix, labels, histogram.count))
+
+            for counter, (name, description) in _counters.items():
+                lines.append('# HELP %s_%s %s' % (prefix, name, description))
+                lines.append('# TYPE %s_%s counter' % (prefix, name))
+                for path, endpoint in endpoints:
+                    lines.append('%s_%s{endpoint="%s"} %d' % (prefix, name, _escapeLabel(path), endpoint.counters[counter]))
+
+            lines.append('# HELP %s_responses_total Responses received by status code' % prefix)
+            lines.append('# TYPE %s_responses_total counter' % prefix)
+            for path, endpoint in endpoints:
+                for status, count in sorted(endpoint.statusCounts.items()):
+                    lines.append('%s_responses_total{endpoint="%s",status="%s"} %d' % (prefix, _escapeLabel(path), status, count))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escapeLabel(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatNumber(value: float) -> str:
+    return repr(float(value))
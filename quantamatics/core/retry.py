@@ -0,0 +1,124 @@
+import asyncio
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from quantamatics.core import settings
+
+
+class RetryPolicy:
+    def __init__(self, maxAttempts: int = None, baseDelay: float = None, maxDelay: float = None,
+                 multiplier: float = 2.0, jitter: bool = True, retryStatuses: list = None,
+                 retryOnNetworkErrors: bool = True, respectRetryAfter: bool = True,
+                 circuitBreakerThreshold: int = None, circuitBreakerResetTimeout: float = None):
+        self.maxAttempts = max(1, maxAttempts if maxAttempts is not None else settings.RetryMaxAttempts)
+        self.baseDelay = baseDelay if baseDelay is not None else settings.RetryBaseDelay
+        self.maxDelay = maxDelay if maxDelay is not None else settings.RetryMaxDelay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retryStatuses = retryStatuses
+        self.retryOnNetworkErrors = retryOnNetworkErrors
+        self.respectRetryAfter = respectRetryAfter
+        self.circuitBreakerThreshold = circuitBreakerThreshold if circuitBreakerThreshold is not None \
+            else settings.CircuitBreakerThreshold
+        self.circuitBreakerResetTimeout = circuitBreakerResetTimeout if circuitBreakerResetTimeout is not None \
+            else settings.CircuitBreakerResetTimeout
+
+    def isRetryableStatus(self, status: int) -> bool:
+        if self.retryStatuses is not None:
+            return status in self.retryStatuses
+        return status >= 500 or status == 429
+
+    def isRetryableException(self, exception: Exception) -> bool:
+        if not self.retryOnNetworkErrors:
+            return False
+
+        import aiohttp
+        return isinstance(exception, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    def getDelay(self, attempt: int, retryAfter: str = None) -> float:
+        if self.respectRetryAfter and retryAfter is not None:
+            delay = parseRetryAfter(retryAfter)
+            if delay is not None:
+                return min(delay, self.maxDelay)
+
+        # Exponential backoff with full jitter so concurrent callers do not retry in lockstep
+        delay = min(self.maxDelay, self.baseDelay * (self.multiplier ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+def parseRetryAfter(retryAfter: str) -> float:
+    try:
+        return max(0.0, float(retryAfter))
+    except ValueError:
+        pass
+
+    try:
+        retryDate = parsedate_to_datetime(retryAfter)
+    except (TypeError, ValueError):
+        return None
+    if retryDate.tzinfo is None:
+        retryDate = retryDate.replace(tzinfo=timezone.utc)
+    return max(0.0, (retryDate - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    # Closed until threshold consecutive failures, then open (requests fail fast) for resetTimeout seconds. After that it
+    # is half open- a single probe request is let through, its success closes the circuit and its failure reopens it
+    def __init__(self, threshold: int, resetTimeout: float):
+        self.threshold = threshold
+        self.resetTimeout = resetTimeout
+        self.failureCount = 0
+        self.openedAt = None
+        self.probing = False
+        self._probeStartedAt = None
+        self._lock = threading.Lock()
+
+    def _isEnabled(self) -> bool:
+        return self.threshold is not None and self.threshold > 0
+
+    def allowRequest(self) -> bool:
+        with self._lock:
+            if not self._isEnabled() or self.openedAt is None:
+                return True
+
+            now = time.monotonic()
+            if self.probing:
+                # A probe that never reported back (cancelled, or failed with an error that is not retried) is
+                # replaced once another reset timeout has passed
+                if now - self._probeStartedAt < self.resetTimeout:
+                    return False
+            elif now - self.openedAt < self.resetTimeout:
+                return False
+
+            self.probing = True
+            self._probeStartedAt = now
+            return True
+
+    def isOpen(self) -> bool:
+        with self._lock:
+            if not self._isEnabled() or self.openedAt is None:
+                return False
+            if self.probing:
+                return time.monotonic() - self._probeStartedAt < self.resetTimeout
+            return time.monotonic() - self.openedAt < self.resetTimeout
+
+    def recordSuccess(self):
+        with self._lock:
+            self.failureCount = 0
+            self.openedAt = None
+            self.probing = False
+
+    def recordFailure(self):
+        with self._lock:
+            self.failureCount += 1
+            if self.probing:
+                # The probe failed, the circuit opens again for a full reset timeout
+                self.probing = False
+                self.openedAt = time.monotonic()
+            elif self._isEnabled() and self.failureCount >= self.threshold:
+                self.openedAt = time.monotonic()
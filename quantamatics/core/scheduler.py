@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import itertools
+import threading
+import time
+
+from quantamatics.core import settings
+from quantamatics.core.loop import getLoop
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def getWaitTime(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.requestCount = 0
+        self.totalWaitTime = 0.0
+        self.maxWaitTime = 0.0
+
+    def record(self, waitTime: float):
+        self.requestCount += 1
+        self.totalWaitTime += waitTime
+        self.maxWaitTime = max(self.maxWaitTime, waitTime)
+
+    def toDict(self) -> dict:
+        return {
+            'requestCount': self.requestCount,
+            'totalWaitTime': self.totalWaitTime,
+            'averageWaitTime': self.totalWaitTime / self.requestCount if self.requestCount > 0 else 0.0,
+            'maxWaitTime': self.maxWaitTime
+        }
+
+
+class RequestScheduler:
+    # Grants requests a slot in priority order (lower value first, FIFO within a priority), subject to a
+    # concurrency cap, an overall token bucket and per endpoint token buckets. The limits are shared by every thread
+    # and event loop using the scheduler
+    def __init__(self, maxConcurrency: int = None, globalRate: float = None, globalBurst: float = None,
+                 endpointRates: dict = None):
+        self.maxConcurrency = maxConcurrency
+        self._globalBucket = TokenBucket(globalRate, globalBurst) if globalRate else None
+
+        # endpointRates: {path prefix: rate} or {path prefix: (rate, burst)}
+        self._endpointBuckets = {}
+        for prefix, rate in (endpointRates or {}).items():
+            if isinstance(rate, (tuple, list)):
+                self._endpointBuckets[prefix] = TokenBucket(rate[0], rate[1])
+            else:
+                self._endpointBuckets[prefix] = TokenBucket(rate)
+
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._wakeupAt = None
+        self._lock = threading.RLock()
+        self.resetStats()
+
+    def resetStats(self):
+        with self._lock:
+            self._stats = _EndpointStats()
+            self._endpointStats = {}
+            self._priorityStats = {}
+
+    def _getEndpointBucket(self, api_relative_path: str) -> TokenBucket:
+        matches = [x for x in self._endpointBuckets if api_relative_path.startswith(x)]
+        if len(matches) == 0:
+            return None
+        return self._endpointBuckets[max(matches, key=len)]
+
+    @contextlib.asynccontextmanager
+    async def request(self, api_relative_path: str, priority: int = None):
+        waitTime = await self.acquire(api_relative_path, priority)
+        try:
+            yield waitTime
+        finally:
+            self.release()
+
+    async def acquire(self, api_relative_path: str, priority: int = None) -> float:
+        if priority is None:
+            priority = settings.RequestPriorities.Interactive
+
+        enqueuedAt = time.monotonic()
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        with self._lock:
+            entry = (priority, next(self._sequence), api_relative_path, future, loop)
+            self._waiting.append(entry)
+        self._dispatch()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                isWaiting = entry in self._waiting
+                if isWaiting:
+                    self._waiting.remove(entry)
+            # A slot granted from another thread is given back by _grant once it sees the cancelled future
+            if not isWaiting and future.done() and not future.cancelled():
+                self.release()
+            raise
+
+        waitTime = time.monotonic() - enqueuedAt
+        with self._lock:
+            self._stats.record(waitTime)
+            self._endpointStats.setdefault(api_relative_path, _EndpointStats()).record(waitTime)
+            self._priorityStats.setdefault(priority, _EndpointStats()).record(waitTime)
+        return waitTime
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._dispatch()
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(True)
+
+    def _dispatch(self):
+        with self._lock:
+            self._dispatchLocked()
+
+    def _dispatchLocked(self):
+        try:
+            runningLoop = asyncio.get_running_loop()
+        except RuntimeError:
+            runningLoop = None
+
+        nextWakeup = None
+        for entry in sorted(self._waiting, key=lambda x: (x[0], x[1])):
+            if self.maxConcurrency is not None and self._active >= self.maxConcurrency:
+                break
+
+            future, loop = entry[3], entry[4]
+            if future.done() or loop.is_closed():
+                self._waiting.remove(entry)
+                continue
+
+            if self._globalBucket is not None:
+                globalWait = self._globalBucket.getWaitTime()
+                if globalWait > 0:
+                    nextWakeup = globalWait if nextWakeup is None else min(nextWakeup, globalWait)
+                    break
+
+            # A request waiting on its own endpoint's quota does not hold up other endpoints
+            endpointBucket = self._getEndpointBucket(entry[2])
+            if endpointBucket is not None:
+                endpointWait = endpointBucket.getWaitTime()
+                if endpointWait > 0:
+                    nextWakeup = endpointWait if nextWakeup is None else min(nextWakeup, endpointWait)
+                    continue
+                endpointBucket.consume()
+
+            if self._globalBucket is not None:
+                self._globalBucket.consume()
+
+            self._waiting.remove(entry)
+            self._active += 1
+            if loop is runningLoop:
+                future.set_result(True)
+            else:
+                # Waiters on other threads' loops are woken on their own loop
+                loop.call_soon_threadsafe(self._grant, future)
+
+        if nextWakeup is not None and len(self._waiting) > 0:
+            self._scheduleWakeup(nextWakeup)
+
+    def _scheduleWakeup(self, delay: float):
+        # Timers run on the background loop, which outlives the loops of the waiting callers
+        wakeupAt = time.monotonic() + delay
+        if self._wakeupAt is not None and time.monotonic() < self._wakeupAt <= wakeupAt:
+            return
+        self._wakeupAt = wakeupAt
+        loop = getLoop()
+        loop.call_soon_threadsafe(loop.call_later, delay, self._onWakeup)
+
+    def _onWakeup(self):
+        with self._lock:
+            self._wakeupAt = None
+            self._dispatchLocked()
+
+    def getQueueDepth(self, priority: int = None) -> int:
+        with self._lock:
+            if priority is None:
+                return len(self._waiting)
+            return len([x for x in self._waiting if x[0] == priority])
+
+    def getStats(self) -> dict:
+        with self._lock:
+            queueDepthByPriority = {}
+            for entry in self._waiting:
+                queueDepthByPriority[entry[0]] = queueDepthByPriority.get(entry[0], 0) + 1
+
+            return {
+                'queueDepth': len(self._waiting),
+                'queueDepthByPriority': queueDepthByPriority,
+                'activeRequests': self._active,
+                **self._stats.toDict(),
+                'byPriority': dict([[k, v.toDict()] for k, v in self._priorityStats.items()]),
+                'byEndpoint': dict([[k, v.toDict()] for k, v in self._endpointStats.items()])
+            }
@@ -52,6 +52,89 @@ APIEndpoint = os.environ.get('QMC_API_ENDPOINT')
 if APIEndpoint is None:
     APIEndpoint = 'https://api.quantamatics.com'
 
+# Local response cache- set QMC_CACHE_DIR (or LocalCacheDirectory) to keep decoded API responses on disk
+LocalCacheDirectory = os.environ.get('QMC_CACHE_DIR')
+LocalCacheMaxSizeMB = 2048
+LocalCacheDefaultTTL = 86400
+
+# Ask the API for Arrow / Parquet bodies instead of JSON for tabular responses (requires pyarrow)
+AcceptBinaryResponses = False
+
+# Compact panel frames, decoded with categorical dimensions, datetime64 dates and float32 measures wherever every value
+# survives the round trip within CompactFloatTolerance relative error (0 keeps float64 unless the values are exact)
+CompactDtypes = False
+CompactFloatTolerance = 0.0
+
+# Opt in to loading Instrument, Company and KPI fields on first access instead of in the constructor. Constructors
+# validate eagerly by default- an unknown symbol or ID raises there, not on first field access. Per object with
+# Instrument(lazy=True), Company(preLoad=False) and KPI(preLoad=False); KPIs of FinancialStatement.getKPIs are always lazy
+# and load together
+LazyLoading = False
+
+# Number of concurrent requests used by Panel.loadDataBatch
+DefaultBatchConcurrency = 8
+
+# Minimum number of days requested per page by Panel.loadDataChunks
+StreamChunkDays = 366
+
+# Incremental panel refresh (Panel.refreshData)- days before the last loaded date that are requested again to pick up
+# restatements, and where the last loaded frames are kept (set QMC_PANEL_SNAPSHOT_DIR, in memory only when not set)
+RestatementWindowDays = 7
+PanelSnapshotDirectory = os.environ.get('QMC_PANEL_SNAPSHOT_DIR')
+
+# Local Parquet panel store checked by Panel.loadData before the API- set QMC_PANEL_STORE_DIR (or PanelStoreDirectory)
+PanelStoreDirectory = os.environ.get('QMC_PANEL_STORE_DIR')
+
+# Trailing days of each stored ticker requested again by every Panel.loadData, to pick up rows a lagging source
+# delivered late (0 only requests days after the stored range)
+PanelStoreTrailingDays = 3
+
+# Answer Panel.loadData from memory mapped Arrow copies of the panel store, shared between processes on the same host
+MemoryMapPanelStore = False
+
+# Local security master index consulted by Instrument and Company before the API- set QMC_SECMASTER_DIR (or call
+# enableSecurityMasterIndex) to keep it on disk. Entries older than SecurityMasterIndexMaxAge seconds are loaded from
+# the API again, and SecurityMasterIndex.isStale is true once the last refresh is older than that
+SecurityMasterIndexDirectory = os.environ.get('QMC_SECMASTER_DIR')
+SecurityMasterIndexMaxAge = 86400
+
+# HTTP connection pool- total and per host connection limits (0 for no limit), idle keep-alive seconds,
+# DNS cache TTL seconds and connect / socket read / total request timeouts in seconds (None for no limit)
+ConnectionPoolSize = 100
+ConnectionPoolSizePerHost = 0
+KeepAliveTimeout = 30
+DNSCacheTTL = 300
+ConnectTimeout = 30
+ReadTimeout = 300
+TotalTimeout = None
+
+# Retries- attempts per request, exponential backoff base / cap in seconds, and the number of consecutive
+# failures after which an endpoint's circuit opens for CircuitBreakerResetTimeout seconds (0 disables it)
+RetryMaxAttempts = 3
+RetryBaseDelay = 1.0
+RetryMaxDelay = 30.0
+CircuitBreakerThreshold = 10
+CircuitBreakerResetTimeout = 30.0
+
+# Client side request scheduling- requests in flight, overall requests per second (and burst size) and
+# per endpoint prefix limits as {'/api/data/panel': rate} or {'/api/data/panel': (rate, burst)}. None for no limit
+MaxConcurrentRequests = 100
+GlobalRateLimit = None
+GlobalRateBurst = None
+EndpointRateLimits = {}
+
+# Share one in flight request between concurrent callers making the same call
+CoalesceRequests = True
+
+# Record per endpoint latency histograms, byte counts, retries and cache hit ratios on the Session (Session.getMetrics)
+CollectMetrics = True
+
+# Request priorities, lower values are sent first when requests are queued
+__request_priorities = {'Interactive': 0,
+                        'Bulk': 10}
+
+RequestPriorities = SimpleNamespace(**__request_priorities)
+
 # Logging
 __loglevels = {'DEBUG': logging.DEBUG,
                'DISABLED': logging.NOTSET}
@@ -70,3 +153,21 @@ __method_types = {'GET': 'GET',
                 'POST': 'POST'}
 
 MethodTypes = SimpleNamespace(**__method_types)
+
+# Worker processes used by ParallelAggregator (None uses every CPU) and their multiprocessing start method (None uses the
+# platform default)
+AggregationWorkers = None
+AggregationStartMethod = None
+
+# Evaluate panel measures with their columnar expressions ('<functionName>_expr') where available,
+# falling back to the row-wise lambdas otherwise
+VectorizedMeasures = True
+
+# Fill policies for days added by Panel.completeDailyRange, per measure via the 'fill_policy' mapping key
+__fill_policies = {'Zero': 'zero',
+                   'NaN': 'nan',
+                   'ForwardFill': 'ffill'}
+
+FillPolicies = SimpleNamespace(**__fill_policies)
+
+DefaultFillPolicy = FillPolicies.Zero
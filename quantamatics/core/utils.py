@@ -1,14 +1,19 @@
 from quantamatics.core import settings
 import logging
+import threading
 import pandas as pd
 
 
 class Singleton(type):
     _instances = {}
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
+        # Threads creating the instance at the same time all get the same one
         if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+            with Singleton._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
 
 
@@ -1,2 +1,30 @@
 from __future__ import absolute_import
-from quantamatics.data import *
\ No newline at end of file
+import importlib
+
+# Classes are imported from their module on first access, so importing the package does not load pandas or aiohttp
+_lazyAttributes = {
+    'CalendarPeriods': 'quantamatics.data.fundamentals',
+    'FinancialStatement': 'quantamatics.data.fundamentals',
+    'KPI': 'quantamatics.data.fundamentals',
+    'Company': 'quantamatics.data.securityMaster',
+    'Instrument': 'quantamatics.data.securityMaster',
+    'Universe': 'quantamatics.data.securityMaster',
+    'SecurityMasterIndex': 'quantamatics.data.securityMasterIndex',
+    'getSecurityMasterIndex': 'quantamatics.data.securityMasterIndex',
+    'enableSecurityMasterIndex': 'quantamatics.data.securityMasterIndex',
+    'disableSecurityMasterIndex': 'quantamatics.data.securityMasterIndex'
+}
+
+__all__ = list(_lazyAttributes)
+
+
+def __getattr__(name):
+    if name in _lazyAttributes:
+        value = getattr(importlib.import_module(_lazyAttributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
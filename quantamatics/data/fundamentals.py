@@ -1,28 +1,49 @@
+import asyncio
 import pandas as pd
 from datetime import date
 
+from quantamatics.core import settings
 from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
+from quantamatics.core.lazy import LazyGroup, LazyObject
 from quantamatics.core.utils import QException
 
 
 class CalendarPeriods:
     def __init__(self, instrumentID: int = None, kpiID: int = None, useReportedForCurrentQuarter: bool = True):
 
+        self._setIDs(instrumentID, kpiID)
+        self._setEvents(runSync(self._loadEventsAsync()), useReportedForCurrentQuarter)
+
+    @classmethod
+    async def createAsync(cls, instrumentID: int = None, kpiID: int = None, useReportedForCurrentQuarter: bool = True):
+        calendarPeriods = cls.__new__(cls)
+        calendarPeriods._setIDs(instrumentID, kpiID)
+        calendarPeriods._setEvents(await calendarPeriods._loadEventsAsync(), useReportedForCurrentQuarter)
+        return calendarPeriods
+
+    def _setIDs(self, instrumentID: int, kpiID: int):
         if instrumentID is None and kpiID is None:
             raise QException('Instrument or KPI ID must be specified')
 
         self.instrumentID = instrumentID
         self.kpiID = kpiID
 
+    async def _loadEventsAsync(self):
         session = Session()
-        self.eventsDF = session.apiWrapper(
+        return await session.apiWrapperAsync(
             '/api/data/calendarPeriods/init',
             {
-                'instrumentId': instrumentID,
-                'kpiId': kpiID
+                'instrumentId': self.instrumentID,
+                'kpiId': self.kpiID
             }
         )
 
+    def _setEvents(self, eventsDF, useReportedForCurrentQuarter: bool):
+        instrumentID = self.instrumentID
+        kpiID = self.kpiID
+        self.eventsDF = eventsDF
+
         if len(self.eventsDF) == 0:
             raise QException('No calendar periods found for instrument')
 
@@ -80,16 +101,25 @@ class CalendarPeriods:
         return self.eventsDF.loc[self.eventsDF['is_next_time_period']]
 
 
-class KPI():
-    def __init__(self, kpiID: int = None, preLoad: bool = True, instrumentID: int = None, kpiName: str = None,
+class KPI(LazyObject):
+    _lazyFields = ('kpiName', 'kpiUOM', 'statementType', 'kpiClass', 'measureName', 'brands', 'KPIDF')
+
+    def __init__(self, kpiID: int = None, preLoad: bool = None, instrumentID: int = None, kpiName: str = None,
                  kpiUOM: str = None):
+        if preLoad is None:
+            preLoad = not settings.LazyLoading
+
         self.kpiID = kpiID
         self.instrumentID = instrumentID
-        self.kpiName = kpiName
-        self.kpiUOM = kpiUOM
+        self._setLazy(kpiName=kpiName, kpiUOM=kpiUOM)
 
         if preLoad:
-            self.loadKPI()
+            self.load()
+
+    @classmethod
+    async def createAsync(cls, kpiID: int = None, instrumentID: int = None, kpiName: str = None, kpiUOM: str = None):
+        kpi = cls(kpiID=kpiID, preLoad=False, instrumentID=instrumentID, kpiName=kpiName, kpiUOM=kpiUOM)
+        return await kpi.loadAsync()
 
     def loadKPI(self, kpiID: int = None, instrumentID: int = None, kpiName: str = None,
                 kpiUOM: str = None):
@@ -101,16 +131,54 @@ class KPI():
             self.kpiName = kpiName
             self.kpiUOM = kpiUOM
 
+        runSync(self._loadAsync())
+
+    async def _loadAsync(self):
         session = Session()
-        self.KPIDF = session.apiWrapper(
+        KPIDF = await session.apiWrapperAsync(
             '/api/data/kpi/load',
             {
                 'kpiId': self.kpiID,
                 'instrumentId': self.instrumentID,
-                'kpiName': self.kpiName,
-                'kpiUom': self.kpiUOM
+                'kpiName': self.__dict__.get('kpiName'),
+                'kpiUom': self.__dict__.get('kpiUOM')
             }
         )
+        self._setFromFrame(KPIDF)
+
+    @classmethod
+    async def _loadManyAsync(cls, members: list):
+        # KPIs of the same instrument are loaded with one request for the instrument (kpi/load filtered on the
+        # instrument only), anything it does not return is loaded on its own
+        byInstrument = {}
+        for kpi in members:
+            if kpi.kpiID is not None and kpi.instrumentID is not None:
+                byInstrument.setdefault(kpi.instrumentID, []).append(kpi)
+
+        session = Session()
+        instrumentIDs = [x for x in byInstrument if len(byInstrument[x]) > 1]
+        results = await asyncio.gather(*[session.apiWrapperAsync(
+            '/api/data/kpi/load',
+            {
+                'kpiId': None,
+                'instrumentId': x,
+                'kpiName': None,
+                'kpiUom': None
+            }
+        ) for x in instrumentIDs], return_exceptions=True)
+
+        for instrumentID, KPIDF in zip(instrumentIDs, results):
+            if isinstance(KPIDF, Exception) or 'kpi_id' not in getattr(KPIDF, 'columns', []):
+                continue
+            for kpiID, kpiDF in KPIDF.groupby('kpi_id', sort=False):
+                for kpi in byInstrument[instrumentID]:
+                    if kpi.kpiID == kpiID:
+                        kpi._setFromFrame(kpiDF.reset_index(drop=True))
+
+        await super()._loadManyAsync([x for x in members if not x.isLoaded()])
+
+    def _setFromFrame(self, KPIDF):
+        self.KPIDF = KPIDF
 
         self.kpiName = self.KPIDF['kpi_name'].iloc[0]
         self.instrumentID = self.KPIDF['instrument_id'].iloc[0]
@@ -123,11 +191,15 @@ class KPI():
         self.brands = list(self.KPIDF.loc[pd.notna(self.KPIDF['brand_name'])]['brand_name'].drop_duplicates().values)
         # self.panels = list(
         #     self.KPIDF.loc[pd.notna(self.KPIDF['dataset_name'])]['dataset_name'].drop_duplicates().values)
+        self._setLoaded()
 
     def getKPIHistory(self, valueType: str = 'Actual', datasetName: str = 'Company KPIs'):
+        return runSync(self.getKPIHistoryAsync(valueType=valueType, datasetName=datasetName))
+
+    async def getKPIHistoryAsync(self, valueType: str = 'Actual', datasetName: str = 'Company KPIs'):
 
         session=Session()
-        self.KPIHistDF = session.apiWrapper(
+        self.KPIHistDF = await session.apiWrapperAsync(
             '/api/data/kpi/getHistory',
             {
                 'kpiId': self.kpiID,
@@ -139,9 +211,13 @@ class KPI():
 
     def getLatestEstimate(self, datasetName: str = 'Consensus Estimates', asOfDate: str = str(date.today()),
                           valueType: str = 'Consensus Mean'):
+        return runSync(self.getLatestEstimateAsync(datasetName=datasetName, asOfDate=asOfDate, valueType=valueType))
+
+    async def getLatestEstimateAsync(self, datasetName: str = 'Consensus Estimates', asOfDate: str = str(date.today()),
+                                     valueType: str = 'Consensus Mean'):
 
         session=Session()
-        self.KPIEstimatesLatestDF = session.apiWrapper(
+        self.KPIEstimatesLatestDF = await session.apiWrapperAsync(
             '/api/data/kpi/getLatestEstimate',
             {
                 'kpiId': self.kpiID,
@@ -154,8 +230,11 @@ class KPI():
         return self.KPIEstimatesLatestDF
 
     def getEstimateHistory(self, datasetName: str = 'Consensus Estimates', valueType: str = 'Consensus Mean'):
+        return runSync(self.getEstimateHistoryAsync(datasetName=datasetName, valueType=valueType))
+
+    async def getEstimateHistoryAsync(self, datasetName: str = 'Consensus Estimates', valueType: str = 'Consensus Mean'):
         session = Session()
-        self.KPIEstimatesHistoryDF = session.apiWrapper(
+        self.KPIEstimatesHistoryDF = await session.apiWrapperAsync(
             '/api/data/kpi/getEstimateHistory',
             {
                 'kpiId': self.kpiID,
@@ -172,11 +251,14 @@ class FinancialStatement():
         self.panelDatasetType = panelDatasetType
 
     def getKPIs(self, primary_only: bool = False, panelDatasetType: str = None):
+        return runSync(self.getKPIsAsync(primary_only=primary_only, panelDatasetType=panelDatasetType))
+
+    async def getKPIsAsync(self, primary_only: bool = False, panelDatasetType: str = None):
         if self.panelDatasetType is None and panelDatasetType is not None:
             self.panelDatasetType = panelDatasetType
 
         session = Session()
-        self.KPIDF = session.apiWrapper(
+        self.KPIDF = await session.apiWrapperAsync(
             '/api/data/financialStatement/getKpis',
             {
                 'instrumentId': self.instrumentID,
@@ -185,20 +267,27 @@ class FinancialStatement():
             }
         )
 
+        # The KPIs load their fields together the first time one of them is read
         self.kpis = []
+        group = LazyGroup()
 
         for row in self.KPIDF.iterrows():
             kpi = KPI(kpiID=row[1].kpi_id, instrumentID=row[1].instrument_id, preLoad=False)
-            self.kpis.append(kpi)
+            self.kpis.append(group.add(kpi))
 
         return self.kpis
 
     def getKPIList(self, primary_only: bool = False, panelDatasetType: str = None, financial_statement: str = None):
+        return runSync(self.getKPIListAsync(primary_only=primary_only, panelDatasetType=panelDatasetType,
+                                            financial_statement=financial_statement))
+
+    async def getKPIListAsync(self, primary_only: bool = False, panelDatasetType: str = None,
+                              financial_statement: str = None):
         if self.panelDatasetType is None and panelDatasetType is not None:
             self.panelDatasetType = panelDatasetType
 
         session=Session()
-        self.KPIDF = session.apiWrapper(
+        self.KPIDF = await session.apiWrapperAsync(
             '/api/data/financialStatement/getKpiList',
             {
                 'instrumentId': self.instrumentID,
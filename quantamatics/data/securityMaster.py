@@ -1,15 +1,49 @@
+import asyncio
+
 from quantamatics.core import settings
 from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
+from quantamatics.core.lazy import LazyObject
 from quantamatics.core.utils import QException, QLog
 from quantamatics.data.fundamentals import FinancialStatement, CalendarPeriods
+from quantamatics.data.securityMasterIndex import getSecurityMasterIndex
+
 
+class Company(LazyObject):
+    _lazyFields = ('companyID', 'companyName', 'sectorName', 'industryName', 'industryGroupName', 'verticalName',
+                   'subverticalName')
 
-class Company:
-    def __init__(self, companyID: int = None, instrumentID: int = None):
+    def __init__(self, companyID: int = None, instrumentID: int = None, preLoad: bool = None):
         if companyID is None and instrumentID is None:
             raise QException('Either Company or Instrument ID is required')
+
+        if preLoad is None:
+            preLoad = not settings.LazyLoading
+
+        self._instrumentID = instrumentID
+        self._setLazy(companyID=companyID)
+
+        if preLoad:
+            self.load()
+
+    @classmethod
+    async def createAsync(cls, companyID: int = None, instrumentID: int = None):
+        company = cls(companyID=companyID, instrumentID=instrumentID, preLoad=False)
+        return await company.loadAsync()
+
+    async def _loadAsync(self):
+        companyID = self.__dict__.get('companyID')
+        instrumentID = self._instrumentID
+
+        index = getSecurityMasterIndex()
+        if index is not None:
+            companyRow = index.getCompany(companyID=companyID, instrumentID=instrumentID)
+            if companyRow is not None:
+                self._setFromRow(companyRow)
+                return
+
         session = Session()
-        companyDF = session.apiWrapper(
+        companyDF = await session.apiWrapperAsync(
             '/api/data/company/init',
             {
                 'companyId': companyID,
@@ -17,6 +51,27 @@ class Company:
             }
         )
 
+        self._setFromFrame(companyDF)
+
+        if index is not None and len(companyDF) == 1:
+            if instrumentID is None and 'instrument_id' in companyDF.columns:
+                instrumentID = companyDF['instrument_id'].iat[0]
+            if instrumentID is not None:
+                index.addCompany(instrumentID, companyDF.iloc[0].to_dict())
+
+    @classmethod
+    def fromFrame(cls, companyDF):
+        company = cls.__new__(cls)
+        company._setFromFrame(companyDF)
+        return company
+
+    @classmethod
+    def fromRow(cls, companyRow: dict):
+        company = cls.__new__(cls)
+        company._setFromRow(companyRow)
+        return company
+
+    def _setFromFrame(self, companyDF):
         if len(companyDF) > 1:
             raise QException('More than one company selected')
 
@@ -27,55 +82,244 @@ class Company:
         self.industryGroupName = companyDF['industry_group_name'].iat[0]
         self.verticalName = companyDF['vertical_name'].iat[0]
         self.subverticalName = companyDF['subvertical_name'].iat[0]
+        self._setLoaded()
+
+    def _setFromRow(self, companyRow: dict):
+        self.companyID = companyRow['company_id']
+        self.companyName = companyRow['company_name']
+        self.sectorName = companyRow['sector_name']
+        self.industryName = companyRow['industry_name']
+        self.industryGroupName = companyRow['industry_group_name']
+        self.verticalName = companyRow['vertical_name']
+        self.subverticalName = companyRow['subvertical_name']
+        self._setLoaded()
 
 
-class Instrument:
+class Instrument(LazyObject):
+    _lazyFields = ('instrumentID', 'instrumentSymbol', 'instrumentName', 'instrumentSector', 'instrumentIndustry')
+
     def __init__(self, instrumentSymbol: str = None, instrumentSymbologyType: str = None,
-                 preLoadLevel: int = 0, instrumentID: int = None, instrumentName: str = None):
-        self.instrumentSymbol = instrumentSymbol
-        self.instrumentID = instrumentID
-        self.instrumentName = instrumentName
+                 preLoadLevel: int = 0, instrumentID: int = None, instrumentName: str = None, lazy: bool = None):
         self.instrumentSymbologyType = instrumentSymbologyType
+        self._setLazy(instrumentSymbol=instrumentSymbol, instrumentID=instrumentID, instrumentName=instrumentName)
 
         self._Company = None
         self._CalendarPeriods = None
         self._FinancialStatement = None
+        self.Symbology = None
         self.logger = QLog()
 
+        # A lazy instrument is resolved when one of its fields is first read
+        if lazy is None:
+            lazy = settings.LazyLoading
+        if not lazy:
+            self.load()
+
+        if preLoadLevel > 2:
+            self._FinancialStatement = FinancialStatement(instrumentID=self.instrumentID)
+        if preLoadLevel > 1:
+            self._CalendarPeriods = CalendarPeriods(instrumentID=self.instrumentID)
+        if preLoadLevel > 0:
+            self._Company = Company(instrumentID=self.instrumentID)
+
+    @classmethod
+    async def createAsync(cls, instrumentSymbol: str = None, instrumentSymbologyType: str = None,
+                          preLoadLevel: int = 0, instrumentID: int = None, instrumentName: str = None):
+        instrument = cls._new(instrumentSymbologyType)
+        instrument._setLazy(instrumentSymbol=instrumentSymbol, instrumentID=instrumentID, instrumentName=instrumentName)
+        await instrument.loadAsync()
+
+        if preLoadLevel > 2:
+            instrument._FinancialStatement = FinancialStatement(instrumentID=instrument.instrumentID)
+        if preLoadLevel > 1:
+            instrument._CalendarPeriods = await CalendarPeriods.createAsync(instrumentID=instrument.instrumentID)
+        if preLoadLevel > 0:
+            instrument._Company = await Company.createAsync(instrumentID=instrument.instrumentID)
+        return instrument
+
+    async def _loadAsync(self):
+        instrumentSymbol = self.__dict__.get('instrumentSymbol')
+        instrumentID = self.__dict__.get('instrumentID')
 
+        # The local index answers symbols it has seen before without a request
+        index = getSecurityMasterIndex()
+        if index is not None:
+            instrumentRow = index.getInstrument(instrumentSymbol, self.instrumentSymbologyType, instrumentID)
+            if instrumentRow is not None:
+                self._setFromRow(instrumentRow)
+                return
 
         session = Session()
-        instrumentDF = session.apiWrapper(
+        instrumentDF = await session.apiWrapperAsync(
             '/api/data/instrument/load',
             {
-                'instrumentSymbol': self.instrumentSymbol,
+                'instrumentSymbol': instrumentSymbol,
                 'instrumentSymbologyType': self.instrumentSymbologyType,
-                'instrumentId': self.instrumentID
+                'instrumentId': instrumentID
             }
         )
 
         if len(instrumentDF) == 0:
-            msg = 'No Instrument Found for Symbol: %s | ID: %s' % (self.instrumentSymbol, self.instrumentID)
+            msg = 'No Instrument Found for Symbol: %s | ID: %s' % (instrumentSymbol, instrumentID)
             raise Exception(msg)
 
         if len(instrumentDF) > 1:
             msg = 'Critical - More than one Instrument Found for Symbol: %s | ID: %s' \
-                  % (self.instrumentSymbol, self.instrumentID)
+                  % (instrumentSymbol, instrumentID)
             self.logger.logDebug(instrumentDF)
             raise QException(msg)
 
+        self._setFromFrame(instrumentDF)
+
+        if index is not None:
+            index.addInstrument(instrumentDF.iloc[0].to_dict(), instrumentSymbol, self.instrumentSymbologyType)
+
+    @classmethod
+    def _new(cls, instrumentSymbologyType: str = None):
+        instrument = cls.__new__(cls)
+        instrument.instrumentSymbologyType = instrumentSymbologyType
+        instrument._Company = None
+        instrument._CalendarPeriods = None
+        instrument._FinancialStatement = None
+        instrument.Symbology = None
+        instrument.logger = QLog()
+        return instrument
+
+    @classmethod
+    def fromRow(cls, instrumentRow: dict, instrumentSymbologyType: str = None):
+        instrument = cls._new(instrumentSymbologyType)
+        instrument._setFromRow(instrumentRow)
+        return instrument
+
+    @classmethod
+    def fromFrame(cls, instrumentDF, instrumentSymbologyType: str = None, symbologyDF=None, companyDF=None):
+        # Builds an Instrument from rows that were already loaded, without any API call
+        instrument = cls._new(instrumentSymbologyType)
+        instrument._setFromFrame(instrumentDF)
+        if symbologyDF is not None:
+            instrument._setSymbology(symbologyDF)
+        if companyDF is not None and len(companyDF) == 1:
+            instrument._Company = Company.fromFrame(companyDF)
+        return instrument
+
+    def _setFromFrame(self, instrumentDF):
         self.instrumentID = instrumentDF['instrument_id'].iat[0]
         self.instrumentSymbol = instrumentDF['symbol'].iat[0]
         self.instrumentName = instrumentDF['instrument_name'].iat[0]
         self.instrumentSector = instrumentDF['sector_name'].iat[0]
         self.instrumentIndustry = instrumentDF['industry_name'].iat[0]
+        self._setLoaded()
 
-        if preLoadLevel > 2:
-            self._FinancialStatement = FinancialStatement(instrumentID=self.instrumentID)
-        if preLoadLevel > 1:
-            self._CalendarPeriods = CalendarPeriods(instrumentID=self.instrumentID)
-        if preLoadLevel > 0:
-            self._Company = Company(instrumentID=self.instrumentID)
+    def _setFromRow(self, instrumentRow: dict):
+        self.instrumentID = instrumentRow['instrument_id']
+        self.instrumentSymbol = instrumentRow['symbol']
+        self.instrumentName = instrumentRow['instrument_name']
+        self.instrumentSector = instrumentRow['sector_name']
+        self.instrumentIndustry = instrumentRow['industry_name']
+        self._setLoaded()
+
+    @staticmethod
+    def loadMany(symbols: str(list), symbologyType: str = None, loadSymbology: bool = True,
+                 loadCompany: bool = False, maxConcurrency: int = None, raiseOnError: bool = False) -> dict:
+
+        return runSync(
+            Instrument.loadManyAsync(
+                symbols=symbols,
+                symbologyType=symbologyType,
+                loadSymbology=loadSymbology,
+                loadCompany=loadCompany,
+                maxConcurrency=maxConcurrency,
+                raiseOnError=raiseOnError
+            )
+        )
+
+    @staticmethod
+    async def loadManyAsync(symbols: str(list), symbologyType: str = None, loadSymbology: bool = True,
+                            loadCompany: bool = False, maxConcurrency: int = None, raiseOnError: bool = False) -> dict:
+        # Resolves the symbols in concurrent batches over the shared session, each with its symbology (and company)
+        # requested together, and returns {symbol: Instrument} for the symbols that resolved
+        if maxConcurrency is None:
+            maxConcurrency = settings.DefaultBatchConcurrency
+
+        session = Session()
+        semaphore = asyncio.Semaphore(maxConcurrency)
+        logger = QLog()
+        index = getSecurityMasterIndex()
+
+        def loadIndexed(symbol):
+            # Only symbols the index fully answers skip the API
+            instrumentRow = index.getInstrument(symbol, symbologyType)
+            if instrumentRow is None:
+                return None
+            symbology = index.getSymbology(instrumentRow['instrument_id']) if loadSymbology else None
+            companyRow = index.getCompany(instrumentID=instrumentRow['instrument_id']) if loadCompany else None
+            if (loadSymbology and symbology is None) or (loadCompany and companyRow is None):
+                return None
+
+            instrument = Instrument.fromRow(instrumentRow, symbologyType)
+            instrument.Symbology = symbology
+            if companyRow is not None:
+                instrument._Company = Company.fromRow(companyRow)
+            return instrument
+
+        async def loadSymbol(symbol):
+            if index is not None:
+                instrument = loadIndexed(symbol)
+                if instrument is not None:
+                    return instrument
+
+            async with semaphore:
+                instrumentDF = await session.apiWrapperAsync(
+                    '/api/data/instrument/load',
+                    {
+                        'instrumentSymbol': symbol,
+                        'instrumentSymbologyType': symbologyType,
+                        'instrumentId': None
+                    }
+                )
+
+                if len(instrumentDF) == 0:
+                    raise QException('No Instrument Found for Symbol: %s' % symbol)
+                if len(instrumentDF) > 1:
+                    raise QException('Critical - More than one Instrument Found for Symbol: %s' % symbol)
+
+                instrumentID = instrumentDF['instrument_id'].iat[0]
+                requests = []
+                if loadSymbology:
+                    requests.append(session.apiWrapperAsync('/api/data/instrument/getSymbology',
+                                                            {'instrumentId': instrumentID}))
+                if loadCompany:
+                    requests.append(session.apiWrapperAsync('/api/data/company/init',
+                                                            {'companyId': None, 'instrumentId': instrumentID}))
+                results = list(await asyncio.gather(*requests))
+
+            symbologyDF = results.pop(0) if loadSymbology else None
+            companyDF = results.pop(0) if loadCompany else None
+            instrument = Instrument.fromFrame(instrumentDF, symbologyType, symbologyDF, companyDF)
+
+            if index is not None:
+                index.addInstrument(instrumentDF.iloc[0].to_dict(), symbol, symbologyType)
+                if instrument.Symbology is not None:
+                    index.addSymbology(instrumentID, instrument.Symbology)
+                if companyDF is not None and len(companyDF) == 1:
+                    index.addCompany(instrumentID, companyDF.iloc[0].to_dict())
+            return instrument
+
+        async def tryLoadSymbol(symbol):
+            try:
+                return symbol, await loadSymbol(symbol), None
+            except Exception as e:
+                logger.logDebug('failed to load %s: %s' % (symbol, e))
+                return symbol, None, e
+
+        symbols = list(dict.fromkeys([symbols] if isinstance(symbols, str) else symbols))
+        results = await asyncio.gather(*[tryLoadSymbol(x) for x in symbols])
+
+        errors = dict([[symbol, error] for symbol, _, error in results if error is not None])
+        if raiseOnError and len(errors) > 0:
+            raise QException('Failed to load %d of %d instruments: %s' % (len(errors), len(symbols), ', '.join(errors)))
+
+        return dict([[symbol, instrument] for symbol, instrument, error in results if error is None])
 
     def getFinancialStatement(self):
         if self._FinancialStatement is None:
@@ -87,36 +331,73 @@ class Instrument:
             self._CalendarPeriods = CalendarPeriods(instrumentID=self.instrumentID)
         return self._CalendarPeriods
 
+    async def getCalendarPeriodsAsync(self):
+        if self._CalendarPeriods is None:
+            await self.loadAsync()
+            self._CalendarPeriods = await CalendarPeriods.createAsync(instrumentID=self.instrumentID)
+        return self._CalendarPeriods
+
     def getCompany(self):
         if self._Company is None:
             self._Company = Company(instrumentID=self.instrumentID)
         return self._Company
 
+    async def getCompanyAsync(self):
+        if self._Company is None:
+            await self.loadAsync()
+            self._Company = Company(instrumentID=self.instrumentID, preLoad=False)
+        return await self._Company.loadAsync()
+
+    def getSymbology(self, refresh: bool = False):
+        # Symbology is loaded once per instrument (or pre-populated by loadMany)
+        if self.Symbology is not None and not refresh:
+            return self.Symbology
+        return runSync(self.getSymbologyAsync(refresh=refresh))
 
-    def getSymbology(self):
+    async def getSymbologyAsync(self, refresh: bool = False):
+        await self.loadAsync()
         if self.instrumentID is None:
             raise QException('No instrument defined')
 
+        if self.Symbology is not None and not refresh:
+            return self.Symbology
+
+        index = getSecurityMasterIndex()
+        if index is not None and not refresh:
+            self.Symbology = index.getSymbology(self.instrumentID)
+            if self.Symbology is not None:
+                return self.Symbology
+
         session = Session()
-        symbologyDF = session.apiWrapper(
+        symbologyDF = await session.apiWrapperAsync(
             '/api/data/instrument/getSymbology',
             {
                 'instrumentId': self.instrumentID
             }
         )
 
+        self._setSymbology(symbologyDF)
+        if index is not None:
+            index.addSymbology(self.instrumentID, self.Symbology)
+        return self.Symbology
+
+    def _setSymbology(self, symbologyDF):
         self.Symbology = dict()
-        for itx in symbologyDF.iterrows():
-            self.Symbology.update({itx[1].symbology_type: itx[1].symbol})
+        if len(symbologyDF) > 0:
+            self.Symbology = dict(zip(symbologyDF['symbology_type'], symbologyDF['symbol']))
         return self.Symbology
 
     def getBrands(self, brandName: str = None):
+        return runSync(self.getBrandsAsync(brandName=brandName))
+
+    async def getBrandsAsync(self, brandName: str = None):
+        await self.loadAsync()
         if self.instrumentID is None:
             msg = 'No instrument defined'
             raise QException(Exception(msg))
 
         session = Session()
-        self.brandDF = session.apiWrapper(
+        self.brandDF = await session.apiWrapperAsync(
             '/api/data/instrument/getBrands',
             {
                 'instrumentId': self.instrumentID,
@@ -130,11 +411,22 @@ class Universe:
     def __init__(self, sector: str = None, industry: str = None, instrumentSymbol: str = None,
                  instrumentSymbologyType: str = None, panelDatasetType: str = None):
 
+        runSync(self._loadAsync(sector, industry, instrumentSymbol, instrumentSymbologyType, panelDatasetType))
+
+    @classmethod
+    async def createAsync(cls, sector: str = None, industry: str = None, instrumentSymbol: str = None,
+                          instrumentSymbologyType: str = None, panelDatasetType: str = None):
+        universe = cls.__new__(cls)
+        await universe._loadAsync(sector, industry, instrumentSymbol, instrumentSymbologyType, panelDatasetType)
+        return universe
+
+    async def _loadAsync(self, sector: str, industry: str, instrumentSymbol: str, instrumentSymbologyType: str,
+                         panelDatasetType: str):
         if instrumentSymbologyType is None:
             instrumentSymbologyType = settings.DefaultSymbologyType
 
         session = Session()
-        self.UniverseDF = session.apiWrapper(
+        self.UniverseDF = await session.apiWrapperAsync(
             '/api/data/universe/init',
             {
                 'sector': sector,
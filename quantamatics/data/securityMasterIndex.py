@@ -0,0 +1,297 @@
+import asyncio
+import atexit
+import os
+import pickle
+import threading
+import time
+import uuid
+
+from quantamatics.core import settings
+from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
+from quantamatics.core.utils import QException, QLog
+
+InstrumentFields = ['instrument_id', 'symbol', 'instrument_name', 'sector_name', 'industry_name']
+CompanyFields = ['company_id', 'company_name', 'sector_name', 'industry_name', 'industry_group_name',
+                 'vertical_name', 'subvertical_name']
+
+
+class SecurityMasterIndex:
+    # In memory index of instruments, their symbology and companies, kept in <directory>/securityMaster.pickle when a
+    # directory is given. Lookups never touch the network- Instrument and Company fall back to the API on a miss, or on
+    # an entry older than settings.SecurityMasterIndexMaxAge, and add what they loaded. Shared by every thread, so reads
+    # and writes hold the lock
+    def __init__(self, directory: str = None):
+        self.directory = os.path.expanduser(directory) if directory is not None else None
+        self.logger = QLog()
+
+        self.instruments = {}
+        self.symbology = {}
+        self.companies = {}
+        # When each entry was last loaded, by (table, instrumentID)
+        self.updated = {}
+        self._symbols = {}
+        self._companyInstruments = {}
+        self.lastRefresh = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.load()
+            atexit.register(self.save)
+
+    def _getFilePath(self) -> str:
+        return os.path.join(self.directory, 'securityMaster.pickle')
+
+    def load(self):
+        file_path = self._getFilePath()
+        if not os.path.exists(file_path):
+            return
+
+        try:
+            with open(file_path, 'rb') as f:
+                stored = pickle.load(f)
+        except Exception as e:
+            self.logger.logDebug('Unable to read security master index: %s' % e)
+            return
+
+        with self._lock:
+            self.instruments = stored['instruments']
+            self.symbology = stored['symbology']
+            self.companies = stored['companies']
+            # Entries of an index saved without load times are stale, they are loaded again on first use
+            self.updated = stored.get('updated', {})
+            self.lastRefresh = stored['lastRefresh']
+            self._reindex()
+
+    def save(self, force: bool = False):
+        if self.directory is None or not (self._dirty or force):
+            return
+
+        with self._lock:
+            stored = pickle.dumps({
+                'instruments': self.instruments,
+                'symbology': self.symbology,
+                'companies': self.companies,
+                'updated': self.updated,
+                'lastRefresh': self.lastRefresh
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+            self._dirty = False
+
+        file_path = self._getFilePath()
+        temp_path = '%s.%s.tmp' % (file_path, uuid.uuid4().hex)
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(stored)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            self.logger.logDebug('Unable to write security master index: %s' % e)
+            self._dirty = True
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _reindex(self):
+        # Called with the lock held
+        self._symbols = {}
+        for instrumentID, instrument in self.instruments.items():
+            if instrument.get('symbol') is not None:
+                self._symbols[(None, instrument['symbol'])] = instrumentID
+        for instrumentID, symbology in self.symbology.items():
+            for symbologyType, symbol in symbology.items():
+                self._symbols[(symbologyType, symbol)] = instrumentID
+
+        self._companyInstruments = {}
+        for instrumentID, company in self.companies.items():
+            self._companyInstruments.setdefault(company.get('company_id'), instrumentID)
+
+    def lookup(self, symbol: str, symbologyType: str = None) -> int:
+        with self._lock:
+            if symbologyType is None:
+                instrumentID = self._symbols.get((settings.DefaultSymbologyType, symbol))
+                if instrumentID is None:
+                    instrumentID = self._symbols.get((None, symbol))
+                return instrumentID
+            return self._symbols.get((symbologyType, symbol))
+
+    def getInstrument(self, instrumentSymbol: str = None, instrumentSymbologyType: str = None,
+                      instrumentID: int = None) -> dict:
+        with self._lock:
+            if instrumentID is None:
+                if instrumentSymbol is None:
+                    return None
+                instrumentID = self.lookup(instrumentSymbol, instrumentSymbologyType)
+                if instrumentID is None:
+                    return None
+
+            instrument = self.instruments.get(int(instrumentID))
+            if instrument is None or any([x not in instrument for x in InstrumentFields]):
+                return None
+            if self.isStale(instrumentID, 'instruments'):
+                return None
+            return dict(instrument)
+
+    def getSymbology(self, instrumentID: int) -> dict:
+        with self._lock:
+            symbology = self.symbology.get(int(instrumentID))
+            if symbology is None or self.isStale(instrumentID, 'symbology'):
+                return None
+            return dict(symbology)
+
+    def getCompany(self, companyID: int = None, instrumentID: int = None) -> dict:
+        with self._lock:
+            if instrumentID is None:
+                instrumentID = self._companyInstruments.get(companyID)
+                if instrumentID is None:
+                    return None
+
+            company = self.companies.get(int(instrumentID))
+            if company is None or any([x not in company for x in CompanyFields]):
+                return None
+            if self.isStale(instrumentID, 'companies'):
+                return None
+            return dict(company)
+
+    def addInstrument(self, instrument: dict, symbol: str = None, symbologyType: str = None):
+        instrumentID = int(instrument['instrument_id'])
+        with self._lock:
+            self.instruments[instrumentID] = {**self.instruments.get(instrumentID, {}), **instrument}
+            self.updated[('instruments', instrumentID)] = time.time()
+            if instrument.get('symbol') is not None:
+                self._symbols[(None, instrument['symbol'])] = instrumentID
+
+            # The symbol the instrument was requested by resolves to it from now on
+            if symbol is not None:
+                self._symbols[(symbologyType if symbologyType is not None else settings.DefaultSymbologyType, symbol)] = instrumentID
+            self._dirty = True
+
+    def addSymbology(self, instrumentID: int, symbology: dict):
+        instrumentID = int(instrumentID)
+        with self._lock:
+            self.symbology[instrumentID] = dict(symbology)
+            self.updated[('symbology', instrumentID)] = time.time()
+            for symbologyType, symbol in symbology.items():
+                self._symbols[(symbologyType, symbol)] = instrumentID
+            self._dirty = True
+
+    def addCompany(self, instrumentID: int, company: dict):
+        instrumentID = int(instrumentID)
+        with self._lock:
+            self.companies[instrumentID] = dict(company)
+            self.updated[('companies', instrumentID)] = time.time()
+            self._companyInstruments[company.get('company_id')] = instrumentID
+            self._dirty = True
+
+    def isStale(self, instrumentID: int = None, table: str = 'instruments') -> bool:
+        # Without an instrument, whether the whole index is due a refresh. Otherwise whether the instrument's entry in
+        # table (instruments, symbology or companies) is too old to answer lookups
+        if instrumentID is None:
+            updated = self.lastRefresh
+        else:
+            updated = self.updated.get((table, int(instrumentID)))
+        return updated is None or time.time() - updated > settings.SecurityMasterIndexMaxAge
+
+    def refresh(self, fullRefresh: bool = False, loadCompanies: bool = False, maxConcurrency: int = None):
+        return runSync(
+            self.refreshAsync(fullRefresh=fullRefresh, loadCompanies=loadCompanies, maxConcurrency=maxConcurrency)
+        )
+
+    async def refreshAsync(self, fullRefresh: bool = False, loadCompanies: bool = False, maxConcurrency: int = None):
+        # The universe is one request- symbology (and companies) are only requested for instruments the index does not
+        # hold yet, unless fullRefresh. Instruments no longer in the universe are dropped. The refreshed tables are built
+        # on the side and swapped in under the lock, so lookups on other threads see either the old or the new index
+        if maxConcurrency is None:
+            maxConcurrency = settings.DefaultBatchConcurrency
+
+        refreshStarted = time.time()
+        session = Session()
+        universeDF = await session.apiWrapperAsync(
+            '/api/data/universe/init',
+            {
+                'sector': None,
+                'industry': None,
+                'instrumentSymbol': None,
+                'instrumentSymbologyType': settings.DefaultSymbologyType,
+                'datasetType': None
+            }
+        )
+
+        if 'instrument_id' not in universeDF.columns:
+            raise QException('Universe does not have instrument_id column')
+
+        universeDF = universeDF.dropna(subset=['instrument_id'])
+        fields = [x for x in InstrumentFields if x in universeDF.columns]
+        universe = dict([[int(row['instrument_id']), row] for row in universeDF[fields].to_dict('records')])
+
+        with self._lock:
+            instruments = dict([[k, {**self.instruments.get(k, {}), **v}] for k, v in universe.items()])
+            symbology = dict([[k, v] for k, v in self.symbology.items() if k in universe])
+            companies = dict([[k, v] for k, v in self.companies.items() if k in universe])
+            updated = dict([[k, v] for k, v in self.updated.items() if k[1] in universe])
+        for instrumentID in universe:
+            updated[('instruments', instrumentID)] = refreshStarted
+
+        semaphore = asyncio.Semaphore(maxConcurrency)
+
+        async def loadInstrument(instrumentID):
+            async with semaphore:
+                try:
+                    if fullRefresh or instrumentID not in symbology:
+                        symbologyDF = await session.apiWrapperAsync('/api/data/instrument/getSymbology',
+                                                                    {'instrumentId': instrumentID})
+                        symbology[instrumentID] = dict(zip(symbologyDF['symbology_type'], symbologyDF['symbol'])) \
+                            if len(symbologyDF) > 0 else {}
+                        updated[('symbology', instrumentID)] = time.time()
+                    if loadCompanies and (fullRefresh or instrumentID not in companies):
+                        companyDF = await session.apiWrapperAsync('/api/data/company/init',
+                                                                  {'companyId': None, 'instrumentId': instrumentID})
+                        if len(companyDF) == 1:
+                            companies[instrumentID] = companyDF.iloc[0].to_dict()
+                            updated[('companies', instrumentID)] = time.time()
+                except Exception as e:
+                    self.logger.logDebug('failed to index instrument %s: %s' % (instrumentID, e))
+
+        await asyncio.gather(*[loadInstrument(x) for x in universe])
+
+        tables = {'instruments': instruments, 'symbology': symbology, 'companies': companies}
+        with self._lock:
+            # Entries other threads added while the refresh ran are kept, if their instrument is still in the universe
+            for (table, instrumentID), addedAt in self.updated.items():
+                if instrumentID in universe and addedAt > updated.get((table, instrumentID), 0):
+                    tables[table][instrumentID] = getattr(self, table)[instrumentID]
+                    updated[(table, instrumentID)] = addedAt
+
+            self.instruments = instruments
+            self.symbology = symbology
+            self.companies = companies
+            self.updated = updated
+            self.lastRefresh = time.time()
+            self._reindex()
+            self._dirty = True
+        self.save()
+        return self
+
+
+_securityMasterIndex = None
+
+
+def getSecurityMasterIndex() -> SecurityMasterIndex:
+    global _securityMasterIndex
+    if _securityMasterIndex is None and settings.SecurityMasterIndexDirectory is not None:
+        _securityMasterIndex = SecurityMasterIndex(settings.SecurityMasterIndexDirectory)
+    return _securityMasterIndex
+
+
+def enableSecurityMasterIndex(directory: str = None) -> SecurityMasterIndex:
+    global _securityMasterIndex
+    if directory is None:
+        directory = settings.SecurityMasterIndexDirectory
+    _securityMasterIndex = SecurityMasterIndex(directory)
+    return _securityMasterIndex
+
+
+def disableSecurityMasterIndex():
+    global _securityMasterIndex
+    if _securityMasterIndex is not None:
+        _securityMasterIndex.save()
+    _securityMasterIndex = None
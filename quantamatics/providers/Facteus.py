@@ -3,10 +3,12 @@ import numpy as np
 
 from quantamatics.core import settings
 from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
 from quantamatics.core.utils import QException
 from quantamatics.data.securityMaster import Instrument
 from quantamatics.data.fundamentals import KPI
 from quantamatics.providers.panels import Panel
+from quantamatics.providers.measures import Column, Sum, Mean, NullIfZero
 from quantamatics.core.settings import DatasetTypes
 
 class FacteusSummaryBase(Panel):
@@ -18,6 +20,8 @@ class FacteusSummaryBase(Panel):
                 'Spend': {
                     'pre_process': lambda x: np.sum(x['Spend']),
                     'agg_func': lambda x: np.sum(x['Spend']),
+                    'pre_process_expr': Sum('Spend'),
+                    'agg_func_expr': Sum('Spend'),
                     'request_field_name': 'spend',
                     'request_field_name_normalized': 'normalized spend',
                     'return_field_name': 'spend'
@@ -25,6 +29,8 @@ class FacteusSummaryBase(Panel):
                 'Transaction Count': {
                     'pre_process': lambda x: np.sum(x['Transaction Count']),
                     'agg_func': lambda x: np.sum(x['Transaction Count']),
+                    'pre_process_expr': Sum('Transaction Count'),
+                    'agg_func_expr': Sum('Transaction Count'),
                     'request_field_name': 'transaction count',
                     'request_field_name_normalized': 'normalized transaction count',
                     'return_field_name': 'transaction_count'
@@ -32,21 +38,29 @@ class FacteusSummaryBase(Panel):
                 'Cardholder Count': {
                     'pre_process': lambda x: np.mean(x['Cardholder Count']),
                     'agg_func': lambda x: np.sum(x['Transaction Count']) / np.mean(pd.Series(x['Transactions per Card']).replace(0, np.nan)),
+                    'pre_process_expr': Mean('Cardholder Count'),
+                    'agg_func_expr': Sum('Transaction Count') / Mean(NullIfZero('Transactions per Card')),
                     'request_field_name': 'card count',
                     'request_field_name_normalized': 'normalized card count',
                     'return_field_name': 'card_count'
                 },
                 'Spend per Transaction': {
                     'pre_process': lambda x: np.sum(x['Spend']) / np.sum(pd.Series(x['Transaction Count']).replace(0, np.nan)),
-                    'agg_func': lambda x: np.sum(x['Spend']) / np.sum(pd.Series(x['Transaction Count']).replace(0, np.nan))
+                    'agg_func': lambda x: np.sum(x['Spend']) / np.sum(pd.Series(x['Transaction Count']).replace(0, np.nan)),
+                    'pre_process_expr': Sum('Spend') / Sum(NullIfZero('Transaction Count')),
+                    'agg_func_expr': Sum('Spend') / Sum(NullIfZero('Transaction Count'))
                 },
                 'Transactions per Card': {
                     'pre_process': lambda x: np.mean(x['Transaction Count'] / pd.Series(x['Cardholder Count']).replace(0, np.nan)),
-                    'agg_func': lambda x: np.mean(x['Transactions per Card'])
+                    'agg_func': lambda x: np.mean(x['Transactions per Card']),
+                    'pre_process_expr': Mean(Column('Transaction Count') / NullIfZero('Cardholder Count')),
+                    'agg_func_expr': Mean('Transactions per Card')
                 },
                 'Spend per Card': {
                     'pre_process': lambda x: np.mean(x['Spend'] / pd.Series(x['Cardholder Count']).replace(0, np.nan)),
-                    'agg_func': lambda x: np.sum(x['Spend']) / (np.sum(x['Transaction Count']) / np.mean(pd.Series(x['Transactions per Card']).replace(0, np.nan)))
+                    'agg_func': lambda x: np.sum(x['Spend']) / (np.sum(x['Transaction Count']) / np.mean(pd.Series(x['Transactions per Card']).replace(0, np.nan))),
+                    'pre_process_expr': Mean(Column('Spend') / NullIfZero('Cardholder Count')),
+                    'agg_func_expr': Sum('Spend') / (Sum('Transaction Count') / Mean(NullIfZero('Transactions per Card')))
                 }
             },
             
@@ -65,9 +79,29 @@ class FacteusSummaryBase(Panel):
 
     def loadData(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
                  brands: str(list) = None, dimensions: str(list) = ['Date'],
-                 measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'], normalizedMeasures: bool = True):
+                 measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'], normalizedMeasures: bool = True,
+                 startDate: str = None, endDate: str = None):
+
+        return runSync(
+            self.loadStoredDataAsync(
+                ticker=ticker,
+                instrumentObj=instrumentObj,
+                kpiObj=kpiObj,
+                brands=brands,
+                dimensions=dimensions,
+                measures=measures,
+                normalizedMeasures=normalizedMeasures,
+                startDate=startDate,
+                endDate=endDate
+            )
+        )
+
+    async def loadDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                            brands: str(list) = None, dimensions: str(list) = ['Date'],
+                            measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'], normalizedMeasures: bool = True,
+                            startDate: str = None, endDate: str = None):
 
-        ticker = self.getTicker(instrumentObj, ticker)
+        ticker = await self.getTickerAsync(instrumentObj, ticker)
 
         normalizedSuffix = ''
         if normalizedMeasures:
@@ -85,24 +119,41 @@ class FacteusSummaryBase(Panel):
             merchants = brands
 
         if kpiObj is not None:
+            await kpiObj.loadAsync()
             kpiID = kpiObj.kpiID
 
             if len(kpiObj.brands) > 0:
                 merchants = kpiObj.brands
+        params = {
+            'panelName': self.panelName,
+            'ticker': ticker,
+            'merchants': merchants,
+            'dimensions': request_dimensions,
+            'measures': request_measures
+        }
+
+        # Date pages (see Panel.loadDataChunksAsync) are requested from the API and trimmed again locally
+        if startDate is not None:
+            params['startDate'] = pd.Timestamp(startDate).strftime('%Y-%m-%d')
+        if endDate is not None:
+            params['endDate'] = pd.Timestamp(endDate).strftime('%Y-%m-%d')
+
+        # Dimensions other than Date are decoded as categoricals when compact dtypes are enabled for the panel
+        categoricalColumns = [self.mapping['dimensions'][x]['return_field_name'] for x in dimensions if x != 'Date']
+
         session = Session()
-        resultDF =session.apiWrapper(enableCompressionOverride=True,
-            api_relative_path = '/api/data/panel/summaryDataLoad',
-            params = {
-                'panelName': self.panelName,
-                'ticker': ticker,
-                'merchants': merchants,
-                'dimensions': request_dimensions,
-                'measures': request_measures
-            }
-        )
+        with self._profileStage('fetch', rowsIn=0) as stage:
+            resultDF = await session.apiWrapperAsync(enableCompressionOverride=True,
+                priority=settings.RequestPriorities.Bulk,
+                api_relative_path = '/api/data/panel/summaryDataLoad',
+                params = params,
+                compactDtypes = self.compactDtypes,
+                categoricalColumns = categoricalColumns
+            )
+            stage.rowsOut = len(resultDF)
 
         self.dataDF = resultDF
-        self.preProcess(dimensions = dimensions)
+        self.preProcess(dimensions = dimensions, startDate = startDate, endDate = endDate)
 
         return self.dataDF
 
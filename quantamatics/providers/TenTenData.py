@@ -3,11 +3,12 @@ import numpy as np
 
 from quantamatics.core.utils import OrderDataFrameColumns
 from quantamatics.core import settings
-from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
 from quantamatics.core.utils import QException
 from quantamatics.data.securityMaster import Instrument
 from quantamatics.data.fundamentals import KPI
 from quantamatics.providers.panels import Panel
+from quantamatics.providers.measures import Column, Sum, Mean
 from quantamatics.core.settings import ParamsTypes
 from quantamatics.core.settings import DatasetTypes
 
@@ -20,56 +21,82 @@ class TenTenBase(Panel):
             'measures': {
                         'Spend': {
                             'pre_process': lambda x: np.sum(x['sales_index_numerator']) / np.sum(x['sales_index_denominator']),
-                            'agg_func': lambda x: np.sum(x['Spend Index Numerator']) / np.sum(x['Spend Index Denominator'])
+                            'agg_func': lambda x: np.sum(x['Spend Index Numerator']) / np.sum(x['Spend Index Denominator']),
+                            'pre_process_expr': Sum('sales_index_numerator') / Sum('sales_index_denominator'),
+                            'agg_func_expr': Sum('Spend Index Numerator') / Sum('Spend Index Denominator')
                         },
                         'Transaction Count': {
                             'pre_process': lambda x: np.sum(x['num_trans_index']),
-                            'agg_func': lambda x: (np.sum(x['Transaction Count Index Numerator Raw']) * 10000000.0) / np.sum(x['Spend Index Denominator Raw'])
+                            'agg_func': lambda x: (np.sum(x['Transaction Count Index Numerator Raw']) * 10000000.0) / np.sum(x['Spend Index Denominator Raw']),
+                            'pre_process_expr': Sum('num_trans_index'),
+                            'agg_func_expr': (Sum('Transaction Count Index Numerator Raw') * 10000000.0) / Sum('Spend Index Denominator Raw')
                         },
                         'Cardholder Count': {
                             'pre_process': lambda x: np.sum(x['num_cust_index']),
-                            'agg_func': lambda x: np.mean(x['Cardholder Count']) #(np.mean(x['num_cust_index_numerator_raw']) * 10000000) / np.sum(x['sales_index_denominator_raw'])
+                            'agg_func': lambda x: np.mean(x['Cardholder Count']), #(np.mean(x['num_cust_index_numerator_raw']) * 10000000) / np.sum(x['sales_index_denominator_raw'])
+                            'pre_process_expr': Sum('num_cust_index'),
+                            'agg_func_expr': Mean('Cardholder Count')
                          },                            
                          'Spend per Transaction': {
                              'pre_process': lambda x: np.sum(x['avg_dollar_per_trans']),
-                             'agg_func': lambda x: np.sum(x['Spend Index Numerator Raw']) / np.sum(x['Transaction Count Index Numerator Raw'])
+                             'agg_func': lambda x: np.sum(x['Spend Index Numerator Raw']) / np.sum(x['Transaction Count Index Numerator Raw']),
+                             'pre_process_expr': Sum('avg_dollar_per_trans'),
+                             'agg_func_expr': Sum('Spend Index Numerator Raw') / Sum('Transaction Count Index Numerator Raw')
                          },
                          'Transactions per Card': {
                              'pre_process': lambda x: np.sum(x['num_trans_index']) / np.sum(x['num_cust_index']),
-                             'agg_func': lambda x: np.mean(x['Transaction Count'] / x['Cardholder Count'])
+                             'agg_func': lambda x: np.mean(x['Transaction Count'] / x['Cardholder Count']),
+                             'pre_process_expr': Sum('num_trans_index') / Sum('num_cust_index'),
+                             'agg_func_expr': Mean(Column('Transaction Count') / Column('Cardholder Count'))
                          },
                          'Spend per Card': {
                              'pre_process': lambda x: np.sum(x['avg_dollar_per_cust']),
-                             'agg_func': lambda x: np.mean(x['Spend per Card']) #lambda x: np.sum(x['Spend Index Numerator Raw']) / np.mean(x['num_cust_index_numerator_raw'])
+                             'agg_func': lambda x: np.mean(x['Spend per Card']), #lambda x: np.sum(x['Spend Index Numerator Raw']) / np.mean(x['num_cust_index_numerator_raw'])
+                             'pre_process_expr': Sum('avg_dollar_per_cust'),
+                             'agg_func_expr': Mean('Spend per Card')
                          }, 
                         'Spend Index Numerator': {
                             'pre_process': lambda x: np.sum(x['sales_index_numerator']),
-                            'agg_func': lambda x: np.sum(x['Spend Index Numerator'])
+                            'agg_func': lambda x: np.sum(x['Spend Index Numerator']),
+                            'pre_process_expr': Sum('sales_index_numerator'),
+                            'agg_func_expr': Sum('Spend Index Numerator')
                         },
                         'Spend Index Numerator Raw': {
                             'pre_process': lambda x: np.sum(x['sales_index_numerator']) * 32696.0,
-                            'agg_func': lambda x: np.sum(x['Spend Index Numerator Raw'])
+                            'agg_func': lambda x: np.sum(x['Spend Index Numerator Raw']),
+                            'pre_process_expr': Sum('sales_index_numerator') * 32696.0,
+                            'agg_func_expr': Sum('Spend Index Numerator Raw')
                         },
                         'Spend Index Denominator': {
                             'pre_process': lambda x: np.sum(x['sales_index_denominator']),
-                            'agg_func': lambda x: np.sum(x['Spend Index Denominator'])
+                            'agg_func': lambda x: np.sum(x['Spend Index Denominator']),
+                            'pre_process_expr': Sum('sales_index_denominator'),
+                            'agg_func_expr': Sum('Spend Index Denominator')
                         },
                         'Spend Index Denominator Raw': {
                           'pre_process': lambda x: (np.sum(x['sales_index_denominator']) * 114514605.0),
-                          'agg_func': lambda x: np.sum(x['Spend Index Denominator Raw'])
+                          'agg_func': lambda x: np.sum(x['Spend Index Denominator Raw']),
+                          'pre_process_expr': (Sum('sales_index_denominator') * 114514605.0),
+                          'agg_func_expr': Sum('Spend Index Denominator Raw')
                         },
                         'Transaction Count Index': {
                             'pre_process': lambda x: (((np.sum(x['num_trans_index']) * (np.sum(x['sales_index_denominator']) * 114514605.0)) / 10000000.0) * 10000000.0) / (np.sum(x['sales_index_denominator']) * 114514605.0),
-                            'agg_func': lambda x: (((np.sum(x['Transaction Count']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0) * 10000000.0) / (np.sum(x['Spend Index Denominator']) * 114514605.0)
+                            'agg_func': lambda x: (((np.sum(x['Transaction Count']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0) * 10000000.0) / (np.sum(x['Spend Index Denominator']) * 114514605.0),
+                            'pre_process_expr': (((Sum('num_trans_index') * (Sum('sales_index_denominator') * 114514605.0)) / 10000000.0) * 10000000.0) / (Sum('sales_index_denominator') * 114514605.0),
+                            'agg_func_expr': (((Sum('Transaction Count') * (Sum('Spend Index Denominator') * 114514605.0)) / 10000000.0) * 10000000.0) / (Sum('Spend Index Denominator') * 114514605.0)
 #                             'agg_func': lambda x: np.sum(x['Transaction Count Index'])
                         },
                         'Transaction Count Index Numerator Raw': {
                             'pre_process': lambda x: ((np.sum(x['num_trans_index']) * (np.sum(x['sales_index_denominator']) * 114514605.0)) / 10000000.0), 
-                            'agg_func': lambda x: ((np.sum(x['Transaction Count Index']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0)
+                            'agg_func': lambda x: ((np.sum(x['Transaction Count Index']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0),
+                            'pre_process_expr': ((Sum('num_trans_index') * (Sum('sales_index_denominator') * 114514605.0)) / 10000000.0),
+                            'agg_func_expr': ((Sum('Transaction Count Index') * (Sum('Spend Index Denominator') * 114514605.0)) / 10000000.0)
                         },
                         'Cardholder Count Index Numerator Raw': {
                             'pre_process': lambda x: ((np.sum(x['num_cust_index']) * (np.sum(x['sales_index_denominator']) * 114514605.0)) / 10000000.0), 
-                            'agg_func': lambda x: ((np.sum(x['Cardholder Count']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0)
+                            'agg_func': lambda x: ((np.sum(x['Cardholder Count']) * (np.sum(x['Spend Index Denominator']) * 114514605.0)) / 10000000.0),
+                            'pre_process_expr': ((Sum('num_cust_index') * (Sum('sales_index_denominator') * 114514605.0)) / 10000000.0),
+                            'agg_func_expr': ((Sum('Cardholder Count') * (Sum('Spend Index Denominator') * 114514605.0)) / 10000000.0)
                         }
 
                      }
@@ -85,69 +112,85 @@ class TenTenBase(Panel):
     def loadData(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
                  brands: str(list) = None, dimensions: str(list) = ['Date'],
                  measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'],
-                 normalizedMeasures: bool = True):
+                 normalizedMeasures: bool = True,
+                 startDate: str = None, endDate: str = None):
+
+        return runSync(
+            self.loadStoredDataAsync(
+                ticker=ticker,
+                instrumentObj=instrumentObj,
+                kpiObj=kpiObj,
+                brands=brands,
+                dimensions=dimensions,
+                measures=measures,
+                normalizedMeasures=normalizedMeasures,
+                startDate=startDate,
+                endDate=endDate
+            )
+        )
+
+    async def loadDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                            brands: str(list) = None, dimensions: str(list) = ['Date'],
+                            measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'],
+                            normalizedMeasures: bool = True,
+                            startDate: str = None, endDate: str = None):
 
-        ticker = self.getTicker(instrumentObj, ticker)
+        ticker = await self.getTickerAsync(instrumentObj, ticker)
 
         merchants = None
         if brands is not None:
             merchants = brands
 
         if kpiObj is not None:
+            await kpiObj.loadAsync()
             kpiID = kpiObj.kpiID
 
             if len(kpiObj.brands) > 0:
                 merchants = kpiObj.brands
-        session = Session()
 
         fixed_indicator = ''
         if ('fixed' in self.panelName.lower()):
             fixed_indicator = '_fp'
         
-        resultDF = None
-        if ('combined' in self.panelName.lower()):            
-            for panel in ['panel1', 'panel2']:
-                table_base = f'pub.consumer_data.card_us_v201803.portal.{panel}.reports.combined.sales_tracker{fixed_indicator}.fiscal.daily'
-
-                curPanelresultDF = session.apiWrapper(enableCompressionOverride=True,
-                    api_relative_path = '/api/data/TenTen/getDataByTicker',
-                    params=  {
-                                "tableName": table_base,
-                                "ticker": ticker
-                             }, 
-                    params_type=ParamsTypes.JSON
-                )
-                
-                if resultDF is None:
-                    resultDF = curPanelresultDF
-                else:
-                    resultDF = resultDF.set_index('reportdate') + curPanelresultDF.set_index('reportdate')
-                    resultDF = resultDF.reset_index()
-        else:
-            if ('credit' in self.panelName.lower()):
-                panel = 'panel1'
-            elif ('debit' in self.panelName.lower()):
-                panel = 'panel2'
-
+        if ('combined' in self.panelName.lower()):
+            panels = ['panel1', 'panel2']
+        elif ('credit' in self.panelName.lower()):
+            panels = ['panel1']
+        elif ('debit' in self.panelName.lower()):
+            panels = ['panel2']
+
+        subPanelParams = []
+        for panel in panels:
             table_base = f'pub.consumer_data.card_us_v201803.portal.{panel}.reports.combined.sales_tracker{fixed_indicator}.fiscal.daily'
-
-            resultDF = session.apiWrapper(enableCompressionOverride=True,
-                api_relative_path = '/api/data/TenTen/getDataByTicker',
-                params=  {
-                            "tableName": table_base,
-                            "ticker": ticker
-                         }, 
-                params_type=ParamsTypes.JSON
-            )
+            subPanelParams.append({
+                                    "tableName": table_base,
+                                    "ticker": ticker
+                                  })
+
+        # Each sub panel request is limited to the page's dates, so paged loads split the history between requests
+        for params in subPanelParams:
+            if startDate is not None:
+                params['startDate'] = pd.Timestamp(startDate).strftime('%Y-%m-%d')
+            if endDate is not None:
+                params['endDate'] = pd.Timestamp(endDate).strftime('%Y-%m-%d')
+
+        # Sub panels (e.g. credit and debit for combined panels) are requested concurrently and summed by date
+        resultDF = await self.loadSubPanelsAsync(
+            api_relative_path='/api/data/TenTen/getDataByTicker',
+            paramsList=subPanelParams,
+            indexColumn='reportdate',
+            params_type=ParamsTypes.JSON
+        )
 
         resultDF['reportdate'] = pd.to_datetime(resultDF['reportdate'], format='%Y%m%d')
 
         self.dataDF = resultDF
         self.mapReturnFields()
+        if startDate is not None or endDate is not None:
+            self.filterDateRange(startDate, endDate)
         # Ensure we have a row for every day in the period (e.g. fixes for ROST during pandemic closures)
         if 'Date' in dimensions:
-            self.completeDailyRange()
-            self.dataDF['Date'] = self.dataDF['Date'].apply(lambda x: pd.to_datetime(x))
+            self.completeDailyRange(dimensions=dimensions)
 
         self.dataDF = self.applyMeasures(dimensions=dimensions, functionName = 'pre_process')
         self.dataDF = self.applyMeasures(dimensions=dimensions, functionName = 'agg_func')
@@ -164,27 +207,39 @@ class TenTenFixedBase(Panel):
             'measures': {
                         'Spend': {
                             'pre_process': lambda x: np.sum(x['sales_index']),
-                            'agg_func': lambda x: np.sum(x['Spend'])
+                            'agg_func': lambda x: np.sum(x['Spend']),
+                            'pre_process_expr': Sum('sales_index'),
+                            'agg_func_expr': Sum('Spend')
                         },
                         'Transaction Count': {
                             'pre_process': lambda x: np.sum(x['num_trans_index']),
-                            'agg_func': lambda x: (np.sum(x['Transaction Count']))
+                            'agg_func': lambda x: (np.sum(x['Transaction Count'])),
+                            'pre_process_expr': Sum('num_trans_index'),
+                            'agg_func_expr': (Sum('Transaction Count'))
                         },
                         'Cardholder Count': {
                             'pre_process': lambda x: np.sum(x['num_cust_index']),
-                            'agg_func': lambda x: np.mean(x['Cardholder Count']) #(np.mean(x['num_cust_index_numerator_raw']) * 10000000) / np.sum(x['sales_index_denominator_raw'])
+                            'agg_func': lambda x: np.mean(x['Cardholder Count']), #(np.mean(x['num_cust_index_numerator_raw']) * 10000000) / np.sum(x['sales_index_denominator_raw'])
+                            'pre_process_expr': Sum('num_cust_index'),
+                            'agg_func_expr': Mean('Cardholder Count')
                          },                            
                          'Spend per Transaction': {
                              'pre_process': lambda x: np.sum(x['avg_dollar_per_trans']),
-                             'agg_func': lambda x: np.sum(x['Spend']) / np.sum(x['Transaction Count'])
+                             'agg_func': lambda x: np.sum(x['Spend']) / np.sum(x['Transaction Count']),
+                             'pre_process_expr': Sum('avg_dollar_per_trans'),
+                             'agg_func_expr': Sum('Spend') / Sum('Transaction Count')
                          },
                          'Transactions per Card': {
                              'pre_process': lambda x: np.sum(x['num_trans_index']) / np.sum(x['num_cust_index']),
-                             'agg_func': lambda x: np.mean(x['Transaction Count'] / x['Cardholder Count'])
+                             'agg_func': lambda x: np.mean(x['Transaction Count'] / x['Cardholder Count']),
+                             'pre_process_expr': Sum('num_trans_index') / Sum('num_cust_index'),
+                             'agg_func_expr': Mean(Column('Transaction Count') / Column('Cardholder Count'))
                          },
                          'Spend per Card': {
                              'pre_process': lambda x: np.sum(x['avg_dollar_per_cust']),
-                             'agg_func': lambda x: np.mean(x['Spend per Card']) #lambda x: np.sum(x['Spend Index Numerator Raw']) / np.mean(x['num_cust_index_numerator_raw'])
+                             'agg_func': lambda x: np.mean(x['Spend per Card']), #lambda x: np.sum(x['Spend Index Numerator Raw']) / np.mean(x['num_cust_index_numerator_raw'])
+                             'pre_process_expr': Sum('avg_dollar_per_cust'),
+                             'agg_func_expr': Mean('Spend per Card')
                          }, 
                      }
             ,
@@ -199,69 +254,85 @@ class TenTenFixedBase(Panel):
     def loadData(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
                  brands: str(list) = None, dimensions: str(list) = ['Date'],
                  measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'],
-                 normalizedMeasures: bool = True):
+                 normalizedMeasures: bool = True,
+                 startDate: str = None, endDate: str = None):
+
+        return runSync(
+            self.loadStoredDataAsync(
+                ticker=ticker,
+                instrumentObj=instrumentObj,
+                kpiObj=kpiObj,
+                brands=brands,
+                dimensions=dimensions,
+                measures=measures,
+                normalizedMeasures=normalizedMeasures,
+                startDate=startDate,
+                endDate=endDate
+            )
+        )
+
+    async def loadDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                            brands: str(list) = None, dimensions: str(list) = ['Date'],
+                            measures: str(list) = ['Spend', 'Transaction Count', 'Cardholder Count'],
+                            normalizedMeasures: bool = True,
+                            startDate: str = None, endDate: str = None):
 
-        ticker = self.getTicker(instrumentObj, ticker)
+        ticker = await self.getTickerAsync(instrumentObj, ticker)
 
         merchants = None
         if brands is not None:
             merchants = brands
 
         if kpiObj is not None:
+            await kpiObj.loadAsync()
             kpiID = kpiObj.kpiID
 
             if len(kpiObj.brands) > 0:
                 merchants = kpiObj.brands
-        session = Session()
 
         fixed_indicator = ''
         if ('fixed' in self.panelName.lower()):
             fixed_indicator = '_fp'
         
-        resultDF = None
-        if ('combined' in self.panelName.lower()):            
-            for panel in ['panel1', 'panel2']:
-                table_base = f'pub.consumer_data.card_us_v201803.portal.{panel}.reports.combined.sales_tracker{fixed_indicator}.fiscal.daily'
-
-                curPanelresultDF = session.apiWrapper(enableCompressionOverride=True,
-                    api_relative_path = '/api/data/TenTen/getDataByTicker',
-                    params=  {
-                                "tableName": table_base,
-                                "ticker": ticker
-                             }, 
-                    params_type=ParamsTypes.JSON
-                )
-                
-                if resultDF is None:
-                    resultDF = curPanelresultDF
-                else:
-                    resultDF = resultDF.set_index('reportdate') + curPanelresultDF.set_index('reportdate')
-                    resultDF = resultDF.reset_index()
-        else:
-            if ('credit' in self.panelName.lower()):
-                panel = 'panel1'
-            elif ('debit' in self.panelName.lower()):
-                panel = 'panel2'
-
+        if ('combined' in self.panelName.lower()):
+            panels = ['panel1', 'panel2']
+        elif ('credit' in self.panelName.lower()):
+            panels = ['panel1']
+        elif ('debit' in self.panelName.lower()):
+            panels = ['panel2']
+
+        subPanelParams = []
+        for panel in panels:
             table_base = f'pub.consumer_data.card_us_v201803.portal.{panel}.reports.combined.sales_tracker{fixed_indicator}.fiscal.daily'
-
-            resultDF = session.apiWrapper(enableCompressionOverride=True,
-                api_relative_path = '/api/data/TenTen/getDataByTicker',
-                params=  {
-                            "tableName": table_base,
-                            "ticker": ticker
-                         }, 
-                params_type=ParamsTypes.JSON
-            )
+            subPanelParams.append({
+                                    "tableName": table_base,
+                                    "ticker": ticker
+                                  })
+
+        # Each sub panel request is limited to the page's dates, so paged loads split the history between requests
+        for params in subPanelParams:
+            if startDate is not None:
+                params['startDate'] = pd.Timestamp(startDate).strftime('%Y-%m-%d')
+            if endDate is not None:
+                params['endDate'] = pd.Timestamp(endDate).strftime('%Y-%m-%d')
+
+        # Sub panels (e.g. credit and debit for combined panels) are requested concurrently and summed by date
+        resultDF = await self.loadSubPanelsAsync(
+            api_relative_path='/api/data/TenTen/getDataByTicker',
+            paramsList=subPanelParams,
+            indexColumn='reportdate',
+            params_type=ParamsTypes.JSON
+        )
 
         resultDF['reportdate'] = pd.to_datetime(resultDF['reportdate'], format='%Y%m%d')
 
         self.dataDF = resultDF
         self.mapReturnFields()
+        if startDate is not None or endDate is not None:
+            self.filterDateRange(startDate, endDate)
         # Ensure we have a row for every day in the period (e.g. fixes for ROST during pandemic closures)
         if 'Date' in dimensions:
-            self.completeDailyRange()
-            self.dataDF['Date'] = self.dataDF['Date'].apply(lambda x: pd.to_datetime(x))
+            self.completeDailyRange(dimensions=dimensions)
 
         self.dataDF = self.applyMeasures(dimensions=dimensions, functionName = 'pre_process')
         self.dataDF = self.applyMeasures(dimensions=dimensions, functionName = 'agg_func')
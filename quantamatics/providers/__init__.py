@@ -1,2 +1,40 @@
 from __future__ import absolute_import
-from quantamatics.providers import *
\ No newline at end of file
+import importlib
+
+# Panels are imported from their module on first access, so importing the package (settings reads providers.config)
+# does not load pandas, numpy or pyarrow
+_lazyAttributes = {
+    'Panel': 'quantamatics.providers.panels',
+    'PanelFactory': 'quantamatics.providers.panelFactory',
+    'PanelStore': 'quantamatics.providers.panelStore',
+    'ParallelAggregator': 'quantamatics.providers.parallel',
+    'PanelProfiler': 'quantamatics.providers.profiler',
+    'PanelProfile': 'quantamatics.providers.profiler',
+    'FacteusSummaryBase': 'quantamatics.providers.Facteus',
+    'FacteusUSCPSummary': 'quantamatics.providers.Facteus',
+    'FacteusPulseBacktest': 'quantamatics.providers.Facteus',
+    'FacteusPulse': 'quantamatics.providers.Facteus',
+    'FacteusUSCPSummaryDemo': 'quantamatics.providers.Facteus',
+    'TenTenBase': 'quantamatics.providers.TenTenData',
+    'TenTenFixedBase': 'quantamatics.providers.TenTenData',
+    'TenTenCreditFixedPanel': 'quantamatics.providers.TenTenData',
+    'TenTenDebitFixedPanel': 'quantamatics.providers.TenTenData',
+    'TenTenCombinedFixedPanel': 'quantamatics.providers.TenTenData',
+    'TenTenCreditDenominatorPanel': 'quantamatics.providers.TenTenData',
+    'TenTenDebitDenominatorPanel': 'quantamatics.providers.TenTenData',
+    'TenTenCombinedDenominatorPanel': 'quantamatics.providers.TenTenData'
+}
+
+__all__ = list(_lazyAttributes)
+
+
+def __getattr__(name):
+    if name in _lazyAttributes:
+        value = getattr(importlib.import_module(_lazyAttributes[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
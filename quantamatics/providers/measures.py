@@ -0,0 +1,237 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from quantamatics.core.utils import QException
+
+# Evaluation modes, mirroring the three ways Panel.applyMeasures calls a measure lambda:
+#   Row       - DataFrame.apply(func, axis=1), reductions are applied to a single value
+#   Aggregate - func(DataFrame), reductions collapse the whole frame to a scalar
+#   Group     - DataFrameGroupBy.apply(func), reductions collapse each group
+ROW = 'row'
+AGGREGATE = 'aggregate'
+GROUP = 'group'
+
+
+class MeasureContext:
+    def __init__(self, dataDF: pd.DataFrame, mode: str = ROW, codes: np.ndarray = None, ngroups: int = 0):
+        self.dataDF = dataDF
+        self.mode = mode
+        self.codes = codes
+        self.ngroups = ngroups
+        self._columns = {}
+
+    def getColumn(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            if name not in self.dataDF.columns:
+                raise KeyError(name)
+            self._columns[name] = self.dataDF[name].to_numpy(dtype='float64', na_value=np.nan)
+        return self._columns[name]
+
+
+class Expression(ABC):
+    @abstractmethod
+    def evaluate(self, context: MeasureContext):
+        pass
+
+    def columns(self) -> list:
+        return []
+
+    def isSeriesInRow(self) -> bool:
+        # Whether the equivalent lambda sees a pd.Series rather than a scalar when applied row-wise
+        return False
+
+    def __add__(self, other):
+        return BinaryOp(np.add, '+', self, other)
+
+    def __radd__(self, other):
+        return BinaryOp(np.add, '+', other, self)
+
+    def __sub__(self, other):
+        return BinaryOp(np.subtract, '-', self, other)
+
+    def __rsub__(self, other):
+        return BinaryOp(np.subtract, '-', other, self)
+
+    def __mul__(self, other):
+        return BinaryOp(np.multiply, '*', self, other)
+
+    def __rmul__(self, other):
+        return BinaryOp(np.multiply, '*', other, self)
+
+    def __truediv__(self, other):
+        return BinaryOp(np.true_divide, '/', self, other)
+
+    def __rtruediv__(self, other):
+        return BinaryOp(np.true_divide, '/', other, self)
+
+
+def _asExpression(value) -> Expression:
+    if isinstance(value, Expression):
+        return value
+    if isinstance(value, str):
+        return Column(value)
+    return Constant(value)
+
+
+class Column(Expression):
+    def __init__(self, name: str):
+        self.name = name
+
+    def evaluate(self, context: MeasureContext):
+        return context.getColumn(self.name)
+
+    def columns(self) -> list:
+        return [self.name]
+
+    def __repr__(self):
+        return 'Column(%r)' % self.name
+
+
+class Constant(Expression):
+    def __init__(self, value: float):
+        self.value = float(value)
+
+    def evaluate(self, context: MeasureContext):
+        return self.value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+class NullIfZero(Expression):
+    # Equivalent of pd.Series(x).replace(0, np.nan) in the measure lambdas
+    def __init__(self, expr):
+        self.expr = _asExpression(expr)
+
+    def evaluate(self, context: MeasureContext):
+        values = np.asarray(self.expr.evaluate(context), dtype='float64')
+        return np.where(values == 0, np.nan, values)
+
+    def columns(self) -> list:
+        return self.expr.columns()
+
+    def isSeriesInRow(self) -> bool:
+        return True
+
+    def __repr__(self):
+        return 'NullIfZero(%r)' % self.expr
+
+
+class BinaryOp(Expression):
+    def __init__(self, op, symbol: str, left, right):
+        self.op = op
+        self.symbol = symbol
+        self.left = _asExpression(left)
+        self.right = _asExpression(right)
+
+    def evaluate(self, context: MeasureContext):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.op(self.left.evaluate(context), self.right.evaluate(context))
+
+    def columns(self) -> list:
+        return self.left.columns() + self.right.columns()
+
+    def isSeriesInRow(self) -> bool:
+        return self.left.isSeriesInRow() or self.right.isSeriesInRow()
+
+    def __repr__(self):
+        return '(%r %s %r)' % (self.left, self.symbol, self.right)
+
+
+class Reduction(Expression):
+    def __init__(self, expr):
+        self.expr = _asExpression(expr)
+
+    def evaluate(self, context: MeasureContext):
+        values = self.expr.evaluate(context)
+
+        # A reduction over a single row is the value itself, unless it reduces a one element Series
+        if context.mode == ROW:
+            if self.expr.isSeriesInRow():
+                return self.reduceRow(values)
+            return values
+
+        values = np.asarray(values, dtype='float64')
+        if values.ndim == 0:
+            values = np.full(len(context.dataDF), float(values))
+
+        if context.mode == AGGREGATE:
+            return self.reduce(values)
+        elif context.mode == GROUP:
+            return self.reduceGroups(values, context.codes, context.ngroups)
+
+        raise QException('Unknown measure evaluation mode: %s' % context.mode)
+
+    def reduceRow(self, values: np.ndarray) -> np.ndarray:
+        return values
+
+    @abstractmethod
+    def reduce(self, values: np.ndarray) -> float:
+        pass
+
+    @abstractmethod
+    def reduceGroups(self, values: np.ndarray, codes: np.ndarray, ngroups: int) -> np.ndarray:
+        pass
+
+    def columns(self) -> list:
+        return self.expr.columns()
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.expr)
+
+
+class Sum(Reduction):
+    # NaN-skipping like np.sum on a pandas Series
+    def reduceRow(self, values: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(values), 0.0, values)
+
+    def reduce(self, values: np.ndarray) -> float:
+        return np.nansum(values)
+
+    def reduceGroups(self, values: np.ndarray, codes: np.ndarray, ngroups: int) -> np.ndarray:
+        return np.bincount(codes, weights=np.where(np.isnan(values), 0.0, values), minlength=ngroups)
+
+
+class Mean(Reduction):
+    # NaN-skipping like np.mean on a pandas Series
+    def reduce(self, values: np.ndarray) -> float:
+        valid = ~np.isnan(values)
+        if not valid.any():
+            return np.nan
+        return values[valid].mean()
+
+    def reduceGroups(self, values: np.ndarray, codes: np.ndarray, ngroups: int) -> np.ndarray:
+        valid = ~np.isnan(values)
+        totals = np.bincount(codes, weights=np.where(valid, values, 0.0), minlength=ngroups)
+        counts = np.bincount(codes, weights=valid.astype('float64'), minlength=ngroups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, totals / counts, np.nan)
+
+
+def evaluateMeasure(expr: Expression, dataDF, applyAsAggregate: bool = False):
+    # Returns a Series shaped like the result of the equivalent lambda in Panel.applyMeasures:
+    # indexed by row for row-wise evaluation, by group key for a groupby, or a scalar for aggregates
+    if isinstance(dataDF, pd.core.groupby.DataFrameGroupBy):
+        groupCodes = dataDF.ngroup().to_numpy(dtype='float64', na_value=np.nan)
+        groupIndex = dataDF.size().index
+        valid = ~np.isnan(groupCodes)
+        sourceDF = dataDF.obj[valid] if not valid.all() else dataDF.obj
+        context = MeasureContext(sourceDF, mode=GROUP, codes=groupCodes[valid].astype('int64'),
+                                 ngroups=len(groupIndex))
+        return pd.Series(_broadcast(expr.evaluate(context), len(groupIndex)), index=groupIndex)
+
+    if applyAsAggregate:
+        context = MeasureContext(dataDF, mode=AGGREGATE)
+        return expr.evaluate(context)
+
+    context = MeasureContext(dataDF, mode=ROW)
+    return pd.Series(_broadcast(expr.evaluate(context), len(dataDF)), index=dataDF.index)
+
+
+def _broadcast(values, length: int) -> np.ndarray:
+    values = np.asarray(values, dtype='float64')
+    if values.ndim == 0:
+        return np.full(length, float(values))
+    return values
@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from quantamatics.core import settings
+from quantamatics.core.utils import QException, QLog
+
+try:
+    import pyarrow
+    import pyarrow.dataset
+    import pyarrow.ipc
+    import pyarrow.parquet
+    _arrowAvailable = True
+except ImportError:
+    _arrowAvailable = False
+
+
+def isPanelStoreAvailable() -> bool:
+    return _arrowAvailable
+
+
+class PanelStore:
+    # Panel frames as hive partitioned Parquet: <directory>/<panel>/<variant>/ticker=<ticker>/year=<year>/data.parquet
+    # A variant is one combination of dimensions, measures and brands. Each ticker keeps the contiguous date range it
+    # covers in _coverage.json and an uncompressed Arrow IPC copy for memory mapped reads in _mapped.arrow (files
+    # starting with '_' or '.' are ignored when the dataset is scanned)
+    def __init__(self, directory: str = None):
+        if not _arrowAvailable:
+            raise QException('pyarrow is required for the panel store')
+
+        if directory is None:
+            directory = settings.PanelStoreDirectory
+        if directory is None:
+            raise QException('Panel store directory not defined')
+
+        self.directory = os.path.expanduser(directory)
+        self.logger = QLog()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def makeVariant(self, dimensions: str(list) = None, measures: str(list) = None, brands: str(list) = None,
+                    normalizedMeasures: bool = True) -> str:
+        normalized = json.dumps({
+            'dimensions': dimensions,
+            'measures': measures,
+            'brands': brands,
+            'normalizedMeasures': normalizedMeasures
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+    def _getVariantPath(self, panelName: str, variant: str) -> str:
+        return os.path.join(self.directory, quote(panelName, safe=''), variant)
+
+    def _getTickerPath(self, panelName: str, variant: str, ticker: str) -> str:
+        return os.path.join(self._getVariantPath(panelName, variant), 'ticker=%s' % quote(ticker, safe=''))
+
+    def getCoverage(self, panelName: str, variant: str, ticker: str) -> tuple:
+        # (startDate, endDate) stored for the ticker, startDate is None when the full history is stored
+        coverage_path = os.path.join(self._getTickerPath(panelName, variant, ticker), '_coverage.json')
+        if not os.path.exists(coverage_path):
+            return None
+
+        with open(coverage_path) as f:
+            coverage = json.load(f)
+        startDate = pd.Timestamp(coverage['startDate']) if coverage['startDate'] is not None else None
+        return startDate, pd.Timestamp(coverage['endDate'])
+
+    def getMissingRanges(self, panelName: str, variant: str, ticker: str, startDate: str = None,
+                         endDate: str = None) -> list:
+        startDate = pd.Timestamp(startDate) if startDate is not None else None
+        endDate = pd.Timestamp(endDate) if endDate is not None else pd.Timestamp.today().normalize()
+
+        coverage = self.getCoverage(panelName, variant, ticker)
+        if coverage is None:
+            return [(startDate, endDate)]
+
+        coveredStartDate, coveredEndDate = coverage
+        missing = []
+        if coveredStartDate is not None and (startDate is None or startDate < coveredStartDate):
+            missing.append((startDate, coveredStartDate - timedelta(days=1)))
+
+        # The last PanelStoreTrailingDays stored days are requested again with anything newer, late arriving rows and
+        # restatements of the most recent days replace the stored ones
+        refetchStartDate = coveredEndDate + timedelta(days=1 - max(0, settings.PanelStoreTrailingDays))
+        if coveredStartDate is not None:
+            refetchStartDate = max(refetchStartDate, coveredStartDate)
+        if endDate >= refetchStartDate:
+            missingStartDate = refetchStartDate
+            if startDate is not None:
+                missingStartDate = max(missingStartDate, startDate)
+            missing.append((missingStartDate, endDate))
+        return missing
+
+    def write(self, panelName: str, variant: str, ticker: str, dataDF: pd.DataFrame, startDate: str = None,
+              endDate: str = None):
+        # dataDF replaces whatever is stored for the ticker between startDate and the last date it holds. Coverage only
+        # extends to that date, not to the requested endDate, so days a lagging source has not delivered yet (or an
+        # empty response) are requested again by the next load
+        if 'Date' not in dataDF.columns:
+            raise QException('Panel data does not have Date column')
+
+        dates = pd.to_datetime(dataDF['Date']).dropna()
+        startDate = pd.Timestamp(startDate) if startDate is not None else None
+        coverage = self.getCoverage(panelName, variant, ticker)
+        if len(dates) == 0:
+            # Nothing before the stored range- history that does not exist is not requested again
+            if coverage is not None and coverage[0] is not None and endDate is not None and \
+                    coverage[0] - timedelta(days=1) <= pd.Timestamp(endDate) < coverage[0]:
+                self._writeCoverage(self._getTickerPath(panelName, variant, ticker), startDate, coverage[1])
+            return
+
+        endDate = dates.max() if endDate is None else min(pd.Timestamp(endDate), dates.max())
+
+        ticker_path = self._getTickerPath(panelName, variant, ticker)
+        mapped_path = os.path.join(ticker_path, '_mapped.arrow')
+        if os.path.exists(mapped_path):
+            os.remove(mapped_path)
+
+        coveredStartDate, coveredEndDate = startDate, endDate
+        if coverage is not None:
+            isAdjacent = (startDate is None or startDate <= coverage[1] + timedelta(days=1)) and \
+                         (coverage[0] is None or endDate >= coverage[0] - timedelta(days=1))
+            if isAdjacent:
+                coveredStartDate = None if startDate is None or coverage[0] is None else min(startDate, coverage[0])
+                coveredEndDate = max(endDate, coverage[1])
+            else:
+                # Only one contiguous range is kept per ticker
+                shutil.rmtree(ticker_path)
+
+        years = set(dates.dt.year.unique())
+        if os.path.isdir(ticker_path):
+            for year_dir in os.listdir(ticker_path):
+                if year_dir.startswith('year='):
+                    year = int(year_dir.split('=')[1])
+                    if (startDate is None or year >= startDate.year) and year <= endDate.year:
+                        years.add(year)
+
+        for year in sorted(years):
+            year_path = os.path.join(ticker_path, 'year=%d' % year)
+            file_path = os.path.join(year_path, 'data.parquet')
+
+            yearDF = dataDF.loc[(dates.dt.year == year).to_numpy()]
+            if os.path.exists(file_path):
+                storedDF = pd.read_parquet(file_path, engine='pyarrow')
+                storedDates = pd.to_datetime(storedDF['Date'])
+                isReplaced = storedDates <= endDate
+                if startDate is not None:
+                    isReplaced &= storedDates >= startDate
+                yearDF = pd.concat([storedDF.loc[~isReplaced.to_numpy()], yearDF], ignore_index=True, sort=False)
+                yearDF = yearDF.sort_values('Date', kind='mergesort')
+
+            self._writeFile(yearDF.reset_index(drop=True), year_path, 'data.parquet')
+
+        self._writeCoverage(ticker_path, coveredStartDate, coveredEndDate)
+
+    def _writeCoverage(self, ticker_path: str, coveredStartDate: pd.Timestamp, coveredEndDate: pd.Timestamp):
+        os.makedirs(ticker_path, exist_ok=True)
+        coverage_path = os.path.join(ticker_path, '_coverage.json')
+        temp_path = os.path.join(ticker_path, '.%s.tmp' % uuid.uuid4().hex)
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'startDate': coveredStartDate.isoformat() if coveredStartDate is not None else None,
+                'endDate': coveredEndDate.isoformat()
+            }, f)
+        os.replace(temp_path, coverage_path)
+
+    def _writeFile(self, dataDF: pd.DataFrame, directory: str, file_name: str):
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, file_name)
+        if len(dataDF) == 0:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return
+
+        temp_path = os.path.join(directory, '.%s.tmp' % uuid.uuid4().hex)
+        try:
+            dataDF.to_parquet(temp_path, engine='pyarrow', index=False)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def read(self, panelName: str, variant: str, tickers: str(list), columns: str(list) = None,
+             startDate: str = None, endDate: str = None) -> pd.DataFrame:
+        singleTicker = isinstance(tickers, str)
+        if singleTicker:
+            tickers = [tickers]
+
+        variant_path = self._getVariantPath(panelName, variant)
+        if not os.path.isdir(variant_path):
+            return None
+
+        partitioning = pyarrow.dataset.partitioning(
+            pyarrow.schema([('ticker', pyarrow.string()), ('year', pyarrow.int32())]), flavor='hive')
+        dataset = pyarrow.dataset.dataset(variant_path, format='parquet', partitioning=partitioning)
+
+        # Ticker and year filters prune partitions before any file is opened, the Date filter is applied to row groups
+        filter = pyarrow.dataset.field('ticker').isin([quote(x, safe='') for x in tickers])
+        if startDate is not None:
+            startDate = pd.Timestamp(startDate)
+            filter &= (pyarrow.dataset.field('year') >= startDate.year) & \
+                      (pyarrow.dataset.field('Date') >= pyarrow.scalar(startDate.to_pydatetime()))
+        if endDate is not None:
+            endDate = pd.Timestamp(endDate)
+            filter &= (pyarrow.dataset.field('year') <= endDate.year) & \
+                      (pyarrow.dataset.field('Date') <= pyarrow.scalar(endDate.to_pydatetime()))
+
+        readColumns = None
+        if columns is not None:
+            readColumns = list(dict.fromkeys(['Date'] + [x for x in columns if x in dataset.schema.names]))
+            if not singleTicker:
+                readColumns = ['ticker'] + readColumns
+
+        resultDF = dataset.to_table(columns=readColumns, filter=filter).to_pandas()
+        if 'Date' not in resultDF.columns:
+            return resultDF
+
+        if singleTicker:
+            resultDF = resultDF.drop(['ticker', 'year'], axis=1, errors='ignore')
+            return resultDF.sort_values('Date', kind='mergesort').reset_index(drop=True)
+
+        resultDF = resultDF.drop(['year'], axis=1, errors='ignore')
+        quotedTickers = dict([[quote(x, safe=''), x] for x in tickers])
+        resultDF['ticker'] = resultDF['ticker'].map(lambda x: quotedTickers.get(x, x))
+        if 'Ticker' in resultDF.columns:
+            resultDF = resultDF.drop(['ticker'], axis=1)
+        else:
+            resultDF = resultDF.rename({'ticker': 'Ticker'}, axis=1)
+        return resultDF.sort_values(['Ticker', 'Date'], kind='mergesort').reset_index(drop=True)
+
+    def readMapped(self, panelName: str, variant: str, ticker: str, columns: str(list) = None,
+                   startDate: str = None, endDate: str = None) -> pd.DataFrame:
+        # Columns are memory mapped from the Arrow IPC copy so processes reading the same panel share the OS page cache.
+        # Numeric and date columns without nulls are wrapped without copying and are read only
+        ticker_path = self._getTickerPath(panelName, variant, ticker)
+        mapped_path = os.path.join(ticker_path, '_mapped.arrow')
+        if not os.path.exists(mapped_path):
+            if self.getCoverage(panelName, variant, ticker) is None:
+                return None
+            self._writeMapped(panelName, variant, ticker, mapped_path)
+
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(mapped_path, 'r')).read_all()
+
+        # Rows are sorted by Date, so the date range is a zero copy slice
+        if (startDate is not None or endDate is not None) and table.num_rows > 0:
+            dates = table.column('Date').chunk(0).to_numpy()
+            startIndex = 0 if startDate is None else \
+                np.searchsorted(dates, np.datetime64(pd.Timestamp(startDate)), side='left')
+            endIndex = len(dates) if endDate is None else \
+                np.searchsorted(dates, np.datetime64(pd.Timestamp(endDate)), side='right')
+            table = table.slice(startIndex, max(0, endIndex - startIndex))
+
+        if columns is not None:
+            table = table.select(list(dict.fromkeys(['Date'] + [x for x in columns if x in table.schema.names])))
+
+        return table.to_pandas(split_blocks=True)
+
+    def _writeMapped(self, panelName: str, variant: str, ticker: str, mapped_path: str):
+        table = pyarrow.Table.from_pandas(self.read(panelName, variant, ticker), preserve_index=False).combine_chunks()
+
+        temp_path = os.path.join(os.path.dirname(mapped_path), '.%s.tmp' % uuid.uuid4().hex)
+        try:
+            with pyarrow.OSFile(temp_path, 'wb') as sink:
+                with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=max(1, table.num_rows))
+            os.replace(temp_path, mapped_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def invalidate(self, panelName: str = None, ticker: str = None):
+        if panelName is None:
+            for name in os.listdir(self.directory):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            return
+
+        panel_path = os.path.join(self.directory, quote(panelName, safe=''))
+        if not os.path.isdir(panel_path):
+            return
+
+        if ticker is None:
+            shutil.rmtree(panel_path, ignore_errors=True)
+            return
+
+        for variant in os.listdir(panel_path):
+            shutil.rmtree(self._getTickerPath(panelName, variant, ticker), ignore_errors=True)
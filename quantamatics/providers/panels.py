@@ -1,23 +1,54 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import uuid
+import warnings
 import pandas as pd
 import numpy as np
 from datetime import timedelta
 
 from quantamatics.core.APIClient import Session
+from quantamatics.core.loop import runSync
 from quantamatics.core.utils import QException, QLog
 from quantamatics.core.utils import OrderDataFrameColumns
 from quantamatics.core import settings
 from quantamatics.data.fundamentals import KPI, CalendarPeriods
 from quantamatics.data.securityMaster import Instrument
-from quantamatics.core.settings import DatasetTypes
+from quantamatics.core.settings import DatasetTypes, ParamsTypes, MethodTypes
+from quantamatics.providers.measures import Expression, evaluateMeasure
+from quantamatics.providers.panelStore import PanelStore, isPanelStoreAvailable
+from quantamatics.providers.profiler import PanelProfiler, StageProfile, MeasureProfile, profiledStage
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    _parquetAvailable = True
+except ImportError:
+    _parquetAvailable = False
 
 
 class Panel:
+    # Last loaded frames for refreshData when no snapshot directory is configured
+    _snapshots = {}
+
+    # Set while a PanelProfiler is active on the panel
+    _profiler = None
+
     def __init__(self, panelName: str, panelDatasetType: str):
         self.panelName = panelName
         self.panelDatasetType = panelDatasetType
         self.dataDF = None
+        self.calendarPeriods = None
+        self.batchErrors = {}
+        self.compactDtypes = settings.CompactDtypes
         self.logger = QLog()
 
+        self.panelStore = None
+        if settings.PanelStoreDirectory is not None and isPanelStoreAvailable():
+            self.panelStore = PanelStore(settings.PanelStoreDirectory)
+
         session = Session()
         resultDF = session.apiWrapper(
             '/api/data/panel/init',
@@ -43,12 +74,16 @@ class Panel:
             'granularity': 'Daily'
         }
 
-    def preProcess(self, dimensions: str(list) = None, mapReturnFields: bool = True, preProcessMeasures: bool = True, completeDailyRange: bool = True):
+    def preProcess(self, dimensions: str(list) = None, mapReturnFields: bool = True, preProcessMeasures: bool = True, completeDailyRange: bool = True,
+                   startDate: str = None, endDate: str = None):
         if mapReturnFields:
             self.mapReturnFields()
+
+        if startDate is not None or endDate is not None:
+            self.filterDateRange(startDate, endDate)
         
         if completeDailyRange and 'Date' in dimensions:
-            self.completeDailyRange()
+            self.completeDailyRange(dimensions=dimensions)
             
         if preProcessMeasures:
             self.applyMeasures(dimensions = dimensions, functionName = 'pre_process')
@@ -64,7 +99,48 @@ class Panel:
             ticker = instrumentSymbol.split('-')[0]
         return ticker
 
+    async def getTickerAsync(self, instrumentObj, ticker):
+        if instrumentObj is not None and ticker is None:
+            await instrumentObj.getSymbologyAsync()
+        return self.getTicker(instrumentObj, ticker)
+
+
+    def profile(self, trackMemory: bool = True) -> PanelProfiler:
+        return PanelProfiler(self, trackMemory=trackMemory)
 
+    def loadDataProfiled(self, trackMemory: bool = True, **loadArgs) -> tuple:
+        # loadData with every stage and measure timed, returns (dataDF, PanelProfile)
+        with self.profile(trackMemory=trackMemory) as profile:
+            dataDF = self.loadData(**loadArgs)
+        return dataDF, profile
+
+    def _profileStage(self, name: str, rowsIn: int = None):
+        if self._profiler is None:
+            return contextlib.nullcontext(StageProfile(name))
+        return self._profiler.stage(name, rowsIn=rowsIn)
+
+    def _profileMeasure(self, functionName: str, measure: str, rows: int = None):
+        if self._profiler is None:
+            return contextlib.nullcontext(MeasureProfile(functionName, measure, rows))
+        return self._profiler.measure(functionName, measure, rows=rows)
+
+    @profiledStage('filterDateRange')
+    def filterDateRange(self, startDate: str = None, endDate: str = None):
+        if self.dataDF is None:
+            raise QException('No panel data available')
+
+        if 'Date' not in self.dataDF.columns:
+            raise QException('Panel data does not have Date column')
+
+        _dates = pd.to_datetime(self.dataDF['Date'])
+        inRange = _dates.notnull()
+        if startDate is not None:
+            inRange &= _dates >= pd.Timestamp(startDate)
+        if endDate is not None:
+            inRange &= _dates <= pd.Timestamp(endDate)
+        self.dataDF = self.dataDF.loc[inRange.to_numpy()].reset_index(drop=True)
+
+    @profiledStage('mapReturnFields')
     def mapReturnFields(self):
         if self.dataDF is None:
             raise QException('No panel data available')
@@ -82,32 +158,541 @@ class Panel:
     def loadData(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
                  brands: str(list) = None, dimensions: str(list) = [],
                  measures: str(list) = [],
-                 normalizedMeasures: bool = True):
+                 normalizedMeasures: bool = True,
+                 startDate: str = None, endDate: str = None):
 
             return None
 
+    async def loadDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                            brands: str(list) = None, dimensions: str(list) = [],
+                            measures: str(list) = [],
+                            normalizedMeasures: bool = True,
+                            startDate: str = None, endDate: str = None):
+
+            # Panels without an async implementation load on a worker thread, their sync calls can not run on the loop
+            return await asyncio.get_event_loop().run_in_executor(
+                None, lambda: self.loadData(ticker=ticker, instrumentObj=instrumentObj, kpiObj=kpiObj, brands=brands,
+                                            dimensions=dimensions, measures=measures,
+                                            normalizedMeasures=normalizedMeasures, startDate=startDate,
+                                            endDate=endDate))
+
+    def enablePanelStore(self, directory: str = None) -> PanelStore:
+        self.panelStore = PanelStore(directory)
+        return self.panelStore
+
+    def disablePanelStore(self):
+        self.panelStore = None
+
+    async def loadStoredDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                                  brands: str(list) = None, dimensions: str(list) = [],
+                                  measures: str(list) = [],
+                                  normalizedMeasures: bool = True,
+                                  startDate: str = None, endDate: str = None, columns: str(list) = None,
+                                  memoryMap: bool = None):
+        if memoryMap is None:
+            memoryMap = settings.MemoryMapPanelStore
+
+        loadArgs = {'kpiObj': kpiObj, 'brands': brands, 'dimensions': dimensions, 'measures': measures,
+                    'normalizedMeasures': normalizedMeasures}
+
+        if self.panelStore is None or dimensions is None or 'Date' not in dimensions:
+            return await self.loadDataAsync(ticker=ticker, instrumentObj=instrumentObj, startDate=startDate,
+                                            endDate=endDate, **loadArgs)
+
+        ticker = await self.getTickerAsync(instrumentObj, ticker)
+        if kpiObj is not None:
+            await kpiObj.loadAsync()
+        variant = self.panelStore.makeVariant(dimensions, measures, brands if kpiObj is None else kpiObj.brands,
+                                              normalizedMeasures)
+
+        # Only the date ranges the store does not hold yet are requested from the API
+        for missingStartDate, missingEndDate in self.panelStore.getMissingRanges(self.panelName, variant, ticker,
+                                                                                 startDate, endDate):
+            missingDF = await self.loadDataAsync(ticker=ticker, startDate=missingStartDate, endDate=missingEndDate,
+                                                 **loadArgs)
+            self.panelStore.write(self.panelName, variant, ticker, missingDF, missingStartDate, missingEndDate)
+
+        with self._profileStage('storeRead', rowsIn=0):
+            if memoryMap:
+                self.dataDF = self.panelStore.readMapped(self.panelName, variant, ticker, columns=columns,
+                                                         startDate=startDate, endDate=endDate)
+            else:
+                self.dataDF = self.panelStore.read(self.panelName, variant, ticker, columns=columns,
+                                                   startDate=startDate, endDate=endDate)
+        return self.dataDF
+
+    def loadDataBatch(self, tickers: str(list), kpiObj: KPI = None, brands: str(list) = None,
+                      dimensions: str(list) = None, measures: str(list) = None, normalizedMeasures: bool = True,
+                      maxConcurrency: int = None, asDict: bool = True, raiseOnError: bool = False):
+
+        return runSync(
+            self.loadDataBatchAsync(
+                tickers=tickers,
+                kpiObj=kpiObj,
+                brands=brands,
+                dimensions=dimensions,
+                measures=measures,
+                normalizedMeasures=normalizedMeasures,
+                maxConcurrency=maxConcurrency,
+                asDict=asDict,
+                raiseOnError=raiseOnError
+            )
+        )
+
+    async def loadDataBatchAsync(self, tickers: str(list), kpiObj: KPI = None, brands: str(list) = None,
+                                 dimensions: str(list) = None, measures: str(list) = None, normalizedMeasures: bool = True,
+                                 maxConcurrency: int = None, asDict: bool = True, raiseOnError: bool = False):
+        if maxConcurrency is None:
+            maxConcurrency = settings.DefaultBatchConcurrency
+
+        # Only pass what the caller set so each panel's own loadData defaults still apply
+        loadArgs = {'kpiObj': kpiObj, 'brands': brands, 'normalizedMeasures': normalizedMeasures}
+        if dimensions is not None:
+            loadArgs['dimensions'] = dimensions
+        if measures is not None:
+            loadArgs['measures'] = measures
+
+        semaphore = asyncio.Semaphore(maxConcurrency)
+        previousDataDF = self.dataDF
+
+        async def loadTicker(ticker):
+            async with semaphore:
+                try:
+                    return ticker, await self.loadDataAsync(ticker=ticker, **loadArgs), None
+                except Exception as e:
+                    self.logger.logDebug('failed to load %s: %s' % (ticker, e))
+                    return ticker, None, e
+
+        results = await asyncio.gather(*[loadTicker(x) for x in tickers])
+
+        self.batchErrors = dict([[ticker, error] for ticker, _, error in results if error is not None])
+        if raiseOnError and len(self.batchErrors) > 0:
+            raise QException('Failed to load %d of %d tickers: %s' % (len(self.batchErrors), len(tickers), ', '.join(self.batchErrors)))
+
+        frames = dict([[ticker, resultDF] for ticker, resultDF, error in results if error is None])
+
+        if asDict:
+            self.dataDF = previousDataDF
+            return frames
+
+        longFrames = []
+        for ticker, resultDF in frames.items():
+            if resultDF is None:
+                continue
+            resultDF = resultDF.copy()
+            if 'Ticker' not in resultDF.columns:
+                resultDF.insert(0, 'Ticker', ticker)
+            longFrames.append(resultDF)
+
+        if len(longFrames) > 0:
+            self.dataDF = pd.concat(longFrames, ignore_index=True, sort=False)
+        else:
+            self.dataDF = pd.DataFrame(columns=['Ticker'])
+
+        return self.dataDF
+
+
 
+    def refreshData(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                    brands: str(list) = None, dimensions: str(list) = None, measures: str(list) = None,
+                    normalizedMeasures: bool = True, restatementWindowDays: int = None, fullReload: bool = False):
+
+        return runSync(
+            self.refreshDataAsync(
+                ticker=ticker,
+                instrumentObj=instrumentObj,
+                kpiObj=kpiObj,
+                brands=brands,
+                dimensions=dimensions,
+                measures=measures,
+                normalizedMeasures=normalizedMeasures,
+                restatementWindowDays=restatementWindowDays,
+                fullReload=fullReload
+            )
+        )
+
+    async def refreshDataAsync(self, ticker: str = None, instrumentObj: Instrument = None, kpiObj: KPI = None,
+                               brands: str(list) = None, dimensions: str(list) = None, measures: str(list) = None,
+                               normalizedMeasures: bool = True, restatementWindowDays: int = None,
+                               fullReload: bool = False):
+        if restatementWindowDays is None:
+            restatementWindowDays = settings.RestatementWindowDays
+
+        ticker = await self.getTickerAsync(instrumentObj, ticker)
+        if kpiObj is not None:
+            await kpiObj.loadAsync()
+
+        loadArgs = {'kpiObj': kpiObj, 'brands': brands, 'normalizedMeasures': normalizedMeasures}
+        if dimensions is not None:
+            loadArgs['dimensions'] = dimensions
+        if measures is not None:
+            loadArgs['measures'] = measures
+
+        snapshotKey = self.getSnapshotKey(ticker, brands if kpiObj is None else kpiObj.brands, dimensions, measures, normalizedMeasures)
+        storedDF = None if fullReload else self._readSnapshot(snapshotKey)
+
+        if storedDF is None or len(storedDF) == 0 or 'Date' not in storedDF.columns:
+            resultDF = await self.loadDataAsync(ticker=ticker, **loadArgs)
+        else:
+            # Only the dates after the high water mark, plus the restatement window, are requested and processed again
+            storedDates = pd.to_datetime(storedDF['Date'])
+            windowStartDate = storedDates.max() - timedelta(days=restatementWindowDays)
+            sliceDF = await self.loadDataAsync(ticker=ticker, startDate=windowStartDate, **loadArgs)
+
+            self.logger.logDebug('Refreshed %s from %s, %d rows' % (ticker, windowStartDate.date(), len(sliceDF)))
+            if sliceDF is None or len(sliceDF) == 0:
+                # Nothing was restated (or the call came back empty), the stored rows are kept as they are
+                resultDF = storedDF
+            else:
+                # Only the dates (per dimension group) returned by the slice replace stored rows, a short slice leaves
+                # the rest of the restatement window as it was stored
+                keyColumns = ['Date'] + [x for x in self.mapping['dimensions']
+                                         if x != 'Date' and x in storedDF.columns and x in sliceDF.columns]
+                storedKeys = pd.MultiIndex.from_frame(storedDF[keyColumns].assign(Date=storedDates))
+                sliceKeys = pd.MultiIndex.from_frame(sliceDF[keyColumns].assign(Date=pd.to_datetime(sliceDF['Date'])))
+                resultDF = pd.concat([storedDF.loc[~storedKeys.isin(sliceKeys)], sliceDF], ignore_index=True, sort=False)
+                resultDF = resultDF.iloc[np.argsort(pd.to_datetime(resultDF['Date']).to_numpy(), kind='stable')]
+                resultDF = resultDF.reset_index(drop=True)
+
+        self._writeSnapshot(snapshotKey, resultDF)
+        self.dataDF = resultDF
+        return self.dataDF
+
+    def getSnapshotKey(self, ticker: str, brands: str(list) = None, dimensions: str(list) = None,
+                       measures: str(list) = None, normalizedMeasures: bool = True) -> str:
+        normalized = json.dumps({
+            'panelName': self.panelName,
+            'ticker': ticker,
+            'brands': brands,
+            'dimensions': dimensions,
+            'measures': measures,
+            'normalizedMeasures': normalizedMeasures
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def clearSnapshots(self):
+        Panel._snapshots.clear()
+        if settings.PanelSnapshotDirectory is not None:
+            directory = os.path.expanduser(settings.PanelSnapshotDirectory)
+            if os.path.isdir(directory):
+                for file_name in os.listdir(directory):
+                    if file_name.endswith('.parquet') or file_name.endswith('.pickle'):
+                        os.remove(os.path.join(directory, file_name))
+
+    def _readSnapshot(self, snapshotKey: str) -> pd.DataFrame:
+        if settings.PanelSnapshotDirectory is None:
+            storedDF = Panel._snapshots.get(snapshotKey)
+            return storedDF.copy() if storedDF is not None else None
+
+        directory = os.path.expanduser(settings.PanelSnapshotDirectory)
+        for file_name in ['%s.parquet' % snapshotKey, '%s.pickle' % snapshotKey]:
+            file_path = os.path.join(directory, file_name)
+            if os.path.exists(file_path):
+                try:
+                    if file_name.endswith('.parquet'):
+                        return pd.read_parquet(file_path, engine='pyarrow')
+                    return pd.read_pickle(file_path)
+                except Exception as e:
+                    self.logger.logDebug('Unable to read panel snapshot %s: %s' % (snapshotKey, e))
+        return None
+
+    def _writeSnapshot(self, snapshotKey: str, dataDF: pd.DataFrame):
+        if settings.PanelSnapshotDirectory is None:
+            Panel._snapshots[snapshotKey] = dataDF.copy()
+            return
+
+        directory = os.path.expanduser(settings.PanelSnapshotDirectory)
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, '%s.%s' % (snapshotKey, 'parquet' if _parquetAvailable else 'pickle'))
+        temp_path = '%s.%s.tmp' % (file_path, uuid.uuid4().hex)
+        try:
+            if _parquetAvailable:
+                dataDF.to_parquet(temp_path, engine='pyarrow', index=False)
+            else:
+                dataDF.to_pickle(temp_path)
+            os.replace(temp_path, file_path)
+        except Exception as e:
+            self.logger.logDebug('Unable to write panel snapshot %s: %s' % (snapshotKey, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def getDatePages(self, startDate: str = None, endDate: str = None, chunkDays: int = None,
+                     calendarPeriodsObj: CalendarPeriods = None) -> list:
+        if chunkDays is None:
+            chunkDays = settings.StreamChunkDays
+
+        endDate = pd.Timestamp(endDate) if endDate is not None else pd.Timestamp.today().normalize()
+        startDate = pd.Timestamp(startDate) if startDate is not None else None
+
+        if calendarPeriodsObj is None:
+            if startDate is None:
+                return [(None, endDate)]
+
+            pageStarts = pd.date_range(startDate, endDate, freq='%dD' % chunkDays)
+            return [(x, min(x + timedelta(days=chunkDays - 1), endDate)) for x in pageStarts]
+
+        # Pages hold whole calendar periods so each one can be aggregated to periods on its own
+        _periodsDF = calendarPeriodsObj.getPeriods().drop_duplicates('period_name')
+        _periodsDF = pd.DataFrame({
+            'start': pd.to_datetime(_periodsDF['period_start_date']),
+            'end': pd.to_datetime(_periodsDF['period_end_date'])
+        }).sort_values('start', kind='mergesort')
+        _periodsDF = _periodsDF.loc[_periodsDF['start'] <= endDate]
+        if startDate is not None:
+            _periodsDF = _periodsDF.loc[_periodsDF['end'] >= startDate]
+
+        pages = []
+        pageStart = None
+        for periodStart, periodEnd in zip(_periodsDF['start'], _periodsDF['end']):
+            if pageStart is None:
+                pageStart = periodStart if startDate is None else max(periodStart, startDate)
+            if periodEnd - pageStart >= timedelta(days=chunkDays - 1):
+                pages.append((pageStart, periodEnd))
+                pageStart = None
+        if pageStart is not None:
+            pages.append((pageStart, _periodsDF['end'].max()))
+
+        return pages
+
+    async def loadDataChunksAsync(self, tickers: str(list), startDate: str = None, endDate: str = None,
+                                  chunkDays: int = None, kpiObj: KPI = None, calendarPeriodsObj: CalendarPeriods = None,
+                                  aggregateToCalendarPeriods: bool = False, brands: str(list) = None,
+                                  dimensions: str(list) = None, measures: str(list) = None,
+                                  normalizedMeasures: bool = True):
+        # Async generator of DataFrame chunks, one per ticker and date page, so the full panel is never held in memory
+        if isinstance(tickers, str):
+            tickers = [tickers]
+
+        if kpiObj is not None:
+            await kpiObj.loadAsync()
+
+        if calendarPeriodsObj is None and kpiObj is not None:
+            if self.calendarPeriods is None or self.calendarPeriods.kpiID != kpiObj.kpiID:
+                self.calendarPeriods = await CalendarPeriods.createAsync(kpiID=kpiObj.kpiID)
+            calendarPeriodsObj = self.calendarPeriods
+
+        if aggregateToCalendarPeriods and calendarPeriodsObj is None:
+            raise QException('Need a KPI or Calendar Periods object to aggregate to')
+
+        loadArgs = {'kpiObj': kpiObj, 'brands': brands, 'normalizedMeasures': normalizedMeasures}
+        if dimensions is not None:
+            loadArgs['dimensions'] = dimensions
+        if measures is not None:
+            loadArgs['measures'] = measures
+
+        pages = self.getDatePages(startDate, endDate, chunkDays, calendarPeriodsObj)
+        if aggregateToCalendarPeriods:
+            # Latest page first- its current period sets the period to date window for the earlier pages
+            pages = pages[::-1]
+        requests = [(ticker, pageStart, pageEnd) for ticker in tickers for pageStart, pageEnd in pages]
+        if len(requests) == 0:
+            return
+
+        # Keep the next page in flight while the current chunk is being consumed
+        nextLoad = asyncio.ensure_future(self.loadDataAsync(ticker=requests[0][0], startDate=requests[0][1],
+                                                            endDate=requests[0][2], **loadArgs))
+        try:
+            for requestIndex, (ticker, pageStart, pageEnd) in enumerate(requests):
+                chunkDF = await nextLoad
+                nextLoad = None
+                if requestIndex + 1 < len(requests):
+                    nextTicker, nextStart, nextEnd = requests[requestIndex + 1]
+                    nextLoad = asyncio.ensure_future(self.loadDataAsync(ticker=nextTicker, startDate=nextStart,
+                                                                        endDate=nextEnd, **loadArgs))
+
+                # Each ticker's latest page sets its own period to date window, even when that page is empty
+                if requestIndex == 0 or ticker != requests[requestIndex - 1][0]:
+                    currentPeriodDayCount = None
+
+                if chunkDF is None or len(chunkDF) == 0:
+                    continue
+
+                if aggregateToCalendarPeriods:
+                    self.dataDF = chunkDF
+                    chunkDF = self.aggregateDataToCalendarPeriods(
+                        dimensions=[x for x in loadArgs.get('dimensions', []) if x != 'Date'],
+                        kpiObj=kpiObj,
+                        calendarPeriodsObj=calendarPeriodsObj,
+                        currentPeriodDayCount=currentPeriodDayCount
+                    )
+                    currentPeriodDayCount = self.currentPeriodDayCount
+                    if len(chunkDF) == 0:
+                        continue
+
+                if len(tickers) > 1 and 'Ticker' not in chunkDF.columns:
+                    chunkDF = chunkDF.copy()
+                    chunkDF.insert(0, 'Ticker', ticker)
+
+                yield chunkDF
+        finally:
+            if nextLoad is not None and not nextLoad.done():
+                nextLoad.cancel()
+
+    def loadDataChunks(self, tickers: str(list), startDate: str = None, endDate: str = None,
+                       chunkDays: int = None, kpiObj: KPI = None, calendarPeriodsObj: CalendarPeriods = None,
+                       aggregateToCalendarPeriods: bool = False, brands: str(list) = None,
+                       dimensions: str(list) = None, measures: str(list) = None,
+                       normalizedMeasures: bool = True):
+        chunks = self.loadDataChunksAsync(
+            tickers=tickers,
+            startDate=startDate,
+            endDate=endDate,
+            chunkDays=chunkDays,
+            kpiObj=kpiObj,
+            calendarPeriodsObj=calendarPeriodsObj,
+            aggregateToCalendarPeriods=aggregateToCalendarPeriods,
+            brands=brands,
+            dimensions=dimensions,
+            measures=measures,
+            normalizedMeasures=normalizedMeasures
+        )
+
+        try:
+            while True:
+                try:
+                    chunkDF = runSync(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield chunkDF
+        finally:
+            runSync(chunks.aclose())
+
+    def loadDataToParquet(self, filePath: str, tickers: str(list), startDate: str = None, endDate: str = None,
+                          chunkDays: int = None, kpiObj: KPI = None, calendarPeriodsObj: CalendarPeriods = None,
+                          aggregateToCalendarPeriods: bool = False, brands: str(list) = None,
+                          dimensions: str(list) = None, measures: str(list) = None,
+                          normalizedMeasures: bool = True) -> int:
+        if not _parquetAvailable:
+            raise QException('pyarrow is required to write panel data to parquet')
+
+        writer = None
+        rowCount = 0
+        try:
+            for chunkDF in self.loadDataChunks(tickers=tickers, startDate=startDate, endDate=endDate,
+                                               chunkDays=chunkDays, kpiObj=kpiObj,
+                                               calendarPeriodsObj=calendarPeriodsObj,
+                                               aggregateToCalendarPeriods=aggregateToCalendarPeriods,
+                                               brands=brands, dimensions=dimensions, measures=measures,
+                                               normalizedMeasures=normalizedMeasures):
+                if writer is None:
+                    table = pyarrow.Table.from_pandas(chunkDF, preserve_index=False)
+                    writer = pyarrow.parquet.ParquetWriter(filePath, table.schema)
+                else:
+                    # Every row group is written with the schema of the first chunk
+                    chunkDF = chunkDF.reindex(columns=writer.schema.names)
+                    table = pyarrow.Table.from_pandas(chunkDF, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+                rowCount += len(chunkDF)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        self.dataDF = None
+        return rowCount
 
-    def completeDailyRange(self):
+    async def loadSubPanelsAsync(self, api_relative_path: str, paramsList: list, indexColumn: str,
+                                 params_type: str = ParamsTypes.URL, method_type: str = MethodTypes.GET) -> pd.DataFrame:
+        session = Session()
+        with self._profileStage('fetch', rowsIn=0) as stage:
+            frames = await asyncio.gather(*[
+                session.apiWrapperAsync(
+                    enableCompressionOverride=True,
+                    api_relative_path=api_relative_path,
+                    params=params,
+                    params_type=params_type,
+                    method_type=method_type,
+                    priority=settings.RequestPriorities.Bulk
+                ) for params in paramsList
+            ])
+            resultDF = self.combineSubPanels(list(frames), indexColumn)
+            stage.rowsOut = len(resultDF)
+        return resultDF
+
+    def combineSubPanels(self, frames: list, indexColumn: str) -> pd.DataFrame:
+        if len(frames) == 0:
+            raise QException('No sub panel data available')
+
+        if len(frames) == 1:
+            return frames[0]
+
+        # Index each frame once and add them aligned on the index column
+        combinedDF = frames[0].set_index(indexColumn)
+        for frame in frames[1:]:
+            combinedDF = combinedDF + frame.set_index(indexColumn)
+        return combinedDF.reset_index()
+
+    @profiledStage('completeDailyRange')
+    def completeDailyRange(self, dimensions: str(list) = None, fillPolicies: dict = None, defaultFillPolicy: str = None):
         if self.dataDF is None:
             raise QException('No panel data available')
 
         if 'Date' not in self.dataDF.columns:
             raise QException('Panel data does not have Date column')
 
-        full_date_range = pd.DataFrame(
-            pd.date_range(self.dataDF['Date'].min(), self.dataDF['Date'].max()),
-            columns=['Date'])
+        if defaultFillPolicy is None:
+            defaultFillPolicy = settings.DefaultFillPolicy
 
-        _dataDF = self.dataDF.set_index('Date').join(
-            full_date_range.set_index('Date'), how='outer', rsuffix='_R').reset_index()
-        _dataDF['Date'] = _dataDF.apply(
-            lambda x: x['Date_R'] if pd.isnull(x['Date']) else x['Date'], axis=1)
-        _dataDF = _dataDF.fillna(0)
-        self.dataDF = _dataDF
-        
+        # Gaps are filled per group of the remaining dimensions (e.g. each Region x Card Type gets its own daily range)
+        if dimensions is None:
+            dimensions = list(self.mapping['dimensions'].keys())
+        groupColumns = [x for x in dimensions if x != 'Date' and x in self.dataDF.columns]
+
+        dataDF = self.dataDF.copy()
+        dataDF['Date'] = pd.to_datetime(dataDF['Date'])
+        dataDF = dataDF[dataDF['Date'].notnull()]
+        if len(dataDF) == 0:
+            self.dataDF = dataDF
+            return
+
+        if len(groupColumns) > 0:
+            rangeDF = dataDF.groupby(groupColumns, sort=True, dropna=False, observed=True)['Date'].agg(['min', 'max'])
+            keys = rangeDF.index.to_frame(index=False)
+        else:
+            rangeDF = pd.DataFrame({'min': [dataDF['Date'].min()], 'max': [dataDF['Date'].max()]})
+            keys = pd.DataFrame(index=range(1))
+
+        starts = rangeDF['min'].to_numpy(dtype='datetime64[ns]')
+        days = ((rangeDF['max'].to_numpy(dtype='datetime64[ns]') - starts) // np.timedelta64(1, 'D')).astype('int64') + 1
+        offsets = np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days)
+
+        fullIndexDF = keys.loc[np.repeat(np.arange(len(keys)), days)].reset_index(drop=True)
+        fullIndexDF['Date'] = np.repeat(starts, days) + offsets * np.timedelta64(1, 'D')
+        indexColumns = groupColumns + ['Date']
+
+        if dataDF.duplicated(indexColumns).any():
+            _dataDF = fullIndexDF.merge(dataDF, how='left', on=indexColumns)
+        else:
+            if len(groupColumns) > 0:
+                fullIndex = pd.MultiIndex.from_frame(fullIndexDF[indexColumns])
+            else:
+                fullIndex = pd.DatetimeIndex(fullIndexDF['Date'], name='Date')
+            _dataDF = dataDF.set_index(indexColumns).reindex(fullIndex).reset_index()
+
+        # Only measure (numeric) columns are filled- labels and other non-measure columns on the added days stay empty
+        for column in _dataDF.columns:
+            if column in indexColumns or not pd.api.types.is_numeric_dtype(_dataDF[column]):
+                continue
+
+            fillPolicy = defaultFillPolicy
+            if fillPolicies is not None and column in fillPolicies:
+                fillPolicy = fillPolicies[column]
+            elif column in self.mapping['measures'] and 'fill_policy' in self.mapping['measures'][column]:
+                fillPolicy = self.mapping['measures'][column]['fill_policy']
+
+            if fillPolicy == settings.FillPolicies.Zero:
+                _dataDF[column] = _dataDF[column].fillna(0)
+            elif fillPolicy == settings.FillPolicies.ForwardFill:
+                if len(groupColumns) > 0:
+                    _dataDF[column] = _dataDF.groupby(groupColumns, sort=False, dropna=False, observed=True)[column].ffill()
+                else:
+                    _dataDF[column] = _dataDF[column].ffill()
+            elif fillPolicy != settings.FillPolicies.NaN:
+                raise QException('Unknown fill policy %s for %s' % (fillPolicy, column))
+
+        _dataDF = _dataDF.sort_values('Date', kind='mergesort').reset_index(drop=True)
+        self.dataDF = _dataDF[['Date'] + [x for x in _dataDF.columns if x != 'Date']]
 
-    def applyMeasures(self, dataDF: pd.DataFrame = None, dimensions: str(list) = None, functionName: str = 'agg_func', applyAsAggregate: bool = False, inplace: bool = True):
+    def applyMeasures(self, dataDF: pd.DataFrame = None, dimensions: str(list) = None, functionName: str = 'agg_func', applyAsAggregate: bool = False, inplace: bool = True, vectorized: bool = None):
         if dataDF is None and self.dataDF is not None:
             dataDF = self.dataDF
         elif dataDF is None:
@@ -116,35 +701,91 @@ class Panel:
         if self.mapping is None or self.mapping['measures'] is None:
             raise QException('No panel mapping found')
 
+        if vectorized is None:
+            vectorized = settings.VectorizedMeasures
+
         if dimensions is not None and len(dimensions) > 0:
             _resultDF = pd.DataFrame(dataDF[dimensions])
         else:
             _resultDF = pd.DataFrame()
 
         measures = self.mapping['measures']
-        
-        for curMeasure, curMeasureItem in measures.items():
-            try:
-                if applyAsAggregate:
-                    measureDF = pd.DataFrame([curMeasureItem[functionName](dataDF)], columns=[curMeasure])
-                else:
-                    if type(dataDF) == type(pd.DataFrame()):
-                        measureDF = pd.DataFrame(dataDF.apply(curMeasureItem[functionName], axis=1), columns=[curMeasure])
-                    else:
-                        measureDF = pd.DataFrame(dataDF.apply(curMeasureItem[functionName]), columns=[curMeasure])
-                
-                _resultDF = pd.concat([_resultDF, measureDF], axis=1)
-            except:
-                self.logger.logDebug('failed to process %s' % curMeasure )
-                continue
+
+        with self._profileStage('applyMeasures(%s)' % functionName, rowsIn=len(dataDF)) as stage:
+            for curMeasure, curMeasureItem in measures.items():
+                with self._profileMeasure(functionName, curMeasure, rows=len(dataDF)) as measureProfile:
+                    try:
+                        measureDF = None
+                        if vectorized and (functionName + '_expr') in curMeasureItem:
+                            try:
+                                measureProfile.method = 'vectorized'
+                                measureDF = self._applyMeasureExpression(dataDF, curMeasure, curMeasureItem[functionName + '_expr'], applyAsAggregate)
+                            except KeyError:
+                                raise
+                            except Exception:
+                                measureProfile.fallback = True
+                                self.logger.logDebug('vectorized evaluation failed for %s, falling back' % curMeasure)
+
+                        if measureDF is None:
+                            measureProfile.method = 'lambda'
+                            if applyAsAggregate:
+                                measureDF = pd.DataFrame([curMeasureItem[functionName](dataDF)], columns=[curMeasure])
+                            else:
+                                if type(dataDF) == type(pd.DataFrame()):
+                                    measureDF = pd.DataFrame(dataDF.apply(curMeasureItem[functionName], axis=1), columns=[curMeasure])
+                                else:
+                                    measureDF = pd.DataFrame(dataDF.apply(curMeasureItem[functionName]), columns=[curMeasure])
+
+                        _resultDF = pd.concat([_resultDF, measureDF], axis=1)
+                    except Exception as e:
+                        # A skipped measure is missing from the result, and its failing lambda may have been the
+                        # expensive part of the load
+                        measureProfile.skip(e)
+                        warnings.warn('Measure %s was skipped by applyMeasures(%s): %s' % (
+                            curMeasure, functionName, measureProfile.error), RuntimeWarning, stacklevel=2)
+                        continue
+            stage.rowsOut = len(_resultDF)
 
         if inplace:
             self.dataDF = _resultDF
         return _resultDF
 
+    def _applyMeasureExpression(self, dataDF, measureName: str, expr: Expression, applyAsAggregate: bool) -> pd.DataFrame:
+        result = evaluateMeasure(expr, dataDF, applyAsAggregate=applyAsAggregate)
+        if isinstance(result, pd.Series):
+            return pd.DataFrame(result, columns=[measureName])
+        return pd.DataFrame([result], columns=[measureName])
+
+    def checkMeasures(self, dataDF: pd.DataFrame = None, dimensions: str(list) = None, functionName: str = 'agg_func',
+                      applyAsAggregate: bool = False, rtol: float = 1e-9, atol: float = 1e-9) -> pd.DataFrame:
+        # Compare the vectorized measure expressions against the original lambdas
+        lambdaDF = self.applyMeasures(dataDF=dataDF, dimensions=dimensions, functionName=functionName,
+                                      applyAsAggregate=applyAsAggregate, inplace=False, vectorized=False)
+        vectorizedDF = self.applyMeasures(dataDF=dataDF, dimensions=dimensions, functionName=functionName,
+                                          applyAsAggregate=applyAsAggregate, inplace=False, vectorized=True)
+
+        results = []
+        for curMeasure, curMeasureItem in self.mapping['measures'].items():
+            if (functionName + '_expr') not in curMeasureItem:
+                continue
+
+            if curMeasure not in lambdaDF.columns or curMeasure not in vectorizedDF.columns:
+                results.append([curMeasure, curMeasure not in lambdaDF.columns and curMeasure not in vectorizedDF.columns, np.nan])
+                continue
+
+            expected = lambdaDF[curMeasure].to_numpy(dtype='float64', na_value=np.nan)
+            actual = vectorizedDF[curMeasure].to_numpy(dtype='float64', na_value=np.nan)
+            with np.errstate(invalid='ignore'):
+                diff = np.abs(expected - actual)
+            maxDiff = np.nanmax(diff) if np.any(~np.isnan(diff)) else 0.0
+            matches = bool(np.allclose(expected, actual, rtol=rtol, atol=atol, equal_nan=True))
+            results.append([curMeasure, matches, maxDiff])
+
+        return pd.DataFrame(results, columns=['Measure', 'Matches', 'MaxAbsDiff'])
+
     def aggregateDataToCalendarPeriods(self, dimensions: str(list) = None, kpiObj: KPI = None,
                                            calendarPeriodsObj: CalendarPeriods = None,
-                                           completeCurrentQuarter: bool = True):
+                                           completeCurrentQuarter: bool = True, currentPeriodDayCount: timedelta = None):
         if self.mapping is None:
             raise QException('No panel mapping found')
 
@@ -166,89 +807,139 @@ class Panel:
         if calendarPeriodsObj is not None:
             self.calendarPeriods = calendarPeriodsObj
         elif kpiObj is not None:
-            self.calendarPeriods = CalendarPeriods(kpiID=kpiObj.kpiID)
+            # Reuse the calendar periods of the previous aggregation when it was for the same KPI
+            if self.calendarPeriods is None or self.calendarPeriods.kpiID != kpiObj.kpiID:
+                self.calendarPeriods = CalendarPeriods(kpiID=kpiObj.kpiID)
 
         if self.mapping['granularity'] == 'Daily':
-            _dataDF = self.dataDF
-            _periodsDF = self.calendarPeriods.getPeriods()
-            _aggregatedDF = pd.DataFrame()
-
-            _periodsDF['period_start_date']=_periodsDF['period_start_date'].apply(lambda x:pd.to_datetime(x))
-            _periodsDF['period_end_date'] = _periodsDF['period_end_date'].apply(lambda x: pd.to_datetime(x))
-
-            # Get number of days in current period
-            currentPeriodDayCount = None
-            if len(_periodsDF.loc[_periodsDF['is_current_time_period']]) > 0:
-                currentPeriodStartDate = _periodsDF.loc[_periodsDF['is_current_time_period']]['period_start_date'].iat[0]
-                currentPeriodEndDate = _periodsDF.loc[_periodsDF['is_current_time_period']]['period_end_date'].iat[0]
-                maxDate = max(_dataDF['Date'])
-                
+            _periodsDF = self.calendarPeriods.getPeriods().drop_duplicates('period_name').reset_index(drop=True)
+            _periodsDF['period_start_date'] = pd.to_datetime(_periodsDF['period_start_date'])
+            _periodsDF['period_end_date'] = pd.to_datetime(_periodsDF['period_end_date'])
+            _dates = pd.to_datetime(self.dataDF['Date'])
+            minDate = _dates.min()
+            maxDate = _dates.max()
+
+            # Get number of days in current period, unless given by the caller (e.g. for earlier chunks of a streamed load)
+            _currentPeriodDF = _periodsDF.loc[_periodsDF['is_current_time_period']]
+            if currentPeriodDayCount is None and len(_currentPeriodDF) > 0:
+                currentPeriodStartDate = _currentPeriodDF['period_start_date'].iat[0]
+                currentPeriodEndDate = _currentPeriodDF['period_end_date'].iat[0]
+
                 if currentPeriodStartDate <= maxDate and currentPeriodEndDate >= maxDate:
                     currentPeriodDayCount = maxDate - currentPeriodStartDate
 
-            for fq in _periodsDF.period_name.unique():
-                startDate = _periodsDF[_periodsDF.period_name == fq]['period_start_date'].iat[0]
-                endDate = _periodsDF[_periodsDF.period_name == fq]['period_end_date'].iat[0]
-                isCurrentQuarter = _periodsDF[_periodsDF.period_name == fq]['is_current_time_period'].iat[0]
+            # remove incomplete quarters and quarters not fully covered by the data
+            isCurrentQuarter = _periodsDF['is_current_time_period'].astype(bool)
+            isIncomplete = (_periodsDF['period_end_date'] > maxDate) & (~isCurrentQuarter | completeCurrentQuarter)
+            isOutOfRange = (_periodsDF['period_start_date'] > maxDate) | (_periodsDF['period_start_date'] < minDate)
+            _periodsDF = _periodsDF.loc[~isIncomplete & ~isOutOfRange]
 
-                # remove incomplete quarters
-                if endDate > max(_dataDF['Date']):
-                    if not isCurrentQuarter or (isCurrentQuarter and completeCurrentQuarter):
-                        continue
-                
-                if startDate > max(_dataDF['Date']):
-                    continue
+            _periodsDF = _periodsDF.sort_values('period_start_date', kind='mergesort')
+            startDates = _periodsDF['period_start_date'].to_numpy()
+            endDates = _periodsDF['period_end_date'].to_numpy()
 
-                if startDate < min(_dataDF['Date']):
-                    continue
+            if len(_periodsDF) > 1 and (startDates[1:] <= endDates[:-1]).any():
+                # overlapping periods can not be assigned by a single search, aggregate them one at a time
+                _aggregatedDF = self._aggregatePeriodsByLoop(_periodsDF.sort_index(), _dates, dimensions, currentPeriodDayCount)
+            else:
+                _aggregatedDF = self._aggregatePeriodsGrouped(_periodsDF, _dates, dimensions, currentPeriodDayCount)
 
-                _periodDF = _dataDF[(_dataDF['Date'] >= startDate) & (_dataDF['Date'] <= endDate)]
-                endDatePeriodToDate = None
-                if currentPeriodDayCount is not None:
-                    endDatePeriodToDate = startDate + currentPeriodDayCount
-                    _periodToDateDF = _dataDF[(_dataDF['Date'] >= startDate) & (_dataDF['Date'] <= endDatePeriodToDate)]
+            column_order = ['PeriodLabel', 'PeriodToDate', 'PeriodStartDate', 'PeriodEndDate', 'IsCurrentQuarter']
+            _aggregatedDF = OrderDataFrameColumns(column_order, _aggregatedDF)
+            _aggregatedDF = _aggregatedDF.sort_values(['PeriodToDate', 'PeriodLabel'])
 
-                _periodAggDF = pd.DataFrame()
-                
-                
-                if len(dimensions) == 0:
-                    _periodAggDF = self.applyMeasures(dataDF = _periodDF, applyAsAggregate=True)
+            self.aggregatedDF = _aggregatedDF
+            self.currentPeriodDayCount = currentPeriodDayCount
 
-                    if currentPeriodDayCount is not None:
-                        _periodToDateAggDF = self.applyMeasures(dataDF = _periodToDateDF, applyAsAggregate=True)
-                else:
-                    _periodAggDFTemp = _periodDF.groupby(dimensions)
-                    _periodAggDF = self.applyMeasures(dataDF = _periodAggDFTemp, applyAsAggregate=False, inplace=False)
-                    _periodAggDF = _periodAggDF.reset_index()
+        return self.aggregatedDF
 
-                    if currentPeriodDayCount is not None:
-                        _periodToDateAggDFTemp = _periodToDateDF.groupby(dimensions)
-                        _periodToDateAggDF = self.applyMeasures(dataDF = _periodToDateAggDFTemp, applyAsAggregate=False, inplace=False)
-                        _periodToDateAggDF = _periodToDateAggDF.reset_index()
+    def _aggregatePeriodsGrouped(self, periodsDF: pd.DataFrame, dates: pd.Series, dimensions: list, periodToDateDays) -> pd.DataFrame:
+        # periodsDF must be sorted by start date and non overlapping
+        startDates = periodsDF['period_start_date'].to_numpy()
+        endDates = periodsDF['period_end_date'].to_numpy()
+        dateValues = dates.to_numpy()
+
+        # Assign every row to its period in one pass
+        periodIndex = np.searchsorted(startDates, dateValues, side='right') - 1
+        inPeriod = periodIndex >= 0
+        inPeriod[inPeriod] = dateValues[inPeriod] <= endDates[periodIndex[inPeriod]]
+        periodRows = np.flatnonzero(inPeriod)
+
+        _binnedDF = [self.dataDF.iloc[periodRows].assign(_PeriodIndex=periodIndex[periodRows], _IsPeriodToDate=False)]
+        periodToDateEndDates = None
+        if periodToDateDays is not None:
+            periodToDateEndDates = startDates + np.timedelta64(periodToDateDays)
+            periodToDateRows = periodRows[dateValues[periodRows] <= periodToDateEndDates[periodIndex[periodRows]]]
+            _binnedDF.append(self.dataDF.iloc[periodToDateRows].assign(_PeriodIndex=periodIndex[periodToDateRows], _IsPeriodToDate=True))
+        _binnedDF = pd.concat(_binnedDF, ignore_index=True)
+
+        groupKeys = ['_PeriodIndex', '_IsPeriodToDate']
+        _groupedDF = _binnedDF.groupby(groupKeys + dimensions, observed=True)
+        _aggregatedDF = self.applyMeasures(dataDF=_groupedDF, inplace=False)
+        if _aggregatedDF.shape[1] == 0:
+            _aggregatedDF = pd.DataFrame(index=_groupedDF.size().index)
+        _aggregatedDF = _aggregatedDF.reset_index()
+
+        if len(dimensions) == 0:
+            # Periods without any rows still get an (empty) aggregate, as applyMeasures would give for them
+            expectedKeys = [(x, False) for x in range(len(periodsDF))]
+            if periodToDateDays is not None:
+                expectedKeys += [(x, True) for x in range(len(periodsDF))]
+            expectedIndex = pd.MultiIndex.from_tuples(expectedKeys, names=groupKeys)
+            _aggregatedDF = _aggregatedDF.set_index(groupKeys)
+            missingKeys = expectedIndex.difference(_aggregatedDF.index)
+            if len(missingKeys) > 0:
+                _emptyDF = self.applyMeasures(dataDF=self.dataDF.iloc[0:0], applyAsAggregate=True, inplace=False)
+                _emptyDF = pd.DataFrame(np.repeat(_emptyDF.to_numpy(), len(missingKeys), axis=0), columns=_emptyDF.columns, index=missingKeys)
+                _aggregatedDF = pd.concat([_aggregatedDF, _emptyDF])
+            _aggregatedDF = _aggregatedDF.reset_index()
+
+        # Keep the order of the original per period append: periods in calendar order, each followed by its period to date rows
+        periodOrder = periodsDF.index.to_numpy()[_aggregatedDF['_PeriodIndex'].to_numpy()]
+        _aggregatedDF = _aggregatedDF.iloc[np.lexsort((_aggregatedDF['_IsPeriodToDate'].to_numpy(), periodOrder))]
+        _aggregatedDF = _aggregatedDF.reset_index(drop=True)
+
+        rowPeriodIndex = _aggregatedDF['_PeriodIndex'].to_numpy()
+        rowPeriodToDate = _aggregatedDF['_IsPeriodToDate'].to_numpy(dtype=bool)
+        _aggregatedDF['PeriodLabel'] = periodsDF['period_name'].to_numpy()[rowPeriodIndex]
+        _aggregatedDF['PeriodToDate'] = rowPeriodToDate
+        _aggregatedDF['PeriodStartDate'] = startDates[rowPeriodIndex]
+        if periodToDateEndDates is not None:
+            _aggregatedDF['PeriodEndDate'] = np.where(rowPeriodToDate, periodToDateEndDates[rowPeriodIndex], endDates[rowPeriodIndex])
+        else:
+            _aggregatedDF['PeriodEndDate'] = endDates[rowPeriodIndex]
+        _aggregatedDF['IsCurrentQuarter'] = periodsDF['is_current_time_period'].to_numpy()[rowPeriodIndex]
 
+        return _aggregatedDF.drop(groupKeys, axis=1)
 
-                _periodAggDF['PeriodLabel'] = fq
-                _periodAggDF['PeriodToDate'] = False
-                _periodAggDF['PeriodStartDate'] = startDate
-                _periodAggDF['PeriodEndDate'] = endDate
-                _periodAggDF['IsCurrentQuarter'] = isCurrentQuarter
-                _aggregatedDF = _aggregatedDF.append(_periodAggDF, sort=False, ignore_index=True)
-                
-                if currentPeriodDayCount is not None:
-                    _periodToDateAggDF['PeriodLabel'] = fq
-                    _periodToDateAggDF['PeriodToDate'] = True
-                    _periodToDateAggDF['PeriodStartDate'] = startDate
-                    _periodToDateAggDF['PeriodEndDate'] = endDatePeriodToDate
-                    _periodToDateAggDF['IsCurrentQuarter'] = isCurrentQuarter
-                    _aggregatedDF = _aggregatedDF.append(_periodToDateAggDF, sort=False, ignore_index=True)
+    def _aggregatePeriodsByLoop(self, periodsDF: pd.DataFrame, dates: pd.Series, dimensions: list, periodToDateDays) -> pd.DataFrame:
+        _aggregatedDFs = []
+        for _, period in periodsDF.iterrows():
+            startDate = period['period_start_date']
+            endDate = period['period_end_date']
+            windows = [(False, endDate)]
+            if periodToDateDays is not None:
+                windows.append((True, startDate + periodToDateDays))
 
-            column_order = ['PeriodLabel', 'PeriodToDate', 'PeriodStartDate', 'PeriodEndDate', 'IsCurrentQuarter']
-            _aggregatedDF = OrderDataFrameColumns(column_order, _aggregatedDF)
-            _aggregatedDF = _aggregatedDF.sort_values(['PeriodToDate', 'PeriodLabel'])
+            for isPeriodToDate, windowEndDate in windows:
+                _periodDF = self.dataDF[((dates >= startDate) & (dates <= windowEndDate)).to_numpy()]
 
-            self.aggregatedDF = _aggregatedDF
+                if len(dimensions) == 0:
+                    _periodAggDF = self.applyMeasures(dataDF=_periodDF, applyAsAggregate=True, inplace=False)
+                else:
+                    _periodAggDF = self.applyMeasures(dataDF=_periodDF.groupby(dimensions, observed=True), applyAsAggregate=False, inplace=False)
+                    _periodAggDF = _periodAggDF.reset_index()
 
-        return self.aggregatedDF
+                _periodAggDF['PeriodLabel'] = period['period_name']
+                _periodAggDF['PeriodToDate'] = isPeriodToDate
+                _periodAggDF['PeriodStartDate'] = startDate
+                _periodAggDF['PeriodEndDate'] = windowEndDate
+                _periodAggDF['IsCurrentQuarter'] = period['is_current_time_period']
+                _aggregatedDFs.append(_periodAggDF)
+
+        if len(_aggregatedDFs) == 0:
+            return pd.DataFrame(columns=['PeriodLabel', 'PeriodToDate', 'PeriodStartDate', 'PeriodEndDate', 'IsCurrentQuarter'])
+        return pd.concat(_aggregatedDFs, sort=False, ignore_index=True)
 
     def getMeasures(self,allMeasures=False):
         measures = []
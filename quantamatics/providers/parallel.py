@@ -0,0 +1,266 @@
+import asyncio
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from quantamatics.core import settings
+from quantamatics.core.loop import runSync
+from quantamatics.core.utils import QException, QLog
+from quantamatics.data.fundamentals import CalendarPeriods
+from quantamatics.data.securityMaster import Universe
+from quantamatics.providers.panels import Panel
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    _arrowAvailable = True
+except ImportError:
+    _arrowAvailable = False
+
+
+class _StaticCalendarPeriods:
+    # Calendar periods already fetched by the parent process, so workers never call the API
+    def __init__(self, periodsDF: pd.DataFrame):
+        self.periodsDF = periodsDF
+        self.kpiID = None
+
+    def getPeriods(self) -> pd.DataFrame:
+        return self.periodsDF.copy()
+
+
+def _makeWorkerPanel(mapping: dict) -> Panel:
+    panel = Panel.__new__(Panel)
+    panel.panelName = None
+    panel.dataDF = None
+    panel.calendarPeriods = None
+    panel.mapping = mapping
+    panel.logger = QLog()
+    return panel
+
+
+def _aggregateFrame(panel: Panel, tickerDF: pd.DataFrame, periodsDF: pd.DataFrame, dimensions: list,
+                    completeCurrentQuarter: bool) -> pd.DataFrame:
+    panel.dataDF = tickerDF
+    return panel.aggregateDataToCalendarPeriods(dimensions=dimensions,
+                                                calendarPeriodsObj=_StaticCalendarPeriods(periodsDF),
+                                                completeCurrentQuarter=completeCurrentQuarter)
+
+
+def _attachSharedMemory(name: str) -> shared_memory.SharedMemory:
+    # Pool workers share the parent's resource tracker, the parent unlinks the block once every task is done
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _readFrames(shm: shared_memory.SharedMemory, ranges: list) -> list:
+    # Each ticker is its own Arrow IPC stream in the block- only the byte ranges of this task are copied out
+    return [pyarrow.ipc.open_stream(bytes(shm.buf[offset:offset + length])).read_all().to_pandas()
+            for offset, length in ranges]
+
+
+def _aggregateWorker(shmName: str, tasks: list, mapping: dict, tickerColumn: str, dimensions: list,
+                     completeCurrentQuarter: bool) -> bytes:
+    shm = _attachSharedMemory(shmName)
+    try:
+        frames = _readFrames(shm, [x[1] for x in tasks])
+    finally:
+        shm.close()
+
+    panel = _makeWorkerPanel(mapping)
+    results = []
+    for (ticker, _, periodsDF), tickerDF in zip(tasks, frames):
+        aggregatedDF = _aggregateFrame(panel, tickerDF.drop([tickerColumn], axis=1), periodsDF, dimensions,
+                                       completeCurrentQuarter)
+        aggregatedDF.insert(0, tickerColumn, ticker)
+        results.append(aggregatedDF)
+
+    # Results go back as Arrow IPC as well
+    resultDF = pd.concat(results, ignore_index=True, sort=False) if len(results) > 0 else pd.DataFrame()
+    sink = pyarrow.BufferOutputStream()
+    table = pyarrow.Table.from_pandas(resultDF, preserve_index=False)
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class ParallelAggregator:
+    # Aggregates a long panel frame (one row per ticker and date) to calendar periods across a process pool.
+    # Each ticker is aggregated on its own, with its own calendar periods where given
+    def __init__(self, panel: Panel, maxWorkers: int = None, tasksPerWorker: int = 4):
+        if maxWorkers is None:
+            maxWorkers = settings.AggregationWorkers
+        if maxWorkers is None:
+            maxWorkers = os.cpu_count() or 1
+
+        self.panel = panel
+        self.maxWorkers = max(1, maxWorkers)
+        self.tasksPerWorker = max(1, tasksPerWorker)
+        self.logger = QLog()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _getExecutor(self) -> ProcessPoolExecutor:
+        # The pool is kept between calls so workers only pay their start up cost once
+        if self._executor is None:
+            context = None
+            if settings.AggregationStartMethod is not None:
+                context = multiprocessing.get_context(settings.AggregationStartMethod)
+            self._executor = ProcessPoolExecutor(max_workers=self.maxWorkers, mp_context=context)
+        return self._executor
+
+    def _getWorkerMapping(self) -> dict:
+        # Workers evaluate the columnar expressions, the row-wise lambdas can not be sent to another process
+        measures = {}
+        for measureName, measureItem in self.panel.mapping['measures'].items():
+            if 'agg_func' in measureItem and 'agg_func_expr' not in measureItem:
+                return None
+            measures[measureName] = dict([[k, v] for k, v in measureItem.items() if not callable(v)])
+        return {**self.panel.mapping, 'measures': measures}
+
+    def aggregate(self, dataDF: pd.DataFrame, calendarPeriods, tickerColumn: str = 'Ticker',
+                  dimensions: str(list) = None, completeCurrentQuarter: bool = True) -> pd.DataFrame:
+        # calendarPeriods is one CalendarPeriods object for every ticker or a {ticker: CalendarPeriods} dict
+        if tickerColumn not in dataDF.columns:
+            raise QException('Panel data does not have %s column' % tickerColumn)
+
+        if dimensions is None:
+            dimensions = []
+
+        tickers = [x for x in pd.unique(dataDF[tickerColumn]) if not pd.isnull(x)]
+        if isinstance(calendarPeriods, dict):
+            missing = [x for x in tickers if x not in calendarPeriods]
+            if len(missing) > 0:
+                self.logger.logDebug('No calendar periods for %s' % ', '.join([str(x) for x in missing]))
+            tickers = [x for x in tickers if x in calendarPeriods]
+            periods = dict([[x, calendarPeriods[x].getPeriods()] for x in tickers])
+        else:
+            sharedPeriodsDF = calendarPeriods.getPeriods()
+            periods = dict([[x, sharedPeriodsDF] for x in tickers])
+
+        if len(tickers) == 0:
+            return pd.DataFrame(columns=[tickerColumn])
+
+        mapping = self._getWorkerMapping()
+        if self.maxWorkers == 1 or len(tickers) == 1 or mapping is None or not _arrowAvailable or \
+                not settings.VectorizedMeasures:
+            return self._aggregateSerial(dataDF, tickers, periods, tickerColumn, dimensions, completeCurrentQuarter)
+
+        # Sort once by ticker and write one Arrow IPC stream per ticker into a single shared memory block
+        tickerOrder = dict([[x, i] for i, x in enumerate(tickers)])
+        tickerCodes = dataDF[tickerColumn].map(tickerOrder)
+        sortedDF = dataDF.loc[tickerCodes.notnull().to_numpy()]
+        sortedCodes = tickerCodes[tickerCodes.notnull()].to_numpy(dtype='int64')
+        sortOrder = np.argsort(sortedCodes, kind='stable')
+        sortedDF = sortedDF.iloc[sortOrder].reset_index(drop=True)
+        offsets = np.searchsorted(sortedCodes[sortOrder], np.arange(len(tickers) + 1))
+
+        table = pyarrow.Table.from_pandas(sortedDF, preserve_index=False)
+
+        def writeTicker(sink, tickerIndex):
+            with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table.slice(offsets[tickerIndex], offsets[tickerIndex + 1] - offsets[tickerIndex]))
+
+        ranges = []
+        position = 0
+        for i in range(len(tickers)):
+            mockSink = pyarrow.MockOutputStream()
+            writeTicker(mockSink, i)
+            ranges.append((position, mockSink.size()))
+            position += mockSink.size()
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, position))
+        try:
+            buffer = pyarrow.py_buffer(shm.buf)
+            sink = pyarrow.FixedSizeBufferWriter(buffer)
+            for i in range(len(tickers)):
+                writeTicker(sink, i)
+            sink.close()
+            del sink, buffer
+
+            # Largest tickers first, spread over a few tasks per worker
+            taskCount = min(len(tickers), self.maxWorkers * self.tasksPerWorker)
+            taskTickers = [[] for _ in range(taskCount)]
+            for i, tickerIndex in enumerate(np.argsort(-np.diff(offsets), kind='stable')):
+                taskTickers[i % taskCount].append(tickerIndex)
+
+            executor = self._getExecutor()
+            futures = [executor.submit(_aggregateWorker, shm.name,
+                                       [(tickers[x], ranges[x], periods[tickers[x]]) for x in taskIndices],
+                                       mapping, tickerColumn, dimensions, completeCurrentQuarter)
+                       for taskIndices in taskTickers if len(taskIndices) > 0]
+            results = [pyarrow.ipc.open_stream(x.result()).read_all().to_pandas() for x in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return self._combineResults(results, tickers, tickerColumn)
+
+    def _aggregateSerial(self, dataDF: pd.DataFrame, tickers: list, periods: dict, tickerColumn: str,
+                         dimensions: list, completeCurrentQuarter: bool) -> pd.DataFrame:
+        panel = _makeWorkerPanel(self.panel.mapping)
+        results = []
+        for ticker, tickerDF in dataDF.groupby(tickerColumn, sort=False, observed=True):
+            if ticker not in periods:
+                continue
+            aggregatedDF = _aggregateFrame(panel, tickerDF.drop([tickerColumn], axis=1).reset_index(drop=True),
+                                           periods[ticker], dimensions, completeCurrentQuarter)
+            aggregatedDF.insert(0, tickerColumn, ticker)
+            results.append(aggregatedDF)
+        return self._combineResults(results, tickers, tickerColumn)
+
+    def _combineResults(self, results: list, tickers: list, tickerColumn: str) -> pd.DataFrame:
+        results = [x for x in results if len(x) > 0]
+        if len(results) == 0:
+            return pd.DataFrame(columns=[tickerColumn])
+
+        resultDF = pd.concat(results, ignore_index=True, sort=False)
+        tickerOrder = dict([[x, i] for i, x in enumerate(tickers)])
+        sortOrder = np.lexsort((resultDF['PeriodLabel'].to_numpy(), resultDF['PeriodToDate'].to_numpy(),
+                                resultDF[tickerColumn].map(tickerOrder).to_numpy()))
+        return resultDF.iloc[sortOrder].reset_index(drop=True)
+
+    async def _loadCalendarPeriodsAsync(self, instrumentIDs: list) -> list:
+        # Every calendar is requested concurrently before any work is handed to the pool, failures are returned in place
+        return await asyncio.gather(*[CalendarPeriods.createAsync(instrumentID=int(x)) for x in instrumentIDs],
+                                    return_exceptions=True)
+
+    def aggregateUniverse(self, universe: Universe, dataDF: pd.DataFrame = None, dimensions: str(list) = None,
+                          measures: str(list) = None, completeCurrentQuarter: bool = True,
+                          symbolColumn: str = 'symbol', instrumentColumn: str = 'instrument_id') -> pd.DataFrame:
+        # Loads (unless given) and aggregates every instrument of the universe on its own fiscal calendar
+        universeDF = universe.UniverseDF.dropna(subset=[symbolColumn, instrumentColumn])
+        symbols = list(universeDF[symbolColumn])
+
+        if dataDF is None:
+            loadDimensions = ['Date'] + [x for x in (dimensions or []) if x != 'Date']
+            dataDF = self.panel.loadDataBatch(tickers=symbols, dimensions=loadDimensions, measures=measures,
+                                              asDict=False)
+
+        calendarPeriods = {}
+        for symbol, periods in zip(symbols, runSync(self._loadCalendarPeriodsAsync(list(universeDF[instrumentColumn])))):
+            if isinstance(periods, QException):
+                self.logger.logDebug('No calendar periods for %s: %s' % (symbol, periods))
+            elif isinstance(periods, BaseException):
+                raise periods
+            else:
+                calendarPeriods[symbol] = periods
+
+        return self.aggregate(dataDF, calendarPeriods, tickerColumn='Ticker',
+                              dimensions=[x for x in (dimensions or []) if x != 'Date'],
+                              completeCurrentQuarter=completeCurrentQuarter)
@@ -0,0 +1,239 @@
+import contextlib
+import contextvars
+import functools
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Innermost open stage of the running task (or thread)- each coroutine of a batch or chunked load keeps its own chain
+_currentEntry = contextvars.ContextVar('quantamaticsProfilerEntry', default=None)
+
+# Every open stage of every profiler. tracemalloc has one process wide peak, it is folded into all of them before it is
+# reset, so concurrent stages never lose a peak (a stage's peak includes whatever ran alongside it)
+_openEntries = []
+_openEntriesLock = threading.Lock()
+
+# Set when a profiler started tracemalloc, which is stopped again once no profiler is open
+_ownsTracing = False
+
+
+class _OpenEntry:
+    def __init__(self, record, parent, baseline: int = 0):
+        self.record = record
+        self.parent = parent
+        self.baseline = baseline
+        self.peak = baseline
+
+
+def _foldPeak() -> int:
+    # Called with _openEntriesLock held, returns the memory currently traced
+    current, peak = tracemalloc.get_traced_memory()
+    for entry in _openEntries:
+        entry.peak = max(entry.peak, peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+class StageProfile:
+    def __init__(self, name: str):
+        self.name = name
+        self.parent = None
+        self.seconds = 0.0
+        self.rowsIn = None
+        self.rowsOut = None
+        self.peakMemoryBytes = None
+
+    def toDict(self) -> dict:
+        return {
+            'stage': self.name,
+            'parent': self.parent,
+            'seconds': self.seconds,
+            'rowsIn': self.rowsIn,
+            'rowsOut': self.rowsOut,
+            'peakMemoryBytes': self.peakMemoryBytes
+        }
+
+
+class MeasureProfile:
+    def __init__(self, functionName: str, measure: str, rows: int = None):
+        self.functionName = functionName
+        self.measure = measure
+        self.parent = None
+        self.rows = rows
+        self.seconds = 0.0
+        self.peakMemoryBytes = None
+        self.method = None
+        self.fallback = False
+        self.skipped = False
+        self.error = None
+
+    def skip(self, exception: Exception):
+        self.skipped = True
+        self.error = '%s: %s' % (type(exception).__name__, exception)
+
+    def toDict(self) -> dict:
+        return {
+            'functionName': self.functionName,
+            'measure': self.measure,
+            'seconds': self.seconds,
+            'rows': self.rows,
+            'peakMemoryBytes': self.peakMemoryBytes,
+            'method': self.method,
+            'fallback': self.fallback,
+            'skipped': self.skipped,
+            'error': self.error
+        }
+
+
+class PanelProfile:
+    # Report of one profiled load- stages in the order they ran, and every measure evaluated by applyMeasures. Peak memory
+    # is what the stage allocated above what was in use when it started (Python and numpy allocations, not Arrow buffers)
+    def __init__(self, panelName: str):
+        self.panelName = panelName
+        self.stages = []
+        self.measures = []
+        self.totalSeconds = 0.0
+        self.peakMemoryBytes = None
+
+    def getSkippedMeasures(self) -> list:
+        return [x for x in self.measures if x.skipped]
+
+    def getStagesFrame(self) -> pd.DataFrame:
+        return pd.DataFrame([x.toDict() for x in self.stages],
+                            columns=['stage', 'parent', 'seconds', 'rowsIn', 'rowsOut', 'peakMemoryBytes'])
+
+    def getMeasuresFrame(self) -> pd.DataFrame:
+        return pd.DataFrame([x.toDict() for x in self.measures],
+                            columns=['functionName', 'measure', 'seconds', 'rows', 'peakMemoryBytes', 'method',
+                                     'fallback', 'skipped', 'error'])
+
+    def toDict(self) -> dict:
+        return {
+            'panelName': self.panelName,
+            'totalSeconds': self.totalSeconds,
+            'peakMemoryBytes': self.peakMemoryBytes,
+            'stages': [x.toDict() for x in self.stages],
+            'measures': [x.toDict() for x in self.measures]
+        }
+
+    def summary(self) -> str:
+        lines = ['%s: %.4fs' % (self.panelName, self.totalSeconds)]
+        for stage in self.stages:
+            lines.append('  %-40s %10.4fs  rows %s -> %s%s' % (
+                stage.name, stage.seconds, stage.rowsIn, stage.rowsOut,
+                '  peak %.1f MB' % (stage.peakMemoryBytes / 1048576) if stage.peakMemoryBytes is not None else ''))
+        for measure in sorted(self.measures, key=lambda x: -x.seconds):
+            lines.append('  %-40s %10.4fs  %s%s' % (
+                '%s[%s]' % (measure.functionName, measure.measure), measure.seconds, measure.method,
+                '  SKIPPED (%s)' % measure.error if measure.skipped else ''))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return self.summary()
+
+
+class PanelProfiler:
+    # Opt-in profiling of a panel's load stages: with panel.profile() as profile: panel.loadData(...)
+    # Memory is tracked with tracemalloc, which slows allocation heavy stages down- pass trackMemory=False for timings only
+    def __init__(self, panel, trackMemory: bool = True):
+        self.panel = panel
+        self.trackMemory = trackMemory
+        self.profile = PanelProfile(getattr(panel, 'panelName', type(panel).__name__))
+        self._previousProfiler = None
+        self._startTime = None
+        self._rootEntry = None
+
+    def __enter__(self) -> PanelProfile:
+        self._previousProfiler = self.panel.__dict__.get('_profiler')
+        self.panel._profiler = self
+        if self.trackMemory:
+            global _ownsTracing
+            with _openEntriesLock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _ownsTracing = True
+                self._rootEntry = _OpenEntry(self.profile, None, _foldPeak())
+                _openEntries.append(self._rootEntry)
+        self._startTime = time.perf_counter()
+        return self.profile
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profile.totalSeconds = time.perf_counter() - self._startTime
+        if self._rootEntry is not None:
+            global _ownsTracing
+            with _openEntriesLock:
+                _foldPeak()
+                _openEntries.remove(self._rootEntry)
+                if _ownsTracing and len(_openEntries) == 0:
+                    tracemalloc.stop()
+                    _ownsTracing = False
+            self.profile.peakMemoryBytes = max(0, self._rootEntry.peak - self._rootEntry.baseline)
+            self._rootEntry = None
+        self.panel._profiler = self._previousProfiler
+        return False
+
+    @contextlib.contextmanager
+    def _track(self, record):
+        parent = _currentEntry.get()
+        if parent is not None:
+            record.parent = _getLabel(parent.record)
+
+        tracking = self.trackMemory and tracemalloc.is_tracing()
+        entry = _OpenEntry(record, parent)
+        if tracking:
+            with _openEntriesLock:
+                entry.baseline = entry.peak = _foldPeak()
+                _openEntries.append(entry)
+
+        token = _currentEntry.set(entry)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record.seconds = time.perf_counter() - start
+            _currentEntry.reset(token)
+            if tracking:
+                with _openEntriesLock:
+                    _foldPeak()
+                    _openEntries.remove(entry)
+                record.peakMemoryBytes = max(0, entry.peak - entry.baseline)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rowsIn: int = None):
+        stage = StageProfile(name)
+        stage.rowsIn = rowsIn if rowsIn is not None else _getRowCount(self.panel.dataDF)
+        self.profile.stages.append(stage)
+        with self._track(stage):
+            yield stage
+        if stage.rowsOut is None:
+            stage.rowsOut = _getRowCount(self.panel.dataDF)
+
+    @contextlib.contextmanager
+    def measure(self, functionName: str, measure: str, rows: int = None):
+        measureProfile = MeasureProfile(functionName, measure, rows)
+        self.profile.measures.append(measureProfile)
+        with self._track(measureProfile):
+            yield measureProfile
+
+
+def profiledStage(name: str):
+    # Times the decorated Panel method as a stage while the panel is being profiled
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._profileStage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _getLabel(record) -> str:
+    if isinstance(record, MeasureProfile):
+        return '%s[%s]' % (record.functionName, record.measure)
+    return record.name if isinstance(record, StageProfile) else None
+
+
+def _getRowCount(dataDF) -> int:
+    return len(dataDF) if dataDF is not None else None
@@ -40,10 +40,13 @@ install_reqs = [
     'pyOpenSSL>=21.0.0',
     'pandas',
     'numpy',
-    'aiohttp[speedups]',
-    'nest_asyncio'
+    'aiohttp[speedups]'
 ]
 
+extras_reqs = {
+    'parquet': ['pyarrow']
+}
+
 if __name__ == "__main__":
     setup(
         name=DISTNAME,
@@ -56,5 +59,6 @@ if __name__ == "__main__":
         packages=packages,
         package_data=package_data,
         classifiers=classifiers,
-        install_requires=install_reqs
+        install_requires=install_reqs,
+        extras_require=extras_reqs
     )
@@ -0,0 +1,101 @@
+import types
+
+import pandas as pd
+import pytest
+
+from quantamatics.core import cache
+from quantamatics.core.cache import ResponseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Entries are stamped with the cache module's clock, which the tests move by hand
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def makeFrame(value: float) -> pd.DataFrame:
+    return pd.DataFrame({'Date': pd.date_range('2024-01-01', periods=10), 'Spend': value})
+
+
+def test_ttl_expires_per_endpoint_prefix(tmp_path, clock):
+    responseCache = ResponseCache(str(tmp_path), defaultTTL=100,
+                                  endpointTTLs={'/api/data/panel': 10, '/api/data/panel/init': 1000})
+
+    assert responseCache.getTTL('/api/data/panel/load') == 10
+    assert responseCache.getTTL('/api/data/panel/init') == 1000
+    assert responseCache.getTTL('/api/data/kpi/load') == 100
+
+    responseCache.put('load', '/api/data/panel/load', makeFrame(1.0))
+    responseCache.put('init', '/api/data/panel/init', makeFrame(2.0))
+    responseCache.put('kpi', '/api/data/kpi/load', makeFrame(3.0))
+
+    clock.value += 50
+    assert responseCache.get('load') is None
+    pd.testing.assert_frame_equal(responseCache.get('init'), makeFrame(2.0))
+    pd.testing.assert_frame_equal(responseCache.get('kpi'), makeFrame(3.0))
+
+    clock.value += 100
+    assert responseCache.get('kpi') is None
+    assert responseCache.get('init') is not None
+
+
+def test_zero_ttl_is_not_cached(tmp_path, clock):
+    responseCache = ResponseCache(str(tmp_path), endpointTTLs={'/api/auth': 0})
+    responseCache.put('auth', '/api/auth/token', makeFrame(1.0))
+    assert responseCache.get('auth') is None
+    assert responseCache.getSize() == 0
+
+
+def test_least_recently_used_entries_are_evicted_at_size_cap(tmp_path, clock):
+    responseCache = ResponseCache(str(tmp_path))
+    responseCache.put('a', '/api/a', makeFrame(1.0))
+    entrySize = responseCache.getSize()
+    responseCache.maxSizeBytes = entrySize * 2
+
+    clock.value += 1
+    responseCache.put('b', '/api/b', makeFrame(2.0))
+
+    # Reading a makes b the least recently used entry
+    clock.value += 1
+    assert responseCache.get('a') is not None
+
+    clock.value += 1
+    responseCache.put('c', '/api/c', makeFrame(3.0))
+
+    assert responseCache.get('b') is None
+    assert responseCache.get('a') is not None
+    assert responseCache.get('c') is not None
+    assert responseCache.getSize() <= responseCache.maxSizeBytes
+    assert sorted([x.name for x in tmp_path.iterdir() if x.name != 'index.sqlite']) == \
+        sorted(['a.%s' % responseCache.format, 'c.%s' % responseCache.format])
+
+
+def test_invalidate(tmp_path, clock):
+    responseCache = ResponseCache(str(tmp_path))
+    for key, path in [('a', '/api/a'), ('b', '/api/a'), ('c', '/api/c'), ('d', '/api/d')]:
+        responseCache.put(key, path, makeFrame(1.0))
+
+    responseCache.invalidate(key='c')
+    assert responseCache.get('c') is None
+    assert responseCache.get('a') is not None
+
+    responseCache.invalidate(api_relative_path='/api/a')
+    assert responseCache.get('a') is None and responseCache.get('b') is None
+    assert responseCache.get('d') is not None
+
+    responseCache.invalidate()
+    assert responseCache.get('d') is None
+    assert responseCache.getSize() == 0
+
+
+def test_pickle_storage_without_pyarrow(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(cache, '_parquetAvailable', False)
+    responseCache = ResponseCache(str(tmp_path))
+    assert responseCache.format == 'pickle'
+
+    dataDF = makeFrame(1.0).set_index('Date')
+    responseCache.put('a', '/api/a', dataDF)
+    assert (tmp_path / 'a.pickle').exists()
+    pd.testing.assert_frame_equal(responseCache.get('a'), dataDF)
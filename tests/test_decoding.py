@@ -0,0 +1,78 @@
+import io
+import json
+import warnings
+
+import pandas as pd
+
+from quantamatics.core import decoding
+
+schema = {
+    'date': {'type': 'datetime.date', 'nullable': False},
+    'ticker': {'type': 'str', 'nullable': False},
+    'spend': {'type': 'float64', 'nullable': True},
+    'ratio': {'type': 'float64', 'nullable': False},
+    'count': {'type': 'int64', 'nullable': False},
+    'wide': {'type': 'int64', 'nullable': False},
+    'maybe': {'type': 'int64', 'nullable': True},
+    'small': {'type': 'int32', 'nullable': False}
+}
+
+data = {
+    'date': {'0': '2024-01-01', '1': '2024-01-02', '2': '2024-01-03', '3': '2024-01-04'},
+    'ticker': {'0': 'AAA', '1': 'BBB', '2': 'AAA', '3': 'AAA'},
+    'spend': {'0': 1.5, '1': None, '2': 2.25, '3': 0.0},
+    'ratio': {'0': 0.1, '1': 1 / 3, '2': 2.0, '3': 1e10 + 0.5},
+    'count': {'0': 1, '1': 2, '2': 3, '3': 4},
+    'wide': {'0': 2 ** 40, '1': -2 ** 40, '2': 0, '3': 5},
+    'maybe': {'0': 1, '1': None, '2': 3, '3': None},
+    'small': {'0': 7, '1': 8, '2': 9, '3': 10}
+}
+
+
+def readJsonFrame(schema: dict, data: dict) -> pd.DataFrame:
+    # The JSON decoding Session used before frameFromColumns
+    with warnings.catch_warnings():
+        warnings.simplefilter(action='ignore', category=FutureWarning)
+        df = pd.read_json(io.StringIO(json.dumps(data)), orient='columns', dtype=decoding.schemaToDtypes(schema))
+
+    for column_name in schema:
+        if df.shape[0] == 0:
+            df[column_name] = []
+        if schema[column_name]['type'] == 'datetime.date':
+            df[column_name] = pd.to_datetime(df[column_name]).dt.date
+    return df
+
+
+def test_columns_match_json_decoding():
+    pd.testing.assert_frame_equal(decoding.frameFromColumns(schema, data), readJsonFrame(schema, data))
+
+
+def test_compact_columns_match_json_values():
+    expectedDF = readJsonFrame(schema, data)
+    compactDF = decoding.frameFromColumns(schema, data, compact=True, categoricalColumns=['ticker'])
+
+    assert pd.api.types.is_datetime64_any_dtype(compactDF['date'])
+    assert isinstance(compactDF['ticker'].dtype, pd.CategoricalDtype)
+    assert list(compactDF['ticker'].cat.categories) == ['AAA', 'BBB']
+    assert compactDF['spend'].dtype == 'float32'
+    assert compactDF['count'].dtype == 'int32'
+    assert compactDF['small'].dtype == 'int32'
+
+    # Narrowing would lose precision or range here, so these keep their JSON dtypes
+    assert compactDF['ratio'].dtype == 'float64'
+    assert compactDF['wide'].dtype == 'int64'
+    assert compactDF['maybe'].dtype == 'Int64'
+
+    restoredDF = compactDF.copy()
+    restoredDF['date'] = restoredDF['date'].dt.date
+    restoredDF = restoredDF.astype(expectedDF.dtypes.to_dict())
+    pd.testing.assert_frame_equal(restoredDF, expectedDF)
+    assert compactDF['spend'].isnull().tolist() == [False, True, False, False]
+
+
+def test_empty_payload_keeps_schema():
+    emptyData = dict([[x, {}] for x in schema])
+    for compact in [False, True]:
+        df = decoding.frameFromColumns(schema, emptyData, compact=compact, categoricalColumns=['ticker'])
+        assert list(df.columns) == list(schema)
+        assert len(df) == 0
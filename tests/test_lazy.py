@@ -0,0 +1,28 @@
+import pytest
+
+from quantamatics.core.lazy import LazyObject
+
+
+def test_lazy_object_without_loader_fails_on_creation():
+    class Unloadable(LazyObject):
+        _lazyFields = ('name',)
+
+    with pytest.raises(TypeError):
+        Unloadable()
+
+
+def test_lazy_object_loads_on_first_access():
+    class Named(LazyObject):
+        _lazyFields = ('name',)
+
+        def __init__(self):
+            self._setLazy()
+
+        async def _loadAsync(self):
+            self.name = 'loaded'
+            self._setLoaded()
+
+    named = Named()
+    assert not named.isLoaded()
+    assert named.name == 'loaded'
+    assert named.isLoaded()
@@ -0,0 +1,68 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantamatics.core.APIClient import Session
+from quantamatics.providers.Facteus import FacteusSummaryBase
+from quantamatics.providers.measures import Expression, Reduction, Sum, evaluateMeasure
+from quantamatics.providers.TenTenData import TenTenBase, TenTenFixedBase
+
+
+def test_incomplete_expression_fails_on_creation():
+    class Incomplete(Expression):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_incomplete_reduction_fails_on_creation():
+    class RowOnly(Reduction):
+        def reduce(self, values: np.ndarray) -> float:
+            return np.nanmax(values)
+
+    with pytest.raises(TypeError):
+        RowOnly('Spend')
+
+
+def test_complete_reduction_evaluates():
+    dataDF = pd.DataFrame({'Spend': [1.0, np.nan, 2.0]})
+    assert evaluateMeasure(Sum('Spend'), dataDF, applyAsAggregate=True) == 3.0
+
+
+def makeMeasureFrame(panel) -> pd.DataFrame:
+    # Every column a measure reads, with zeros and NaNs in numerators and denominators alike, and one group (Z) that is
+    # all zero
+    columns = sorted(set([column for measure in panel.mapping['measures'].values()
+                          for functionName in ['pre_process_expr', 'agg_func_expr'] if functionName in measure
+                          for column in measure[functionName].columns()]))
+    rng = np.random.default_rng(0)
+    dataDF = pd.DataFrame(dict([[x, rng.integers(0, 4, 40).astype('float64')] for x in columns]))
+    dataDF.iloc[::7] = np.nan
+    dataDF.iloc[30:] = 0.0
+    dataDF['Region'] = np.repeat(['N', 'S', 'E', 'Z'], 10)
+    return dataDF
+
+
+@pytest.mark.parametrize('panelClass', [FacteusSummaryBase, TenTenBase, TenTenFixedBase])
+@pytest.mark.parametrize('functionName', ['pre_process', 'agg_func'])
+@pytest.mark.parametrize('mode', ['row', 'aggregate', 'group'])
+def test_measure_expressions_match_lambdas(monkeypatch, panelClass, functionName, mode):
+    monkeypatch.setattr(Session, 'apiWrapper', lambda self, *args, **kwargs: pd.DataFrame())
+    panel = panelClass('test panel')
+    dataDF = makeMeasureFrame(panel)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        if mode == 'group':
+            resultDF = panel.checkMeasures(dataDF.groupby('Region'), functionName=functionName)
+        else:
+            resultDF = panel.checkMeasures(dataDF.drop('Region', axis=1), functionName=functionName,
+                                           applyAsAggregate=mode == 'aggregate')
+
+    # Every measure was evaluated both ways, none was skipped
+    assert not [x for x in caught if 'was skipped' in str(x.message)]
+    assert list(resultDF['Measure']) == list(panel.mapping['measures'])
+    assert resultDF['Matches'].all(), resultDF.loc[~resultDF['Matches']]
@@ -0,0 +1,67 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from quantamatics.core import settings
+from quantamatics.core.utils import QLog
+from quantamatics.providers.panels import Panel
+from quantamatics.providers.panelStore import PanelStore
+
+
+def makePanel(directory, lastDate):
+    # A panel whose API returns daily rows from startDate up to lastDate, however far endDate reaches
+    panel = Panel.__new__(Panel)
+    panel.panelName = 'test panel'
+    panel.dataDF = None
+    panel.logger = QLog()
+    panel.panelStore = PanelStore(str(directory))
+    panel.requests = []
+    panel.lastDate = lastDate
+
+    async def loadDataAsync(ticker=None, startDate=None, endDate=None, **kwargs):
+        panel.requests.append((pd.Timestamp(startDate) if startDate is not None else None, pd.Timestamp(endDate)))
+        dates = pd.date_range(startDate if startDate is not None else '2024-01-01', min(pd.Timestamp(endDate), panel.lastDate))
+        return pd.DataFrame({'Date': dates, 'Spend': 1.0})
+
+    panel.loadDataAsync = loadDataAsync
+    return panel
+
+
+def loadStored(panel, startDate, endDate):
+    return asyncio.run(panel.loadStoredDataAsync(ticker='AAA', dimensions=['Date'], measures=['Spend'],
+                                                 startDate=startDate, endDate=endDate))
+
+
+def test_coverage_ends_at_last_returned_date(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'PanelStoreTrailingDays', 3)
+    panel = makePanel(tmp_path, pd.Timestamp('2024-01-28'))
+
+    dataDF = loadStored(panel, '2024-01-01', '2024-01-31')
+    assert dataDF['Date'].max() == pd.Timestamp('2024-01-28')
+
+    variant = panel.panelStore.makeVariant(['Date'], ['Spend'], None, True)
+    assert panel.panelStore.getCoverage('test panel', variant, 'AAA')[1] == pd.Timestamp('2024-01-28')
+
+    # The lagging days and a short trailing window are requested again once the source has caught up
+    panel.lastDate = pd.Timestamp('2024-01-31')
+    panel.requests.clear()
+
+    dataDF = loadStored(panel, '2024-01-01', '2024-01-31')
+    assert panel.requests == [(pd.Timestamp('2024-01-26'), pd.Timestamp('2024-01-31'))]
+    assert list(dataDF['Date']) == list(pd.date_range('2024-01-01', '2024-01-31'))
+
+
+def test_empty_response_is_not_covered(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'PanelStoreTrailingDays', 0)
+    store = PanelStore(str(tmp_path))
+    store.write('test panel', 'v', 'AAA', pd.DataFrame({'Date': pd.date_range('2024-01-01', '2024-01-10'), 'Spend': 1.0}),
+                '2024-01-01', '2024-01-10')
+    store.write('test panel', 'v', 'AAA', pd.DataFrame({'Date': pd.Series([], dtype='datetime64[ns]'), 'Spend': []}),
+                '2024-01-11', '2024-01-20')
+
+    assert store.getCoverage('test panel', 'v', 'AAA')[1] == pd.Timestamp('2024-01-10')
+    assert store.getMissingRanges('test panel', 'v', 'AAA', '2024-01-01', '2024-01-20') == \
+        [(pd.Timestamp('2024-01-11'), pd.Timestamp('2024-01-20'))]
@@ -0,0 +1,225 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantamatics.core import settings
+from quantamatics.core.utils import QException, QLog
+from quantamatics.providers.measures import Sum
+from quantamatics.providers.panels import Panel
+
+
+class FakeCalendarPeriods:
+    kpiID = 1
+
+    def __init__(self, periodsDF: pd.DataFrame):
+        self.periodsDF = periodsDF
+
+    def getPeriods(self) -> pd.DataFrame:
+        return self.periodsDF.copy()
+
+
+class SpendPanel(Panel):
+    # A panel serving daily Spend of 1.0 per ticker up to lastDates[ticker]
+    def __init__(self, lastDates: dict = None):
+        self.panelName = 'spend'
+        self.dataDF = None
+        self.calendarPeriods = None
+        self.batchErrors = {}
+        self.logger = QLog()
+        self.lastDates = dict([[k, pd.Timestamp(v)] for k, v in (lastDates or {}).items()])
+        self.mapping = {
+            'measures': {'Spend': {'agg_func': lambda x: np.sum(x['Spend']), 'agg_func_expr': Sum('Spend')}},
+            'dimensions': {'Date': {}},
+            'granularity': 'Daily'
+        }
+
+    async def loadDataAsync(self, ticker: str = None, startDate: str = None, endDate: str = None, **kwargs):
+        lastDate = self.lastDates[ticker] if endDate is None else min(pd.Timestamp(endDate), self.lastDates[ticker])
+        dates = pd.date_range(startDate if startDate is not None else '2020-01-01', lastDate)
+        return pd.DataFrame({'Date': dates, 'Spend': 1.0})
+
+
+def makeQuarters(currentQuarter: str = 'Q4-20') -> FakeCalendarPeriods:
+    starts = pd.date_range('2020-01-01', periods=4, freq='QS')
+    names = ['Q%d-20' % (x + 1) for x in range(4)]
+    return FakeCalendarPeriods(pd.DataFrame({
+        'period_name': names,
+        'period_start_date': [x.date() for x in starts],
+        'period_end_date': [(x + pd.offsets.QuarterEnd()).date() for x in starts],
+        'is_current_time_period': [x == currentQuarter for x in names]
+    }))
+
+
+def streamPeriods(panel: Panel, tickers: list) -> pd.DataFrame:
+    chunks = list(panel.loadDataChunks(tickers, startDate='2020-01-01', endDate='2020-12-31', chunkDays=90,
+                                       calendarPeriodsObj=makeQuarters(), aggregateToCalendarPeriods=True))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def test_stream_with_empty_latest_page():
+    periodsDF = streamPeriods(SpendPanel({'AAA': '2020-09-15'}), ['AAA'])
+
+    # The empty current quarter leaves no period to date window for the earlier quarters
+    assert sorted(periodsDF['PeriodLabel']) == ['Q1-20', 'Q2-20']
+    assert not periodsDF['PeriodToDate'].any()
+    assert list(periodsDF.sort_values('PeriodLabel')['Spend']) == [91.0, 91.0]
+
+
+def test_stream_resets_period_to_date_per_ticker():
+    periodsDF = streamPeriods(SpendPanel({'AAA': '2020-11-15', 'BBB': '2020-09-15'}), ['AAA', 'BBB'])
+
+    aaaDF = periodsDF.loc[periodsDF['Ticker'] == 'AAA']
+    bbbDF = periodsDF.loc[periodsDF['Ticker'] == 'BBB']
+
+    # AAA is 45 days into the current quarter, so its earlier quarters come with 46 day period to date rows
+    toDateDF = aaaDF.loc[aaaDF['PeriodToDate']].sort_values('PeriodLabel')
+    assert list(toDateDF['PeriodLabel']) == ['Q1-20', 'Q2-20', 'Q3-20']
+    assert list(toDateDF['Spend']) == [46.0, 46.0, 46.0]
+
+    # BBB has no data in the current quarter and must not inherit AAA's window
+    assert sorted(bbbDF['PeriodLabel']) == ['Q1-20', 'Q2-20']
+    assert not bbbDF['PeriodToDate'].any()
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    monkeypatch.setattr(settings, 'PanelSnapshotDirectory', None)
+    monkeypatch.setattr(Panel, '_snapshots', {})
+
+
+def test_refresh_keeps_stored_rows_on_empty_slice(snapshots):
+    panel = SpendPanel({'AAA': '2020-03-31'})
+    storedDF = panel.refreshData(ticker='AAA', restatementWindowDays=10).copy()
+
+    async def loadEmpty(ticker: str = None, startDate: str = None, **kwargs):
+        return pd.DataFrame({'Date': pd.Series(dtype='datetime64[ns]'), 'Spend': pd.Series(dtype='float64')})
+
+    panel.loadDataAsync = loadEmpty
+    pd.testing.assert_frame_equal(panel.refreshData(ticker='AAA', restatementWindowDays=10), storedDF)
+
+    # The snapshot written back is still complete
+    panel.loadDataAsync = SpendPanel.loadDataAsync.__get__(panel)
+    assert len(panel.refreshData(ticker='AAA', restatementWindowDays=10)) == 91
+
+
+def test_refresh_replaces_only_returned_dates(snapshots):
+    panel = SpendPanel({'AAA': '2020-03-31'})
+    panel.refreshData(ticker='AAA', restatementWindowDays=10)
+
+    # The source only returns the two restated days of the window, and one new day
+    async def loadShort(ticker: str = None, startDate: str = None, **kwargs):
+        return pd.DataFrame({'Date': pd.to_datetime(['2020-03-25', '2020-03-26', '2020-04-01']), 'Spend': [2.0, 3.0, 1.0]})
+
+    panel.loadDataAsync = loadShort
+    dataDF = panel.refreshData(ticker='AAA', restatementWindowDays=10)
+
+    assert list(dataDF['Date']) == list(pd.date_range('2020-01-01', '2020-04-01'))
+    assert dataDF['Spend'].sum() == 92 + 1.0 + 2.0
+    assert dataDF.loc[dataDF['Date'] == '2020-03-26', 'Spend'].iat[0] == 3.0
+
+
+def makeFacteusPanel(monkeypatch) -> Panel:
+    from quantamatics.core.APIClient import Session
+    from quantamatics.providers.Facteus import FacteusSummaryBase
+
+    monkeypatch.setattr(Session, 'apiWrapper', lambda self, *args, **kwargs: pd.DataFrame())
+    return FacteusSummaryBase('test panel')
+
+
+def makeDailyFrame(dimensions: list) -> pd.DataFrame:
+    # Daily rows up to 2020-11-15, 45 days into the current quarter, with nothing at all in Q2-20
+    dates = pd.date_range('2020-01-01', '2020-11-15')
+    dates = dates[(dates < '2020-04-01') | (dates > '2020-06-30')]
+    groups = ['N', 'S'] if 'Region' in dimensions else [None]
+    rng = np.random.default_rng(0)
+
+    frames = []
+    for group in groups:
+        dataDF = pd.DataFrame({'Date': dates})
+        if group is not None:
+            dataDF['Region'] = group
+        dataDF['Spend'] = rng.random(len(dates)) * 100
+        dataDF['Transaction Count'] = rng.integers(0, 5, len(dates)).astype('float64')
+        dataDF['Cardholder Count'] = rng.integers(0, 3, len(dates)).astype('float64')
+        dataDF['Transactions per Card'] = dataDF['Transaction Count'] / dataDF['Cardholder Count'].replace(0, np.nan)
+        frames.append(dataDF)
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.mark.parametrize('dimensions', [[], ['Region']])
+def test_grouped_period_aggregation_matches_loop(monkeypatch, dimensions):
+    panel = makeFacteusPanel(monkeypatch)
+    panel.dataDF = makeDailyFrame(dimensions)
+    groupedDF = panel.aggregateDataToCalendarPeriods(dimensions=dimensions, calendarPeriodsObj=makeQuarters())
+
+    # The same periods aggregated one at a time, as for overlapping periods
+    monkeypatch.setattr(panel, '_aggregatePeriodsGrouped', lambda periodsDF, dates, dims, periodToDateDays:
+                        panel._aggregatePeriodsByLoop(periodsDF.sort_index(), dates, dims, periodToDateDays))
+    loopDF = panel.aggregateDataToCalendarPeriods(dimensions=dimensions, calendarPeriodsObj=makeQuarters())
+
+    assert groupedDF['PeriodToDate'].any()
+    assert (groupedDF['PeriodLabel'] == 'Q2-20').any() == (len(dimensions) == 0)
+    pd.testing.assert_frame_equal(groupedDF.reset_index(drop=True), loopDF.reset_index(drop=True), check_dtype=False)
+
+
+def makeGappedPanel() -> Panel:
+    # Two regions with missing days, S starting two days after the panel does
+    panel = SpendPanel()
+    panel.mapping['dimensions']['Region'] = {}
+    panel.dataDF = pd.DataFrame({
+        'Date': pd.to_datetime(['2020-01-01', '2020-01-03', '2020-01-05', '2020-01-03', '2020-01-06']),
+        'Region': ['N', 'N', 'N', 'S', 'S'],
+        'Label': ['a', 'b', 'c', 'd', 'e'],
+        'Spend': [1.0, 3.0, 5.0, 10.0, 20.0]
+    })
+    return panel
+
+
+def getGroup(panel: Panel, region: str) -> pd.DataFrame:
+    return panel.dataDF.loc[panel.dataDF['Region'] == region].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('fillPolicy, expectedN, expectedS', [
+    (settings.FillPolicies.Zero, [1.0, 0.0, 3.0, 0.0, 5.0], [10.0, 0.0, 0.0, 20.0]),
+    (settings.FillPolicies.NaN, [1.0, np.nan, 3.0, np.nan, 5.0], [10.0, np.nan, np.nan, 20.0]),
+    (settings.FillPolicies.ForwardFill, [1.0, 1.0, 3.0, 3.0, 5.0], [10.0, 10.0, 10.0, 20.0])
+])
+def test_complete_daily_range_per_group(fillPolicy, expectedN, expectedS):
+    panel = makeGappedPanel()
+    panel.completeDailyRange(dimensions=['Date', 'Region'], fillPolicies={'Spend': fillPolicy})
+
+    assert list(panel.dataDF.columns) == ['Date', 'Region', 'Label', 'Spend']
+    assert panel.dataDF['Date'].is_monotonic_increasing
+
+    # Each region is completed over its own date range, not the panel's
+    groupN = getGroup(panel, 'N')
+    groupS = getGroup(panel, 'S')
+    assert list(groupN['Date']) == list(pd.date_range('2020-01-01', '2020-01-05'))
+    assert list(groupS['Date']) == list(pd.date_range('2020-01-03', '2020-01-06'))
+    np.testing.assert_array_equal(groupN['Spend'].to_numpy(), expectedN)
+    np.testing.assert_array_equal(groupS['Spend'].to_numpy(), expectedS)
+
+    # Non measure columns are left empty on the added days
+    assert list(groupS['Label'].isnull()) == [False, True, True, False]
+
+
+def test_complete_daily_range_policy_precedence(monkeypatch):
+    monkeypatch.setattr(settings, 'DefaultFillPolicy', settings.FillPolicies.NaN)
+    panel = makeGappedPanel()
+    panel.dataDF['Count'] = panel.dataDF['Spend']
+    panel.dataDF['Other'] = panel.dataDF['Spend']
+    panel.mapping['measures']['Count'] = {'fill_policy': settings.FillPolicies.ForwardFill}
+    panel.mapping['measures']['Spend']['fill_policy'] = settings.FillPolicies.ForwardFill
+
+    # An explicit policy wins over the mapping, which wins over the default
+    panel.completeDailyRange(dimensions=['Date', 'Region'], fillPolicies={'Spend': settings.FillPolicies.Zero})
+    groupS = getGroup(panel, 'S')
+    np.testing.assert_array_equal(groupS['Spend'].to_numpy(), [10.0, 0.0, 0.0, 20.0])
+    np.testing.assert_array_equal(groupS['Count'].to_numpy(), [10.0, 10.0, 10.0, 20.0])
+    np.testing.assert_array_equal(groupS['Other'].to_numpy(), [10.0, np.nan, np.nan, 20.0])
+
+
+def test_complete_daily_range_unknown_policy():
+    panel = makeGappedPanel()
+    with pytest.raises(QException, match='Unknown fill policy'):
+        panel.completeDailyRange(dimensions=['Date', 'Region'], fillPolicies={'Spend': 'interpolate'})
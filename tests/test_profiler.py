@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from quantamatics.core.utils import QLog
+from quantamatics.providers.measures import Sum
+from quantamatics.providers.panels import Panel
+
+
+class SleepyPanel(Panel):
+    # Each ticker's fetch stays open across awaits while the other tickers' fetches run
+    delays = {'AAA': 0.15, 'BBB': 0.05, 'CCC': 0.1}
+
+    def __init__(self):
+        self.panelName = 'sleepy'
+        self.dataDF = None
+        self.batchErrors = {}
+        self.logger = QLog()
+        self.mapping = {
+            'measures': {
+                'Spend': {'agg_func': lambda x: np.sum(x['Spend']), 'agg_func_expr': Sum('Spend')},
+                'Broken': {'agg_func': lambda x: x['Missing']}
+            },
+            'dimensions': {},
+            'granularity': 'Daily'
+        }
+
+    async def loadDataAsync(self, ticker: str = None, **kwargs):
+        with self._profileStage('fetch', rowsIn=0):
+            await asyncio.sleep(self.delays[ticker])
+            with self._profileStage('decode', rowsIn=0):
+                await asyncio.sleep(0.01)
+        return pd.DataFrame({'Spend': [1.0, 2.0]})
+
+
+def test_concurrent_stages_keep_their_parent_and_time():
+    panel = SleepyPanel()
+    with panel.profile() as profile:
+        panel.loadDataBatch(tickers=list(SleepyPanel.delays), asDict=True)
+
+    fetches = [x for x in profile.stages if x.name == 'fetch']
+    decodes = [x for x in profile.stages if x.name == 'decode']
+    assert len(fetches) == 3 and len(decodes) == 3
+    assert all([x.parent is None for x in fetches])
+    assert all([x.parent == 'fetch' for x in decodes])
+
+    # Each fetch is timed on its own, not from the first open fetch to the last closed one
+    expected = sorted([x + 0.01 for x in SleepyPanel.delays.values()])
+    for seconds, delay in zip(sorted([x.seconds for x in fetches]), expected):
+        assert delay <= seconds < delay + 0.04
+    assert all([x.peakMemoryBytes is not None for x in fetches])
+
+
+def test_skipped_measure_warns_without_profiler():
+    panel = SleepyPanel()
+    with pytest.warns(RuntimeWarning, match='Broken was skipped'):
+        resultDF = panel.applyMeasures(dataDF=pd.DataFrame({'Spend': [1.0, 2.0]}), applyAsAggregate=True)
+    assert list(resultDF.columns) == ['Spend']
+
+
+def test_skipped_measure_recorded_when_profiling():
+    panel = SleepyPanel()
+    with panel.profile(trackMemory=False) as profile:
+        with pytest.warns(RuntimeWarning, match='Broken was skipped'):
+            panel.applyMeasures(dataDF=pd.DataFrame({'Spend': [1.0, 2.0]}), applyAsAggregate=True)
+
+    skipped = profile.getSkippedMeasures()
+    assert [x.measure for x in skipped] == ['Broken']
+    assert skipped[0].parent == 'applyMeasures(agg_func)'
+    assert 'KeyError' in skipped[0].error
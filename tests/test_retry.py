@@ -0,0 +1,55 @@
+import threading
+import time
+
+from quantamatics.core.retry import CircuitBreaker
+
+
+def openBreaker(resetTimeout=0.05):
+    breaker = CircuitBreaker(threshold=2, resetTimeout=resetTimeout)
+    breaker.recordFailure()
+    breaker.recordFailure()
+    assert not breaker.allowRequest()
+    return breaker
+
+
+def test_half_open_admits_one_probe():
+    breaker = openBreaker()
+    time.sleep(0.06)
+
+    barrier = threading.Barrier(16)
+    admitted = []
+
+    def call():
+        barrier.wait()
+        admitted.append(breaker.allowRequest())
+
+    threads = [threading.Thread(target=call) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert admitted.count(True) == 1
+    assert breaker.isOpen()
+
+
+def test_probe_success_closes():
+    breaker = openBreaker()
+    time.sleep(0.06)
+    assert breaker.allowRequest()
+    breaker.recordSuccess()
+
+    assert not breaker.isOpen()
+    assert all([breaker.allowRequest() for _ in range(5)])
+
+
+def test_probe_failure_reopens_with_fresh_timer():
+    breaker = openBreaker()
+    time.sleep(0.06)
+    assert breaker.allowRequest()
+    breaker.recordFailure()
+
+    assert not breaker.allowRequest()
+    time.sleep(0.06)
+    assert breaker.allowRequest()
+    assert not breaker.allowRequest()
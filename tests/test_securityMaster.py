@@ -0,0 +1,61 @@
+import pandas as pd
+import pytest
+
+from quantamatics.core import settings
+from quantamatics.core.APIClient import Session
+from quantamatics.data.fundamentals import KPI
+from quantamatics.data.securityMaster import Company, Instrument
+
+
+@pytest.fixture
+def emptyAPI(monkeypatch):
+    # Every endpoint answers with no rows, as it does for an unknown symbol or ID
+    calls = []
+
+    async def apiWrapperAsync(self, api_relative_path, params={}, **kwargs):
+        calls.append(api_relative_path)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(Session, 'apiWrapperAsync', apiWrapperAsync)
+    monkeypatch.setattr(settings, 'SecurityMasterIndexDirectory', None)
+    monkeypatch.setattr(settings, 'LazyLoading', False)
+    return calls
+
+
+def test_instrument_constructor_raises_for_unknown_symbol(emptyAPI):
+    with pytest.raises(Exception, match='No Instrument Found for Symbol: UNKNOWN'):
+        Instrument('UNKNOWN')
+    assert emptyAPI == ['/api/data/instrument/load']
+
+
+def test_instrument_constructor_raises_for_unknown_id(emptyAPI):
+    with pytest.raises(Exception, match='No Instrument Found'):
+        Instrument(instrumentID=-1)
+
+
+def test_company_constructor_raises_for_unknown_id(emptyAPI):
+    with pytest.raises(Exception):
+        Company(companyID=-1)
+    assert emptyAPI == ['/api/data/company/init']
+
+
+def test_kpi_constructor_raises_for_unknown_id(emptyAPI):
+    with pytest.raises(Exception):
+        KPI(kpiID=-1)
+    with pytest.raises(Exception):
+        KPI(kpiID=-1, preLoad=True)
+
+
+def test_lazy_instrument_raises_on_first_access(emptyAPI):
+    instrument = Instrument('UNKNOWN', lazy=True)
+    assert emptyAPI == []
+    with pytest.raises(Exception, match='No Instrument Found'):
+        instrument.instrumentName
+
+
+def test_lazy_loading_setting_defers_constructors(emptyAPI, monkeypatch):
+    monkeypatch.setattr(settings, 'LazyLoading', True)
+    Instrument('UNKNOWN')
+    Company(companyID=-1)
+    KPI(kpiID=-1)
+    assert emptyAPI == []
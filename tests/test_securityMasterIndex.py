@@ -0,0 +1,167 @@
+import types
+
+import pandas as pd
+import pytest
+
+from quantamatics.core import settings
+from quantamatics.core.APIClient import Session
+from quantamatics.data import securityMasterIndex
+from quantamatics.data.securityMaster import Instrument
+from quantamatics.data.securityMasterIndex import SecurityMasterIndex
+
+
+def makeInstrument(instrumentID: int, symbol: str) -> dict:
+    return {'instrument_id': instrumentID, 'symbol': symbol, 'instrument_name': '%s Inc' % symbol,
+            'sector_name': 'Retail', 'industry_name': 'Apparel'}
+
+
+def makeCompany(companyID: int) -> dict:
+    return {'company_id': companyID, 'company_name': 'Company %d' % companyID, 'sector_name': 'Retail',
+            'industry_name': 'Apparel', 'industry_group_name': 'Apparel', 'vertical_name': 'Apparel',
+            'subvertical_name': 'Apparel'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Entries are stamped with the index module's clock, which the tests move by hand
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(securityMasterIndex, 'time', types.SimpleNamespace(time=lambda: now.value))
+    monkeypatch.setattr(settings, 'SecurityMasterIndexMaxAge', 100)
+    return now
+
+
+@pytest.fixture
+def fakeAPI(monkeypatch):
+    # The universe holds AAA and BBB, each with a ticker and a FIGI
+    calls = []
+    universe = {1: 'AAA', 2: 'BBB'}
+
+    async def apiWrapperAsync(self, api_relative_path, params={}, **kwargs):
+        calls.append((api_relative_path, params.get('instrumentId'), params.get('instrumentSymbol')))
+        if api_relative_path == '/api/data/universe/init':
+            return pd.DataFrame([makeInstrument(k, v) for k, v in universe.items()])
+        if api_relative_path == '/api/data/instrument/load':
+            return pd.DataFrame([makeInstrument(k, v) for k, v in universe.items() if v == params['instrumentSymbol']])
+        if api_relative_path == '/api/data/instrument/getSymbology':
+            symbol = universe[params['instrumentId']]
+            return pd.DataFrame({'symbology_type': ['Ticker', 'FIGI'], 'symbol': [symbol, 'FIGI-%s' % symbol]})
+        if api_relative_path == '/api/data/company/init':
+            return pd.DataFrame([makeCompany(params['instrumentId'] * 10)])
+        return pd.DataFrame()
+
+    monkeypatch.setattr(Session, 'apiWrapperAsync', apiWrapperAsync)
+    return types.SimpleNamespace(calls=calls, universe=universe)
+
+
+def test_lookup(clock):
+    index = SecurityMasterIndex()
+    index.addInstrument(makeInstrument(1, 'AAA'), 'AAA', 'Ticker')
+    index.addSymbology(1, {'Ticker': 'AAA', 'FIGI': 'FIGI-AAA'})
+    index.addCompany(1, makeCompany(10))
+
+    assert index.lookup('AAA', 'Ticker') == 1
+    assert index.lookup('FIGI-AAA', 'FIGI') == 1
+    assert index.lookup('ZZZ', 'Ticker') is None
+    assert index.getInstrument('FIGI-AAA', 'FIGI')['instrument_name'] == 'AAA Inc'
+    assert index.getInstrument(instrumentID=1)['symbol'] == 'AAA'
+    assert index.getSymbology(1) == {'Ticker': 'AAA', 'FIGI': 'FIGI-AAA'}
+    assert index.getCompany(companyID=10)['company_name'] == 'Company 10'
+
+    # An instrument without all fields is not answered from the index
+    index.addInstrument({'instrument_id': 2, 'symbol': 'BBB'})
+    assert index.lookup('BBB') == 2
+    assert index.getInstrument('BBB') is None
+
+
+def test_stale_entries_are_not_served(clock):
+    index = SecurityMasterIndex()
+    index.addInstrument(makeInstrument(1, 'AAA'), 'AAA', 'Ticker')
+    clock.value += 60
+    index.addSymbology(1, {'Ticker': 'AAA'})
+
+    clock.value += 60
+    assert index.isStale(1)
+    assert not index.isStale(1, 'symbology')
+    assert index.getInstrument('AAA', 'Ticker') is None
+    assert index.getSymbology(1) == {'Ticker': 'AAA'}
+
+    # Loading the instrument again makes it fresh
+    index.addInstrument(makeInstrument(1, 'AAA'), 'AAA', 'Ticker')
+    assert index.getInstrument('AAA', 'Ticker') is not None
+
+
+def test_instrument_reloads_stale_entry(clock, fakeAPI, monkeypatch):
+    index = SecurityMasterIndex()
+    monkeypatch.setattr(securityMasterIndex, '_securityMasterIndex', index)
+    monkeypatch.setattr(settings, 'LazyLoading', False)
+
+    assert Instrument('AAA', 'Ticker').instrumentName == 'AAA Inc'
+    assert Instrument('AAA', 'Ticker').instrumentID == 1
+    assert len(fakeAPI.calls) == 1
+
+    clock.value += 200
+    assert Instrument('AAA', 'Ticker').instrumentID == 1
+    assert len(fakeAPI.calls) == 2
+
+
+def test_saved_index_round_trip(clock, tmp_path):
+    index = SecurityMasterIndex(str(tmp_path))
+    index.addInstrument(makeInstrument(1, 'AAA'), 'AAA', 'Ticker')
+    index.save()
+
+    assert SecurityMasterIndex(str(tmp_path)).getInstrument('AAA')['instrument_id'] == 1
+    clock.value += 200
+    assert SecurityMasterIndex(str(tmp_path)).getInstrument('AAA') is None
+
+
+def test_refresh_applies_universe_delta(clock, fakeAPI):
+    index = SecurityMasterIndex()
+    index.addInstrument(makeInstrument(1, 'AAA'), 'AAA', 'Ticker')
+    index.addSymbology(1, {'Ticker': 'AAA', 'FIGI': 'FIGI-AAA'})
+    index.addInstrument(makeInstrument(3, 'CCC'), 'CCC', 'Ticker')
+    index.addSymbology(3, {'Ticker': 'CCC'})
+    assert index.isStale()
+
+    index.refresh(loadCompanies=True)
+
+    # Only the instrument the index did not hold yet is requested, CCC left the universe
+    assert sorted(fakeAPI.calls) == sorted([
+        ('/api/data/universe/init', None, None),
+        ('/api/data/instrument/getSymbology', 2, None),
+        ('/api/data/company/init', 1, None),
+        ('/api/data/company/init', 2, None)
+    ])
+    assert not index.isStale()
+    assert sorted(index.instruments) == [1, 2]
+    assert index.lookup('CCC', 'Ticker') is None
+    assert index.getSymbology(3) is None
+    assert index.lookup('FIGI-BBB', 'FIGI') == 2
+    assert index.getCompany(companyID=20)['company_name'] == 'Company 20'
+
+    # A full refresh requests every instrument again
+    fakeAPI.calls.clear()
+    index.refresh(fullRefresh=True)
+    assert sorted([x[1] for x in fakeAPI.calls if x[0] == '/api/data/instrument/getSymbology']) == [1, 2]
+
+
+def test_lookups_see_the_old_index_until_refresh_completes(clock, fakeAPI, monkeypatch):
+    index = SecurityMasterIndex()
+    index.addInstrument(makeInstrument(3, 'CCC'), 'CCC', 'Ticker')
+    index.addSymbology(3, {'Ticker': 'CCC'})
+
+    # Look the index up while the refresh is waiting on its symbology requests
+    seen = []
+    apiWrapperAsync = Session.apiWrapperAsync
+
+    async def lookupDuringRefresh(self, api_relative_path, params={}, **kwargs):
+        if api_relative_path == '/api/data/instrument/getSymbology':
+            seen.append((index.getInstrument('CCC'), index.getInstrument('AAA')))
+        return await apiWrapperAsync(self, api_relative_path, params, **kwargs)
+
+    monkeypatch.setattr(Session, 'apiWrapperAsync', lookupDuringRefresh)
+    index.refresh()
+
+    assert len(seen) == 2
+    assert all([x[0]['symbol'] == 'CCC' and x[1] is None for x in seen])
+    assert index.getInstrument('CCC') is None
+    assert index.getInstrument('AAA')['instrument_id'] == 1